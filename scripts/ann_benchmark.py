@@ -0,0 +1,124 @@
+import argparse
+import os
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from rag_chatbot.user_manual.config import Config
+from rag_chatbot.user_manual.vector_index import is_lossy, make_faiss_index, rescore, search_params
+
+
+def load_vectors(index_dir: str) -> np.ndarray:
+    """Full-precision vectors of a saved index (kept separately by lossy indexes)."""
+    path = os.path.join(index_dir, "faiss", "vectors.npy")
+    if os.path.exists(path):
+        return np.load(path)
+    index = faiss.read_index(os.path.join(index_dir, "faiss", "index.faiss"))
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def synthetic_vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clustered Gaussian data, closer to text embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 100), dim)).astype(np.float32)
+    vecs = centers[rng.integers(0, len(centers), n)] + 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def run(index: faiss.Index, queries: np.ndarray, k: int, cfg: Config, vectors: np.ndarray = None):
+    """Rows found per query and ms per query; with ``vectors`` a shortlist is rescored exactly."""
+    params = search_params(index, cfg)
+    factor = max(1, cfg.rescore_factor) if vectors is not None else 1
+    start = time.perf_counter()
+    found = []
+    for q in queries:
+        rows = index.search(q[None], k * factor, params=params)[1]
+        if vectors is not None:
+            rows = rescore(vectors, q[None], rows, k)[1]
+        found.append(rows)
+    return np.vstack(found), (time.perf_counter() - start) / len(queries) * 1000
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Recall@k, memory and per-query latency of FAISS index types and vector "
+        "storage against exact float32 search"
+    )
+    parser.add_argument("--index", help="Index directory whose vectors to use")
+    parser.add_argument("--synthetic", type=int, default=100_000, help="Number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=1024, help="Synthetic vector dimension")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--types", nargs="+", default=["hnsw", "ivf-flat", "ivf-pq"])
+    parser.add_argument(
+        "--dtypes", nargs="+", default=["float32", "float16", "int8"],
+        help="Vector storage of flat, hnsw and ivf-flat indexes",
+    )
+    parser.add_argument(
+        "--rescore-factor", type=int, nargs="+", default=[1, 4],
+        help="Shortlist sizes (times k) rescored exactly for lossy indexes; 1 = no rescoring",
+    )
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.index) if args.index else synthetic_vectors(args.synthetic, args.dim)
+    rng = np.random.default_rng(1)
+    n_queries = min(args.queries, len(vectors))
+    held_out = rng.choice(len(vectors), n_queries, replace=False)
+    queries = vectors[held_out] + 0.05 * rng.standard_normal(vectors[held_out].shape).astype(np.float32)
+    cfg = Config()
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {n_queries} queries, k={args.k}")
+
+    flat = make_faiss_index(vectors, replace(cfg, faiss_index_type="flat"))
+    truth, flat_ms = run(flat, queries, args.k, cfg)
+    # B/vec is the index held in memory; rescoring reads float32 vectors from a memory-mapped file.
+    print(
+        f"{'type':<10}{'dtype':<9}{'setting':<16}{'rescore':>8}{'build s':>9}{'MB':>9}"
+        f"{'B/vec':>8}{'recall':>9}{'ms/query':>10}"
+    )
+    for kind in dict.fromkeys(["flat", *args.types]):
+        dtypes = ["float32"] if kind == "ivf-pq" else args.dtypes
+        for dtype in dtypes:
+            if kind == "flat" and dtype == "float32":
+                index, build_s = flat, 0.0
+            else:
+                start = time.perf_counter()
+                index = make_faiss_index(vectors, replace(cfg, faiss_index_type=kind, vector_dtype=dtype))
+                build_s = time.perf_counter() - start
+            nbytes = faiss.serialize_index(index).nbytes
+            if kind == "hnsw":
+                settings = [("efSearch", replace(cfg, hnsw_ef_search=ef)) for ef in args.ef_search]
+            elif kind == "flat":
+                settings = [("exact", cfg)]
+            else:
+                settings = [("nprobe", replace(cfg, ivf_nprobe=p)) for p in args.nprobe]
+            factors = args.rescore_factor if is_lossy(index) else [1]
+            for name, run_cfg in settings:
+                value = {"efSearch": run_cfg.hnsw_ef_search, "nprobe": run_cfg.ivf_nprobe}.get(name)
+                label = f"{name}={value}" if value is not None else name
+                for factor in factors:
+                    found, ms = run(
+                        index, queries, args.k, replace(run_cfg, rescore_factor=factor),
+                        vectors if factor > 1 else None,
+                    )
+                    print(
+                        f"{kind:<10}{dtype if kind != 'ivf-pq' else 'pq':<9}{label:<16}"
+                        f"{(f'{factor}x' if factor > 1 else '-'):>8}{build_s:>9.1f}{nbytes / 1e6:>9.1f}"
+                        f"{nbytes / len(vectors):>8.0f}{recall(found, truth):>9.3f}{ms:>10.3f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from rag_chatbot.common.stub_models import register_stub_models
+from rag_chatbot.user_manual.answer import answer_query, pack_context, render_context
+from rag_chatbot.user_manual.chunking import build_chunks
+from rag_chatbot.user_manual.config import Config
+from rag_chatbot.user_manual.index import build_index, load_index, save_index
+from rag_chatbot.user_manual.retrieval import (
+    bm25_search,
+    dense_search,
+    expand_neighborhood,
+    maybe_rerank,
+    rrf_fuse,
+)
+
+TOC_ENTRIES_PER_PAGE = 50
+MANUAL_WORDS = (
+    "device settings menu button press hold select option display screen error reset power "
+    "battery update firmware cable network wifi export import file format csv pdf print "
+    "connect disconnect restart install remove enable disable configure mode status light "
+    "warning default value user account password profile backup restore storage memory"
+).split()
+
+# Stages timed once per size; the others are timed once per query and repeat.
+BUILD_STAGES = ("chunking", "build", "save", "load")
+
+
+def vocabulary(size: int, rng: np.random.Generator) -> Tuple[List[str], np.ndarray]:
+    """Manual words followed by pseudo-words, drawn with Zipf-like frequencies."""
+    syllables = ["ka", "lo", "mi", "ne", "ru", "ta", "vo", "xe", "pi", "so", "du", "fa"]
+    words = list(MANUAL_WORDS)
+    seen = set(words)
+    while len(words) < size:
+        w = "".join(rng.choice(syllables, rng.integers(2, 5)))
+        if w not in seen:
+            seen.add(w)
+            words.append(w)
+    weights = 1.0 / np.arange(1, size + 1)
+    return words, weights / weights.sum()
+
+
+def heading_numbers(n: int, rng: np.random.Generator) -> List[str]:
+    nums: List[str] = []
+    chapter = 0
+    while len(nums) < n:
+        chapter += 1
+        nums.append(str(chapter))
+        for s in range(1, int(rng.integers(3, 9))):
+            nums.append(f"{chapter}.{s}")
+            nums.extend(f"{chapter}.{s}.{t}" for t in range(1, int(rng.integers(1, 4))))
+    return nums[:n]
+
+
+def synthetic_manual(n_sections: int, seed: int = 0) -> Tuple[List[Tuple[int, str]], int, List[str]]:
+    """TOC-structured manual with about one chunk per section.
+
+    Returns ``(pages, toc_pages, section_texts)``. Headings are numbered up to
+    three levels deep, each page holds one to four sections, and the TOC pages
+    list every heading with the page it starts on.
+    """
+    rng = np.random.default_rng(seed)
+    words, probs = vocabulary(5000, rng)
+    nums = heading_numbers(n_sections, rng)
+    toc_pages = -(-len(nums) // TOC_ENTRIES_PER_PAGE)
+
+    toc: List[str] = []
+    body: List[Tuple[int, str]] = []
+    texts: List[str] = []
+    page, parts, left = toc_pages + 1, [], int(rng.integers(1, 5))
+    for num in nums:
+        title = " ".join(rng.choice(words[:300], 3)).capitalize()
+        paras = []
+        for _ in range(int(rng.integers(1, 5))):
+            para = " ".join(rng.choice(words, int(rng.integers(15, 60)), p=probs))
+            if rng.random() < 0.15:
+                para = "\n\n".join(f"- {w} {para[: 40]}" for w in rng.choice(words[:100], 3))
+            paras.append(para)
+        text = "\n\n".join(paras)
+        toc.append(f"{num} {title}. {page}")
+        texts.append(text)
+        parts.append(f"{num} {title}\n{text}")
+        left -= 1
+        if left == 0:
+            body.append((page, "\n\n".join(parts)))
+            page, parts, left = page + 1, [], int(rng.integers(1, 5))
+    if parts:
+        body.append((page, "\n\n".join(parts)))
+    toc_text = [
+        "\n".join(toc[i:i + TOC_ENTRIES_PER_PAGE]) for i in range(0, len(toc), TOC_ENTRIES_PER_PAGE)
+    ]
+    return list(enumerate(toc_text, start=1)) + body, toc_pages, texts
+
+
+def synthetic_queries(texts: Sequence[str], n: int, seed: int = 1) -> List[str]:
+    """Queries of three to six words taken from random sections."""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for i in rng.integers(0, len(texts), n):
+        words = [w for w in texts[i].split() if w != "-"]
+        queries.append(" ".join(rng.choice(words, min(len(words), int(rng.integers(3, 7))), replace=False)))
+    return queries
+
+
+def summarize(seconds: Sequence[float]) -> Dict[str, float]:
+    ms = np.array(seconds) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "count": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+    }
+
+
+class Timer:
+    """Wall-clock durations of repeated calls, grouped by stage name."""
+
+    def __init__(self) -> None:
+        self.seconds: Dict[str, List[float]] = {}
+
+    def __call__(self, name: str, fn: Callable[..., Any], *args: Any) -> Any:
+        start = time.perf_counter()
+        out = fn(*args)
+        self.seconds.setdefault(name, []).append(time.perf_counter() - start)
+        return out
+
+
+def bench_config(toc_pages: int, **overrides: Any) -> Config:
+    """Stub models everywhere, and no caches that would hide repeated work."""
+    cfg = Config(
+        toc_pages=toc_pages,
+        llm_model="stub",
+        llm_provider="stub",
+        embed_model="stub",
+        embed_provider="stub",
+        embed_cache_path="",
+        query_cache_size=0,
+        reranker_model="stub",
+        reranker_provider="stub",
+        reranker_cache_size=0,
+        answer_cache_path="",
+        pdf_cache_path="",
+    )
+    for key, value in overrides.items():
+        setattr(cfg, key, value)
+    return cfg
+
+
+def dir_bytes(path: str) -> int:
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+def run_size(n_sections: int, n_queries: int, repeat: int, seed: int, overrides: Dict[str, Any]) -> Dict[str, Any]:
+    pages, toc_pages, texts = synthetic_manual(n_sections, seed)
+    cfg = bench_config(toc_pages, **overrides)
+    queries = synthetic_queries(texts, n_queries, seed + 1)
+    timer = Timer()
+
+    chunks = timer("chunking", build_chunks, pages, cfg, "bench")
+    ix = timer("build", build_index, chunks, cfg)
+    with tempfile.TemporaryDirectory() as tmp:
+        timer("save", save_index, ix, tmp)
+        disk = dir_bytes(tmp)
+        ix = timer("load", load_index, tmp, cfg)
+        for _ in range(repeat):
+            for q in queries:
+                dense = timer("dense_search", dense_search, ix, q, cfg.topk_dense)
+                sparse = timer("bm25_search", bm25_search, ix, q, cfg.topk_bm25)
+                fused = timer("fusion", rrf_fuse, [dense, sparse], cfg.rrf_k)
+                expanded = timer("expansion", expand_neighborhood, ix, fused)
+                reranked = timer("rerank", maybe_rerank, ix, q, expanded)
+                timer("packing", lambda ids: render_context(pack_context(ix, ids)), reranked)
+                timer("answer_query", answer_query, ix, q)
+
+    return {
+        "sections": n_sections,
+        "pages": len(pages),
+        "chunks": len(chunks),
+        "text_mb": sum(len(t) for _, t in pages) / 1e6,
+        "index_disk_mb": disk / 1e6,
+        "vector_bytes_per_chunk": ix.faiss.memory_bytes() / max(len(chunks), 1),
+        "stages": {name: summarize(s) for name, s in timer.seconds.items()},
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta_ms: float) -> List[str]:
+    """Print every stage against the baseline and return the regressions.
+
+    A stage regresses when its median is more than ``tolerance`` (a fraction)
+    and more than ``min_delta_ms`` slower than in the baseline.
+    """
+    regressions = []
+    print(f"{'size':>7} {'stage':<14}{'base ms':>11}{'now ms':>11}{'change':>9}")
+    for size, res in current["results"].items():
+        base = baseline["results"].get(size)
+        if base is None:
+            continue
+        for name, st in res["stages"].items():
+            if name not in base["stages"]:
+                continue
+            old, new = base["stages"][name]["p50_ms"], st["p50_ms"]
+            change = (new - old) / old if old else 0.0
+            flag = change > tolerance and new - old > min_delta_ms
+            print(f"{size:>7} {name:<14}{old:>11.3f}{new:>11.3f}{change:>+9.1%}{'  REGRESSION' if flag else ''}")
+            if flag:
+                regressions.append(f"{size}/{name}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time every pipeline stage on synthetic manuals with deterministic stub models"
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000],
+        help="Manual sizes in TOC sections (about one chunk each)",
+    )
+    parser.add_argument("--queries", type=int, default=50, help="Queries per size")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the queries")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--config", help="JSON file overriding benchmark settings, e.g. faiss_index_type")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Results JSON to compare against; exits 1 on regressions")
+    parser.add_argument(
+        "--current",
+        help="Compare this results JSON against --baseline instead of running the benchmark",
+    )
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown as a fraction")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Ignore smaller slowdowns")
+    args = parser.parse_args()
+
+    if args.current:
+        with open(args.current, "r", encoding="utf-8") as f:
+            current = json.load(f)
+    else:
+        register_stub_models()
+        overrides: Dict[str, Any] = {}
+        if args.config:
+            with open(args.config, "r", encoding="utf-8") as f:
+                overrides = json.load(f)
+        current = {
+            "meta": {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+                "queries": args.queries,
+                "repeat": args.repeat,
+                "seed": args.seed,
+                "overrides": overrides,
+            },
+            "results": {},
+        }
+        for size in args.sizes:
+            res = run_size(size, args.queries, args.repeat, args.seed, overrides)
+            current["results"][str(size)] = res
+            print(
+                f"{size} sections: {res['chunks']} chunks, {res['pages']} pages,"
+                f" {res['index_disk_mb']:.1f} MB on disk",
+                file=sys.stderr,
+            )
+            for name, st in res["stages"].items():
+                unit = "s" if name in BUILD_STAGES else "ms"
+                value = st["mean_ms"] / 1000 if name in BUILD_STAGES else st["p50_ms"]
+                extra = "" if name in BUILD_STAGES else f"  p95 {st['p95_ms']:.3f}ms"
+                print(f"  {name:<14}{value:>10.3f}{unit}{extra}", file=sys.stderr)
+        if args.output:
+            os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(current, f, indent=2)
+        else:
+            json.dump(current, sys.stdout, indent=2)
+            print()
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"{len(regressions)} regressions: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,14 @@ from pathlib import Path
 # Ensure src package is on path
 sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
 
-from rag_chatbot.user_manual.answer import answer_query
+from rag_chatbot.models import model_stats
+from rag_chatbot.user_manual.answer import GenerationStats, answer_query, answer_query_stream, tracer_for
 from rag_chatbot.user_manual.index import load_index
+from rag_chatbot.user_manual.retrieval import last_rerank_stats
 
 
-def print_answer(ix, question):
-    """Answer a question and print citations once."""
-    ans, chunks = answer_query(ix, question)
-    print(ans)
+def print_sources(chunks):
+    """Print each distinct citation once."""
     print("-- Sources --")
     seen = set()
     for ch in chunks:
@@ -21,4 +21,75 @@ def print_answer(ix, question):
         seen.add(key)
         print(ch.citation())
     print()
+
+
+def print_answer(ix, question, doc_ids=None):
+    """Answer a question and print citations once."""
+    ans, chunks = answer_query(ix, question, doc_ids)
+    print(ans)
+    print_sources(chunks)
+    if ix.cfg.use_reranker:
+        print_rerank_stats(ix)
     return ans, chunks
+
+
+def stream_answer(ix, question, doc_ids=None):
+    """Print the answer as it is generated, then citations and latency."""
+    stats = GenerationStats()
+    parts = []
+    chunks = []
+    for item in answer_query_stream(ix, question, stats, doc_ids):
+        if isinstance(item, str):
+            parts.append(item)
+            print(item, end="", flush=True)
+        else:
+            chunks = item
+    print()
+    print_sources(chunks)
+    if stats.cached:
+        print(f"  cached answer in {1000 * stats.total_s:.0f}ms", file=sys.stderr)
+        return "".join(parts).strip(), chunks
+    print(
+        f"  first token {1000 * stats.ttft_s:.0f}ms, {stats.tokens} tokens"
+        f" at {stats.tokens_per_s:.1f} tok/s",
+        file=sys.stderr,
+    )
+    if ix.cfg.use_reranker:
+        print_rerank_stats(ix)
+    return "".join(parts).strip(), chunks
+
+
+def print_rerank_stats(ix, file=sys.stderr):
+    """Print the time spent reranking the last query."""
+    st = last_rerank_stats()
+    if st:
+        print(
+            f"  rerank {1000 * st.seconds:.1f}ms ({st.scored} scored, {st.cached} cached)",
+            file=file,
+        )
+
+
+def print_model_stats(file=sys.stderr):
+    """Print cold load time and warm reuse count for every cached model."""
+    for st in model_stats():
+        warm_ms = 1000 * st["warm_lookup_s"] / st["warm_hits"] if st["warm_hits"] else 0.0
+        print(
+            f"  {st['kind']:<13} {st['model']:<40} cold {st['cold_load_s']:.2f}s"
+            f"  warm {warm_ms:.3f}ms x{st['warm_hits']}",
+            file=file,
+        )
+
+
+def print_trace_stats(ix, file=sys.stderr):
+    """Print latency percentiles per pipeline stage when tracing is on."""
+    tracer = tracer_for(ix.cfg)
+    if tracer is None:
+        return
+    print(f"  {'stage':<20}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}", file=file)
+    for name, st in tracer.percentiles().items():
+        print(
+            f"  {name:<20}{st['count']:>6}{st['p50_ms']:>10.1f}{st['p95_ms']:>10.1f}{st['p99_ms']:>10.1f}",
+            file=file,
+        )
+    if tracer.path:
+        print(f"  spans written to {tracer.path}", file=file)
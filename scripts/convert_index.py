@@ -0,0 +1,22 @@
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from rag_chatbot.user_manual.index import convert_legacy_index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Convert a legacy meta.pkl index to the versioned on-disk format"
+    )
+    parser.add_argument("index", help="Path to index directory containing meta.pkl")
+    args = parser.parse_args()
+
+    convert_legacy_index(args.index)
+    print(f"Converted {args.index}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
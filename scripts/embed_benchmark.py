@@ -0,0 +1,102 @@
+import argparse
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from rag_chatbot.user_manual.config import Config
+from rag_chatbot.user_manual.index import embeddings_for
+
+QUERY_TEMPLATES = [
+    "How do I reset the device {}?",
+    "What export formats does model {} support?",
+    "Where is the power button on version {}?",
+    "Error code {} is blinking, what does it mean?",
+    "How can I connect unit {} to Wi-Fi?",
+]
+DOC_TEXT = (
+    "To restore the factory settings, open the Settings menu, select System and then Reset. "
+    "The device restarts and all user profiles, network settings and stored files are removed. "
+)
+
+
+def queries(n: int) -> List[str]:
+    """Distinct queries, so no provider-side cache can answer them."""
+    return [QUERY_TEMPLATES[i % len(QUERY_TEMPLATES)].format(i) for i in range(n)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Query embedding latency of in-process providers against Ollama"
+    )
+    parser.add_argument("--model", default=Config.embed_model, help="Embedding model (Ollama name)")
+    parser.add_argument(
+        "--providers", nargs="+", default=["ollama", "sentence-transformers", "onnx"],
+        help="Providers to compare; the first is the reference for vector agreement",
+    )
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--docs", type=int, default=256, help="Documents for batch throughput")
+    parser.add_argument("--batch-size", type=int, default=Config.embed_batch_size)
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads (0 = default)")
+    parser.add_argument("--quantize", action="store_true", help="Also run int8 quantized in-process models")
+    args = parser.parse_args()
+
+    base = Config(
+        embed_model=args.model,
+        embed_cache_path="",
+        query_cache_size=0,
+        embed_batch_size=args.batch_size,
+        embed_threads=args.threads,
+    )
+    runs = [(p, False) for p in args.providers]
+    if args.quantize:
+        runs += [(p, True) for p in args.providers if p in ("sentence-transformers", "onnx")]
+    qs = queries(args.queries)
+    docs = [f"{DOC_TEXT * 3}Section {i}." for i in range(args.docs)]
+    reference = None
+
+    print(
+        f"{'provider':<28}{'load s':>8}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}"
+        f"{'docs/s':>9}{'cos ref':>9}"
+    )
+    for provider, quantize in runs:
+        name = provider + (" int8" if quantize else "")
+        cfg = replace(base, embed_provider=provider, embed_quantize=quantize)
+        try:
+            start = time.perf_counter()
+            emb = embeddings_for(cfg)
+            emb.embed_query("warm up")
+            load_s = time.perf_counter() - start
+        except Exception as exc:  # provider not installed or server not running
+            print(f"{name:<28}skipped: {exc}")
+            continue
+        for q in qs[:3]:
+            emb.embed_query(q)
+        latencies = []
+        vectors = []
+        for q in qs:
+            start = time.perf_counter()
+            vectors.append(emb.embed_query(q))
+            latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        emb.embed_documents(docs)
+        docs_per_s = len(docs) / (time.perf_counter() - start)
+
+        ms = np.array(latencies) * 1000
+        vecs = np.array(vectors, dtype=np.float32)
+        if reference is None:
+            reference = vecs
+        cos = float(np.mean(np.sum(reference * vecs, axis=1))) if reference.shape == vecs.shape else float("nan")
+        print(
+            f"{name:<28}{load_s:>8.2f}{np.percentile(ms, 50):>9.2f}{np.percentile(ms, 95):>9.2f}"
+            f"{ms.mean():>9.2f}{docs_per_s:>9.1f}{cos:>9.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
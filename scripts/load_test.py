@@ -0,0 +1,62 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+from chatbot_utils import load_index
+from rag_chatbot.user_manual.answer import aanswer_query
+from rag_chatbot.user_manual.config import Config
+
+DEFAULT_QUERIES = [
+    "What export formats are supported?",
+    "How do I reset the device?",
+    "How do I connect to Wi-Fi?",
+    "What does the error light mean?",
+]
+
+
+async def run_level(ix, queries, concurrency: int, n_requests: int):
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(q: str) -> None:
+        async with sem:
+            start = time.perf_counter()
+            await aanswer_query(ix, q)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(queries[i % len(queries)]) for i in range(n_requests)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    print(
+        f"concurrency {concurrency:>3}: {n_requests / wall:6.2f} q/s"
+        f"  p50 {statistics.median(latencies):6.2f}s  p95 {p95:6.2f}s  wall {wall:6.1f}s"
+    )
+
+
+async def main_async(args) -> None:
+    # The queries repeat, so a persistent answer cache would turn the run into cache hits.
+    cfg = Config(cpu_workers=args.cpu_workers, answer_cache_path="")
+    ix = load_index(args.index, cfg, warm_up=True)
+    queries = args.queries or DEFAULT_QUERIES
+    for c in args.concurrency:
+        await run_level(ix, queries, c, args.requests or max(c * 2, 8))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure async answer throughput at several concurrency levels"
+    )
+    parser.add_argument("--index", default="data/index", help="Path to index directory")
+    parser.add_argument("--queries", nargs="*", help="Queries to cycle through")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, help="Requests per level (default 2x concurrency, min 8)")
+    parser.add_argument("--cpu-workers", type=int, default=4, help="Threads for CPU-bound stages")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,20 +6,48 @@ from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
 
-from rag_chatbot.user_manual.chunking import build_chunks
+from rag_chatbot.user_manual.chunking import iter_chunks
 from rag_chatbot.user_manual.config import Config
-from rag_chatbot.user_manual.index import build_index, save_index
-from rag_chatbot.user_manual.pdf_utils import load_pdf_text
-from rag_chatbot.user_manual.summary import build_summaries
+from rag_chatbot.user_manual.index import (
+    EmbedStats,
+    build_index,
+    embeddings_for,
+    load_index,
+    remove_documents,
+    save_index,
+    update_index,
+)
+from rag_chatbot.user_manual.pdf_utils import iter_pdf_text, pdf_page_count
+from rag_chatbot.user_manual.storage import MANIFEST
+from rag_chatbot.user_manual.summary import build_summaries, reusable_summaries
 
 
 def main() -> None:
-    parser = argparse.ArgumentParser(description="Preprocess a PDF into a searchable index")
-    parser.add_argument("--pdf", required=True, help="Path to the PDF file")
+    parser = argparse.ArgumentParser(description="Preprocess PDFs into a searchable index")
+    parser.add_argument(
+        "--pdf", nargs="*", default=[], help="PDF files; each becomes a document named after its file stem"
+    )
     parser.add_argument("--output", default="data/index", help="Directory to store the index")
     parser.add_argument("--config", help="Path to JSON config file overriding defaults")
     parser.add_argument("--summary", action="store_true", help="Generate chunk and section summaries")
+    parser.add_argument(
+        "--checkpoint",
+        help="Summary checkpoint file for resuming (default: <output>/summaries.ckpt.jsonl)",
+    )
+    parser.add_argument("--workers", type=int, help="Concurrent summary requests")
+    parser.add_argument("--pdf-workers", type=int, help="Processes extracting PDF text")
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Add or replace the given PDFs in the index in --output, "
+        "embedding and summarizing only changed chunks",
+    )
+    parser.add_argument(
+        "--remove", nargs="+", default=[], metavar="DOC_ID", help="Remove documents from the index in --output"
+    )
     args = parser.parse_args()
+    if not args.pdf and not args.remove:
+        parser.error("nothing to do: pass --pdf and/or --remove")
 
     cfg = Config()
     if args.config:
@@ -28,28 +56,103 @@ def main() -> None:
         for k, v in data.items():
             if hasattr(cfg, k):
                 setattr(cfg, k, v)
+    if args.workers:
+        cfg.summary_workers = args.workers
+    if args.pdf_workers:
+        cfg.pdf_workers = args.pdf_workers
 
-    if not os.path.exists(args.pdf):
-        print(f"PDF not found: {args.pdf}", file=sys.stderr)
-        sys.exit(1)
+    for pdf in args.pdf:
+        if not os.path.exists(pdf):
+            print(f"PDF not found: {pdf}", file=sys.stderr)
+            sys.exit(1)
 
-    print("[1/4] Reading PDF …", file=sys.stderr)
-    pages = load_pdf_text(args.pdf)
+    old_ix = None
+    if (args.update or args.remove) and os.path.exists(os.path.join(args.output, MANIFEST)):
+        old_ix = load_index(args.output, cfg)
+    if args.remove:
+        if old_ix is None:
+            print(f"No index in {args.output}", file=sys.stderr)
+            sys.exit(1)
+        old_ix, changes = remove_documents(old_ix, args.remove)
+        print(f"Removed {changes.removed} chunks of {', '.join(args.remove)}", file=sys.stderr)
+        if not args.pdf:
+            save_index(old_ix, args.output)
+            print(f"Index saved to {args.output}", file=sys.stderr)
+            return
 
-    print("[2/4] Building chunks …", file=sys.stderr)
-    chunks = build_chunks(pages, cfg)
-    print(f"  chunks: {len(chunks)}", file=sys.stderr)
+    print("[1-2/4] Reading PDF and building chunks …", file=sys.stderr)
+    chunks = []
+    for pdf in args.pdf:
+        doc_id = Path(pdf).stem
+        pages = iter_pdf_text(pdf, workers=cfg.pdf_workers, cache_path=cfg.pdf_cache_path)
+        doc_chunks = list(iter_chunks(pages, cfg, doc_id=doc_id, last_page=pdf_page_count(pdf)))
+        print(f"  {doc_id}: {len(doc_chunks)} chunks", file=sys.stderr)
+        chunks.extend(doc_chunks)
 
     chunk_sums = {}
     section_sums = {}
     if args.summary:
         print("[3/4] Generating summaries …", file=sys.stderr)
-        sums = build_summaries(chunks, cfg)
+        checkpoint = args.checkpoint or os.path.join(args.output, "summaries.ckpt.jsonl")
+
+        def progress(done: int, total: int) -> None:
+            print(f"\r  summaries: {done}/{total}", end="", file=sys.stderr, flush=True)
+
+        reuse = None
+        if old_ix is not None:
+            docs = {c.doc_id for c in chunks}
+            reuse = reusable_summaries(
+                [c for c in old_ix.chunks.values() if c.doc_id in docs],
+                {"chunks": old_ix.chunk_summaries, "sections": old_ix.section_summaries},
+                chunks,
+            )
+        sums = build_summaries(
+            chunks, cfg, checkpoint_path=checkpoint, progress=progress, reuse=reuse
+        )
+        print(file=sys.stderr)
         chunk_sums = sums["chunks"]
         section_sums = sums["sections"]
 
-    print("[4/4] Building index …", file=sys.stderr)
-    ix = build_index(chunks, cfg, chunk_sums, section_sums)
+    embeddings = embeddings_for(cfg)
+    embeddings.reset_stats()
+    embed_stats = EmbedStats()
+
+    def embed_progress(done: int, total: int) -> None:
+        print(f"\r  embedded: {done}/{total}", end="", file=sys.stderr, flush=True)
+
+    if old_ix is not None:
+        print("[4/4] Updating index …", file=sys.stderr)
+        ix, changes = update_index(
+            old_ix, chunks, chunk_sums, section_sums, progress=embed_progress, stats=embed_stats
+        )
+        print(file=sys.stderr)
+        print(
+            f"  added: {changes.added}  removed: {changes.removed}  "
+            f"re-embedded: {changes.reembedded}  unchanged: {changes.kept}",
+            file=sys.stderr,
+        )
+    else:
+        print("[4/4] Building index …", file=sys.stderr)
+        ix = build_index(
+            chunks, cfg, chunk_sums, section_sums, progress=embed_progress, stats=embed_stats
+        )
+        print(file=sys.stderr)
+    stats = embeddings.stats
+    print(
+        f"  embedding: {embed_stats.texts_per_s:.1f} texts/s over {embed_stats.batches} batches "
+        f"({embed_stats.retries} retries)",
+        file=sys.stderr,
+    )
+    print(
+        f"  embedding cache: {stats.doc_hits}/{stats.doc_hits + stats.doc_misses} hits "
+        f"({stats.doc_hit_rate:.0%})",
+        file=sys.stderr,
+    )
+
+    print(
+        f"  vector index: {ix.faiss.memory_bytes() / max(len(ix.chunks), 1):.0f} bytes/chunk in memory",
+        file=sys.stderr,
+    )
 
     save_index(ix, args.output)
     print(f"Index saved to {args.output}", file=sys.stderr)
@@ -1,7 +1,7 @@
 import argparse
 import sys
 
-from chatbot_utils import load_index, print_answer
+from chatbot_utils import load_index, print_model_stats, print_trace_stats, stream_answer
 from rag_chatbot.user_manual.config import Config
 
 
@@ -10,6 +10,26 @@ def main() -> None:
     parser.add_argument("--index", default="data/index", help="Path to preprocessed index")
     parser.add_argument("--model", help="LLM model override")
     parser.add_argument("--llm-provider", help="LLM provider override (ollama or bedrock)")
+    parser.add_argument(
+        "--embed-provider",
+        choices=["sentence-transformers", "onnx"],
+        help="Embed queries in-process with the index's embedding model instead of over HTTP",
+    )
+    parser.add_argument("--docs", nargs="+", metavar="DOC_ID", help="Only answer from these documents")
+    parser.add_argument(
+        "--answer-cache",
+        nargs="?",
+        const="data/cache/answers.sqlite",
+        metavar="SQLITE",
+        help="Serve repeated and similar questions from a persistent answer cache",
+    )
+    parser.add_argument(
+        "--trace",
+        nargs="?",
+        const="",
+        metavar="JSONL",
+        help="Record per-stage latency, printed on exit; optionally also write spans to JSONL",
+    )
     args = parser.parse_args()
 
     print("[1/1] Loading index …", file=sys.stderr)
@@ -18,7 +38,17 @@ def main() -> None:
         cfg.llm_model = args.model
     if args.llm_provider:
         cfg.llm_provider = args.llm_provider
-    ix = load_index(args.index, cfg)
+    if args.embed_provider:
+        cfg.embed_provider = args.embed_provider
+    if args.answer_cache:
+        cfg.answer_cache_path = args.answer_cache
+    if args.trace is not None:
+        cfg.trace = True
+        cfg.trace_path = args.trace
+    ix = load_index(args.index, cfg, warm_up=True)
+    print_model_stats()
+    if len(ix.doc_ids) > 1:
+        print(f"Documents: {', '.join(ix.doc_ids)}", file=sys.stderr)
 
     print("\nInteractive mode. Type your question (or 'exit').\n")
     while True:
@@ -31,7 +61,8 @@ def main() -> None:
             break
         print("\nRetrieving & answering …", file=sys.stderr)
         print("\n=== ANSWER ===\n")
-        print_answer(ix, q)
+        stream_answer(ix, q, args.docs)
+    print_trace_stats(ix)
 
 
 if __name__ == "__main__":
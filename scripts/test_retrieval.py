@@ -1,6 +1,7 @@
 import argparse
 
-from chatbot_utils import load_index, print_answer
+from chatbot_utils import load_index, print_answer, print_trace_stats
+from rag_chatbot.user_manual.config import Config
 
 
 def main() -> None:
@@ -9,12 +10,34 @@ def main() -> None:
     )
     parser.add_argument("index", help="Path to index directory")
     parser.add_argument("queries", nargs="+", help="Queries to test")
+    parser.add_argument("--docs", nargs="+", metavar="DOC_ID", help="Only search these documents")
+    parser.add_argument(
+        "--answer-cache",
+        nargs="?",
+        const="data/cache/answers.sqlite",
+        metavar="SQLITE",
+        help="Serve repeated and similar questions from a persistent answer cache",
+    )
+    parser.add_argument(
+        "--trace",
+        nargs="?",
+        const="",
+        metavar="JSONL",
+        help="Record per-stage latency, printed on exit; optionally also write spans to JSONL",
+    )
     args = parser.parse_args()
 
-    ix = load_index(args.index)
+    cfg = Config()
+    if args.answer_cache:
+        cfg.answer_cache_path = args.answer_cache
+    if args.trace is not None:
+        cfg.trace = True
+        cfg.trace_path = args.trace
+    ix = load_index(args.index, cfg)
     for q in args.queries:
         print(f"=== Query: {q}")
-        print_answer(ix, q)
+        print_answer(ix, q, args.docs)
+    print_trace_stats(ix)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,225 @@
+"""Embeddings wrapper that reuses vectors across runs.
+
+Document vectors are stored in SQLite keyed by ``(model, sha256(text))`` as
+raw float32 blobs, with a bound on the number of rows and least-recently-used
+eviction. Query vectors are kept in an in-memory LRU only, so user queries
+never reach the disk.
+"""
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    key TEXT NOT NULL,
+    vec BLOB NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (model, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS embeddings_used ON embeddings (used);
+"""
+_BATCH = 500  # stays below SQLite's bound-parameter limit
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class EmbeddingCacheStats:
+    """Hit and miss counts since the wrapper was created or last reset."""
+
+    doc_hits: int = 0
+    doc_misses: int = 0
+    query_hits: int = 0
+    query_misses: int = 0
+
+    @property
+    def doc_hit_rate(self) -> float:
+        total = self.doc_hits + self.doc_misses
+        return self.doc_hits / total if total else 0.0
+
+    @property
+    def query_hit_rate(self) -> float:
+        total = self.query_hits + self.query_misses
+        return self.query_hits / total if total else 0.0
+
+
+class EmbeddingStore:
+    """SQLite table of vectors with a row limit and LRU eviction."""
+
+    def __init__(self, path: str, max_entries: int = 200_000) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Return stored vectors for ``keys`` and mark them as recently used."""
+        found: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique), _BATCH):
+                part = unique[start:start + _BATCH]
+                marks = ",".join("?" * len(part))
+                rows = self._db.execute(
+                    f"SELECT key, vec FROM embeddings WHERE model = ? AND key IN ({marks})",
+                    [model, *part],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE embeddings SET used = ? WHERE model = ? AND key = ?",
+                    [(now, model, k) for k in found],
+                )
+                self._db.commit()
+        return found
+
+    def put_many(self, model: str, items: Dict[str, np.ndarray]) -> None:
+        """Store vectors, then evict the least recently used rows over the limit."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, key, vec, used) VALUES (?, ?, ?, ?)",
+                [(model, k, np.asarray(v, dtype=np.float32).tobytes(), now) for k, v in items.items()],
+            )
+            self._count += self._db.total_changes - before
+            excess = self._count - self.max_entries
+            if excess > 0:
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE (model, key) IN "
+                    "(SELECT model, key FROM embeddings ORDER BY used LIMIT ?)",
+                    (excess,),
+                )
+                self._count -= excess
+            self._db.commit()
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class CachedEmbeddings(Embeddings):
+    """Serve embeddings from ``store`` and an in-memory query cache first.
+
+    Only texts missing from the caches are sent to ``inner``, in one call.
+    With ``store=None`` document vectors are not persisted.
+    """
+
+    def __init__(
+        self,
+        inner: Embeddings,
+        model_key: str,
+        store: Optional[EmbeddingStore] = None,
+        query_cache_size: int = 1024,
+    ) -> None:
+        self.inner = inner
+        self.model_key = model_key
+        self.store = store
+        self.query_cache_size = query_cache_size
+        self.stats = EmbeddingCacheStats()
+        self._queries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup_docs(self, texts: List[str]):
+        keys = [text_key(t) for t in texts]
+        found = self.store.get_many(self.model_key, keys) if self.store is not None else {}
+        todo: Dict[str, str] = {}
+        for k, t in zip(keys, texts):
+            if k not in found:
+                todo.setdefault(k, t)
+        hits = sum(1 for k in keys if k in found)
+        with self._lock:
+            self.stats.doc_hits += hits
+            self.stats.doc_misses += len(keys) - hits
+        return keys, found, list(todo), list(todo.values())
+
+    def _store_docs(self, keys, found, missing, vectors) -> List[List[float]]:
+        fresh = {k: np.asarray(v, dtype=np.float32) for k, v in zip(missing, vectors)}
+        if self.store is not None:
+            self.store.put_many(self.model_key, fresh)
+        found.update(fresh)
+        return [found[k].tolist() for k in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing, todo = self._lookup_docs(texts)
+        vectors = self.inner.embed_documents(todo) if todo else []
+        return self._store_docs(keys, found, missing, vectors)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing, todo = self._lookup_docs(texts)
+        vectors = await self.inner.aembed_documents(todo) if todo else []
+        return self._store_docs(keys, found, missing, vectors)
+
+    def _lookup_queries(self, texts: List[str]):
+        hits: Dict[str, List[float]] = {}
+        with self._lock:
+            for t in texts:
+                vec = self._queries.get(t)
+                if vec is not None:
+                    self._queries.move_to_end(t)
+                    hits[t] = vec
+            n_hits = sum(1 for t in texts if t in hits)
+            self.stats.query_hits += n_hits
+            self.stats.query_misses += len(texts) - n_hits
+        return hits, list(dict.fromkeys(t for t in texts if t not in hits))
+
+    def _store_queries(self, texts, hits, todo, vectors) -> List[List[float]]:
+        with self._lock:
+            for t, vec in zip(todo, vectors):
+                hits[t] = vec
+                self._queries[t] = vec
+            while len(self._queries) > self.query_cache_size:
+                self._queries.popitem(last=False)
+        return [hits[t] for t in texts]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries, caching them in memory only.
+
+        Misses go to ``inner.embed_queries`` in one call when the model has
+        it, and to ``inner.embed_query`` one by one otherwise; never to
+        ``embed_documents``, since models may embed queries differently.
+        """
+        hits, todo = self._lookup_queries(texts)
+        if not todo:
+            vectors: List[List[float]] = []
+        elif hasattr(self.inner, "embed_queries"):
+            vectors = self.inner.embed_queries(todo)
+        else:
+            vectors = [self.inner.embed_query(t) for t in todo]
+        return self._store_queries(texts, hits, todo, vectors)
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        hits, todo = self._lookup_queries(texts)
+        if not todo:
+            vectors: List[List[float]] = []
+        elif hasattr(self.inner, "aembed_queries"):
+            vectors = await self.inner.aembed_queries(todo)
+        else:
+            vectors = list(await asyncio.gather(*(self.inner.aembed_query(t) for t in todo)))
+        return self._store_queries(texts, hits, todo, vectors)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_queries([text]))[0]
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = EmbeddingCacheStats()
@@ -0,0 +1,31 @@
+"""Shared bounded thread pool for CPU-bound work started from asyncio code."""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def get_cpu_executor(max_workers: int = 4) -> ThreadPoolExecutor:
+    """Return the process-wide CPU pool, creating it with ``max_workers`` on first use."""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-cpu")
+        return _pool
+
+
+async def run_cpu(fn: Callable[..., Any], *args: Any, max_workers: int = 4, **kwargs: Any) -> Any:
+    """Run ``fn`` on the CPU pool without blocking the event loop.
+
+    ``fn`` runs in a copy of the caller's context, so tracing spans nest.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_cpu_executor(max_workers), functools.partial(ctx.run, fn, *args, **kwargs)
+    )
@@ -0,0 +1,204 @@
+"""Embedding models run in-process on CPU instead of behind an HTTP server.
+
+Both classes produce L2-normalized vectors, like Ollama's embedding
+endpoint, so an index built through Ollama can be queried with the same
+model run here. Ollama model names are mapped to their Hugging Face
+repositories with :func:`resolve_model_name`.
+
+:class:`SentenceTransformerEmbeddings` uses sentence-transformers (PyTorch);
+:class:`OnnxEmbeddings` uses ONNX Runtime with a Hugging Face tokenizer and
+loads faster and needs no PyTorch. Both can be quantized to int8 (dynamic
+quantization of the linear layers), which is usually 2-3x faster on CPU at a
+small cost in accuracy.
+"""
+import json
+import os
+import threading
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Ollama model name -> Hugging Face repository with the same weights.
+MODEL_ALIASES = {
+    "bge-m3": "BAAI/bge-m3",
+    "all-minilm": "sentence-transformers/all-MiniLM-L6-v2",
+    "mxbai-embed-large": "mixedbread-ai/mxbai-embed-large-v1",
+}
+
+
+def resolve_model_name(name: str) -> str:
+    """Hugging Face name for an Ollama model name (tag ignored); other names are kept."""
+    return MODEL_ALIASES.get(name.split(":", 1)[0], name)
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """A sentence-transformers model on CPU.
+
+    ``threads`` sets PyTorch's intra-op thread count, which is process-wide;
+    0 keeps the PyTorch default.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int = 32,
+        threads: int = 0,
+        quantize: bool = False,
+        max_length: Optional[int] = None,
+        cache_folder: Optional[str] = None,
+    ) -> None:
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self.model_name = resolve_model_name(model_name)
+        self.batch_size = batch_size
+        model = SentenceTransformer(self.model_name, device="cpu", cache_folder=cache_folder)
+        if max_length:
+            model.max_seq_length = max_length
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts).tolist() if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries in batches, as :meth:`embed_query` would one by one."""
+        return self._encode(texts).tolist() if texts else []
+
+
+class OnnxEmbeddings(Embeddings):
+    """A transformer encoder exported to ONNX, run with ONNX Runtime on CPU.
+
+    ``model_name`` is a local directory or a Hugging Face repository that
+    contains ``model.onnx`` (at the top level or in ``onnx/``) and tokenizer
+    files. Pooling follows the sentence-transformers ``1_Pooling`` config
+    when present (CLS for bge-m3) and is mean pooling otherwise. Texts are
+    sorted by length before batching so each batch pads little. With
+    ``quantize`` an int8 copy of the model is written next to it once and
+    reused.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int = 32,
+        threads: int = 0,
+        quantize: bool = False,
+        max_length: Optional[int] = None,
+        cache_folder: Optional[str] = None,
+    ) -> None:
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = resolve_model_name(model_name)
+        self.batch_size = batch_size
+        root = self.model_name
+        if not os.path.isdir(root):
+            from huggingface_hub import snapshot_download
+
+            root = snapshot_download(
+                self.model_name,
+                cache_dir=cache_folder,
+                allow_patterns=["*.json", "*.txt", "*.model", "onnx/*", "model.onnx*", "1_Pooling/*"],
+            )
+        model_path = _find_onnx(root)
+        if quantize:
+            model_path = _quantized(model_path)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(root)
+        self.max_length = max_length or min(self.tokenizer.model_max_length, 8192)
+        self.cls_pooling = _uses_cls_pooling(root)
+
+        opts = ort.SessionOptions()
+        if threads > 0:
+            opts.intra_op_num_threads = threads
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.output_names = [o.name for o in self.session.get_outputs()]
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        enc = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self.input_names}
+        if "sentence_embedding" in self.output_names:
+            vecs = self.session.run(["sentence_embedding"], feeds)[0]
+        else:
+            hidden = self.session.run(self.output_names[:1], feeds)[0]
+            if self.cls_pooling:
+                vecs = hidden[:, 0]
+            else:
+                mask = enc["attention_mask"][..., None].astype(np.float32)
+                vecs = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        vecs = vecs.astype(np.float32)
+        return vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out: Optional[np.ndarray] = None
+        for lo in range(0, len(order), self.batch_size):
+            rows = order[lo:lo + self.batch_size]
+            vecs = self._encode_batch([texts[i] for i in rows])
+            if out is None:
+                out = np.empty((len(texts), vecs.shape[1]), dtype=np.float32)
+            out[rows] = vecs
+        return out if out is not None else np.empty((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts).tolist() if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries in batches, as :meth:`embed_query` would one by one."""
+        return self._encode(texts).tolist() if texts else []
+
+
+def _find_onnx(root: str) -> str:
+    for rel in ("model.onnx", os.path.join("onnx", "model.onnx")):
+        path = os.path.join(root, rel)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"No model.onnx in {root} or {os.path.join(root, 'onnx')}")
+
+
+_quantize_lock = threading.Lock()
+
+
+def _quantized(model_path: str) -> str:
+    """Path of an int8 dynamically quantized copy of ``model_path``, created on first use."""
+    out = model_path[: -len(".onnx")] + ".int8.onnx"
+    with _quantize_lock:
+        if not os.path.exists(out):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            tmp = out + ".tmp"
+            quantize_dynamic(model_path, tmp, weight_type=QuantType.QInt8)
+            os.replace(tmp, out)
+    return out
+
+
+def _uses_cls_pooling(root: str) -> bool:
+    path = os.path.join(root, "1_Pooling", "config.json")
+    if not os.path.exists(path):
+        return False
+    with open(path, "r", encoding="utf-8") as f:
+        return bool(json.load(f).get("pooling_mode_cls_token"))
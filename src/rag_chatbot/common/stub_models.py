@@ -0,0 +1,138 @@
+"""Deterministic in-process models for benchmarks and offline runs.
+
+:func:`register_stub_models` registers them with :mod:`rag_chatbot.models`
+under the provider name ``"stub"``, so a :class:`~rag_chatbot.user_manual.config.Config`
+with ``llm_provider``, ``embed_provider`` and ``reranker_provider`` set to
+``"stub"`` runs the whole pipeline without Ollama or model downloads. Outputs
+depend only on the input text, never on the process or the call order.
+"""
+import re
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from rag_chatbot.models import register_provider
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+CITATION_RE = re.compile(r"^### .*?(\[[^\]\n]+\])$", re.MULTILINE)
+
+
+def _tokens(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class StubEmbeddings(Embeddings):
+    """Signed feature hashing of word tokens into ``dim`` buckets, L2-normalized.
+
+    Texts sharing words get similar vectors, so dense search ranks them
+    plausibly, and the cost grows with text length like a real encoder.
+    """
+
+    def __init__(self, model_name: str = "stub", dim: int = 1024) -> None:
+        self.model_name = model_name
+        self.dim = dim
+        self._buckets: Dict[str, Tuple[int, float]] = {}
+
+    def _bucket(self, token: str) -> Tuple[int, float]:
+        hit = self._buckets.get(token)
+        if hit is None:
+            h = zlib.crc32(token.encode("utf-8"))
+            hit = self._buckets[token] = (h % self.dim, 1.0 if h & 0x80000000 else -1.0)
+        return hit
+
+    def _embed(self, text: str) -> List[float]:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in _tokens(text):
+            col, sign = self._bucket(token)
+            vec[col] += sign
+        norm = float(np.linalg.norm(vec))
+        if norm:
+            vec /= norm
+        else:
+            vec[0] = 1.0
+        return vec.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class StubCrossEncoder:
+    """Scores a (query, text) pair by the share of query words found in the text."""
+
+    def __init__(self, model_name: str = "stub", **kwargs: Any) -> None:
+        self.model_name = model_name
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], batch_size: int = 32, **kwargs: Any) -> np.ndarray:
+        scores = np.empty(len(pairs), dtype=np.float32)
+        for i, (query, text) in enumerate(pairs):
+            q = set(_tokens(query))
+            words = _tokens(text)
+            hits = sum(1 for w in words if w in q)
+            scores[i] = len(q & set(words)) / (len(q) or 1) + hits / (len(words) + 50)
+        return scores
+
+
+class StubChatModel(BaseChatModel):
+    """Answers by quoting the citation of the first context chunk in the prompt.
+
+    Prompts without context (query expansion, summaries) get the first line of
+    the last message back. Token usage is reported as word counts.
+    """
+
+    model_name: str = "stub"
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        prompt = str(messages[-1].content) if messages else ""
+        cite = CITATION_RE.search(prompt)
+        if cite is not None:
+            return f"See the manual for the steps. {cite.group(1)}"
+        return prompt.strip().splitlines()[0] if prompt.strip() else ""
+
+    def _usage(self, messages: List[BaseMessage], reply: str) -> Dict[str, int]:
+        inp = sum(len(str(m.content).split()) for m in messages)
+        out = len(reply.split())
+        return {"input_tokens": inp, "output_tokens": out, "total_tokens": inp + out}
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        reply = self._reply(messages)
+        msg = AIMessage(content=reply, usage_metadata=self._usage(messages, reply))  # type: ignore[arg-type]
+        return ChatResult(generations=[ChatGeneration(message=msg)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        reply = self._reply(messages)
+        for word in re.findall(r"\S+\s*", reply):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(content="", usage_metadata=self._usage(messages, reply))  # type: ignore[arg-type]
+        )
+
+
+def register_stub_models(name: str = "stub") -> None:
+    """Register the stub LLM, embeddings and cross-encoder as provider ``name``."""
+    register_provider("llm", name, lambda model, **kw: StubChatModel(model_name=model))
+    register_provider("embeddings", name, lambda model, **kw: StubEmbeddings(model, **kw))
+    register_provider("cross-encoder", name, lambda model, **kw: StubCrossEncoder(model, **kw))
@@ -0,0 +1,153 @@
+"""Per-stage spans for the answer pipeline.
+
+A trace starts at a root span opened with :func:`trace` and a :class:`Tracer`;
+:func:`span` opens a child of whatever span is active in the current context
+(thread or asyncio task). Outside a trace :func:`span` returns a shared no-op
+object, so instrumented code costs one context-variable lookup when tracing
+is off. Finished spans feed per-stage latency histograms and, if the tracer
+has a path, are appended to a JSON lines file.
+"""
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Optional
+
+import numpy as np
+
+_active: "ContextVar[Optional[Span]]" = ContextVar("rag_chatbot_span", default=None)
+_ids = itertools.count(1)
+
+
+class Tracer:
+    """Collects finished spans: recent durations per stage and an optional JSONL file."""
+
+    def __init__(self, path: str = "", max_samples: int = 10_000) -> None:
+        self.path = path
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._durations: Dict[str, Deque[float]] = {}
+        self._file = open(path, "a", encoding="utf-8") if path else None
+
+    def record(self, sp: "Span") -> None:
+        with self._lock:
+            samples = self._durations.get(sp.name)
+            if samples is None:
+                samples = self._durations[sp.name] = deque(maxlen=self.max_samples)
+            samples.append(sp.duration)
+            if self._file is not None:
+                self._file.write(json.dumps(sp.to_dict(), default=str) + "\n")
+                if sp.parent is None:
+                    self._file.flush()
+
+    def percentiles(self) -> Dict[str, Dict[str, float]]:
+        """Count, mean, p50, p95 and p99 in milliseconds per stage name."""
+        with self._lock:
+            samples = {name: np.array(d) * 1000 for name, d in self._durations.items()}
+        out = {}
+        for name, ms in samples.items():
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            out[name] = {
+                "count": len(ms),
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+            }
+        return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._durations.clear()
+
+
+class Span:
+    """One timed stage; ``set`` attaches counts such as candidates or tokens."""
+
+    __slots__ = ("name", "attrs", "parent", "tracer", "trace_id", "span_id", "start", "duration", "_t0")
+
+    def __init__(self, name: str, attrs: Dict[str, Any], parent: Optional["Span"], tracer: Tracer) -> None:
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.tracer = tracer
+        self.span_id = next(_ids)
+        self.trace_id = parent.trace_id if parent is not None else self.span_id
+        self.start = 0.0
+        self.duration = 0.0
+        self._t0 = 0.0
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        _active.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.duration = time.perf_counter() - self._t0
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        # Restore the parent rather than reset a token: generators may close
+        # this span from another context.
+        _active.set(self.parent)
+        self.tracer.record(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace": self.trace_id,
+            "span": self.span_id,
+            "parent": self.parent.span_id if self.parent is not None else None,
+            "name": self.name,
+            "start": self.start,
+            "ms": 1000 * self.duration,
+            **self.attrs,
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP = _NoopSpan()
+
+
+def trace(name: str, tracer: Optional[Tracer], **attrs: Any):
+    """Root span of a new trace, or the no-op span when ``tracer`` is ``None``."""
+    if tracer is None:
+        return NOOP
+    return Span(name, attrs, None, tracer)
+
+
+def span(name: str, **attrs: Any):
+    """Child of the active span, or the no-op span outside a trace."""
+    parent = _active.get()
+    if parent is None:
+        return NOOP
+    return Span(name, attrs, parent, parent.tracer)
+
+
+_tracers: Dict[str, Tracer] = {}
+_tracers_lock = threading.Lock()
+
+
+def get_tracer(path: str = "") -> Tracer:
+    """Process-wide tracer writing to ``path`` ("" keeps spans in memory only)."""
+    with _tracers_lock:
+        tracer = _tracers.get(path)
+        if tracer is None:
+            tracer = _tracers[path] = Tracer(path)
+        return tracer
@@ -1,36 +1,239 @@
-from typing import Any
+"""Model factories backed by a process-wide registry.
+
+Constructing a model (loading a CrossEncoder from disk, opening an Ollama
+client) is expensive, so every factory caches its result by
+``(kind, provider, model, kwargs)``. Repeated calls return the same instance
+until it is evicted with :func:`evict_models`.
+
+Besides the built-in providers, loaders registered with
+:func:`register_provider` can be selected by name, for example the
+deterministic stubs in :mod:`rag_chatbot.common.stub_models` used by the
+offline benchmarks.
+"""
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ModelKey = Tuple[str, str, str, str]
+
+
+@dataclass
+class ModelStats:
+    """Load and reuse statistics for one registry entry."""
+
+    kind: str
+    provider: str
+    model: str
+    cold_load_s: float
+    warm_hits: int = 0
+    warm_lookup_s: float = 0.0
+
+
+_lock = threading.RLock()
+_models: Dict[ModelKey, Any] = {}
+_stats: Dict[ModelKey, ModelStats] = {}
+# Per-key locks of models being loaded.
+_loading: Dict[ModelKey, threading.Lock] = {}
+
+# Embedding providers that run the model in-process rather than behind a server.
+IN_PROCESS_EMBED_PROVIDERS = ("sentence-transformers", "onnx")
+_providers: Dict[Tuple[str, str], Callable[..., Any]] = {}
+
+
+def register_provider(kind: str, name: str, loader: Callable[..., Any]) -> None:
+    """Make ``loader(model_name, **kwargs)`` the ``name`` provider for ``kind``.
+
+    ``kind`` is ``"llm"``, ``"embeddings"`` or ``"cross-encoder"``. Registered
+    providers take precedence over built-in ones of the same name; cached
+    models of that provider are evicted.
+    """
+    with _lock:
+        _providers[(kind, name)] = loader
+        for key in [k for k in _models if k[0] == kind and k[1] == name]:
+            del _models[key]
+            del _stats[key]
+
+
+def _registered(kind: str, provider: str, model_name: str, kwargs: Dict[str, Any]) -> Callable[[], Any]:
+    loader = _providers[(kind, provider)]
+    return lambda: loader(model_name, **kwargs)
+
+
+def _cached(kind: str, provider: str, model_name: str, kwargs: Dict[str, Any], factory: Callable[[], Any]):
+    """Return the registry entry for ``key``, calling ``factory`` on a miss.
+
+    Models are loaded outside the registry lock, under a lock of their own
+    key: concurrent requests for the same model wait for one load, while
+    lookups of other models are never blocked by it.
+    """
+    key = (kind, provider, model_name, repr(sorted(kwargs.items())))
+    start = time.perf_counter()
+    with _lock:
+        model = _warm_hit(key, start)
+        if model is not None:
+            return model
+        key_lock = _loading.setdefault(key, threading.Lock())
+    with key_lock:
+        with _lock:
+            model = _warm_hit(key, start)
+            if model is not None:
+                return model
+        try:
+            model = factory()
+            with _lock:
+                _models[key] = model
+                _stats[key] = ModelStats(kind, provider, model_name, time.perf_counter() - start)
+        finally:
+            with _lock:
+                _loading.pop(key, None)
+        return model
+
+
+def _warm_hit(key: ModelKey, start: float) -> Any:
+    model = _models.get(key)
+    if model is not None:
+        stats = _stats[key]
+        stats.warm_hits += 1
+        stats.warm_lookup_s += time.perf_counter() - start
+    return model
+
+
+def evict_models(kind: Optional[str] = None, model_name: Optional[str] = None) -> int:
+    """Drop cached models matching ``kind``/``model_name`` and return how many were removed."""
+    with _lock:
+        keys = [
+            k for k in _models
+            if (kind is None or k[0] == kind) and (model_name is None or k[2] == model_name)
+        ]
+        for k in keys:
+            del _models[k]
+            del _stats[k]
+        return len(keys)
+
+
+def model_stats() -> List[Dict[str, Any]]:
+    """Return cold load time and warm reuse counts for every cached model."""
+    with _lock:
+        return [asdict(s) for s in _stats.values()]
 
 
 def get_llm(model_name: str, provider: str = "ollama", **kwargs: Any):
     """Return a chat-centric LLM instance for the given provider."""
-    if provider == "ollama":
-        from langchain_ollama import ChatOllama
+    if ("llm", provider) in _providers:
+        factory = _registered("llm", provider, model_name, kwargs)
+    elif provider == "ollama":
+        def factory():
+            from langchain_ollama import ChatOllama
 
-        return ChatOllama(model=model_name, **kwargs)
+            return ChatOllama(model=model_name, **kwargs)
     elif provider == "bedrock":
-        from langchain_aws import ChatBedrockConverse
+        def factory():
+            from langchain_aws import ChatBedrockConverse
 
-        return ChatBedrockConverse(model_id=model_name, **kwargs)
+            return ChatBedrockConverse(model_id=model_name, **kwargs)
     else:
         raise ValueError(f"Unsupported LLM provider: {provider}")
+    return _cached("llm", provider, model_name, kwargs, factory)
+
+
+_stores: Dict[str, Any] = {}
+
+
+def _embedding_store(path: str, max_entries: int):
+    from rag_chatbot.common.embedding_cache import EmbeddingStore
+
+    with _lock:
+        store = _stores.get(path)
+        if store is None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            store = _stores[path] = EmbeddingStore(path, max_entries=max_entries)
+        return store
+
+
+def get_embeddings(
+    model_name: str,
+    provider: str = "ollama",
+    cache_path: str = "",
+    cache_max_entries: int = 200_000,
+    query_cache_size: int = 1024,
+    **kwargs: Any,
+):
+    """Return an embeddings model for the given provider.
 
+    ``"sentence-transformers"`` and ``"onnx"`` run the model in this process
+    (see :mod:`rag_chatbot.common.local_embeddings`); their ``kwargs`` select
+    batch size, threads and int8 quantization.
 
-def get_embeddings(model_name: str, provider: str = "ollama", **kwargs: Any):
-    """Return an embeddings model for the given provider."""
-    if provider == "ollama":
-        from langchain_ollama import OllamaEmbeddings
+    The model is wrapped in :class:`~rag_chatbot.common.embedding_cache.CachedEmbeddings`:
+    query vectors are cached in memory, and with ``cache_path`` document
+    vectors are persisted in a SQLite store shared by every model using that
+    path.
+    """
+    if ("embeddings", provider) in _providers:
+        load = _registered("embeddings", provider, model_name, kwargs)
+    elif provider == "ollama":
+        def load():
+            from langchain_ollama import OllamaEmbeddings
 
-        return OllamaEmbeddings(model=model_name, **kwargs)
+            return OllamaEmbeddings(model=model_name, **kwargs)
     elif provider == "bedrock":
-        from langchain_aws import BedrockEmbeddings
+        def load():
+            from langchain_aws import BedrockEmbeddings
 
-        return BedrockEmbeddings(model_id=model_name, **kwargs)
+            return BedrockEmbeddings(model_id=model_name, **kwargs)
+    elif provider == "sentence-transformers":
+        def load():
+            from rag_chatbot.common.local_embeddings import SentenceTransformerEmbeddings
+
+            return SentenceTransformerEmbeddings(model_name, **kwargs)
+    elif provider == "onnx":
+        def load():
+            from rag_chatbot.common.local_embeddings import OnnxEmbeddings
+
+            return OnnxEmbeddings(model_name, **kwargs)
     else:
         raise ValueError(f"Unsupported embedding provider: {provider}")
 
+    def factory():
+        from rag_chatbot.common.embedding_cache import CachedEmbeddings
+
+        store = _embedding_store(cache_path, cache_max_entries) if cache_path else None
+        return CachedEmbeddings(
+            load(), _embedding_model_key(provider, model_name, kwargs), store=store,
+            query_cache_size=query_cache_size,
+        )
+
+    key_kwargs = dict(kwargs, cache_path=cache_path, query_cache_size=query_cache_size)
+    return _cached("embeddings", provider, model_name, key_kwargs, factory)
+
 
-def get_cross_encoder(model_name: str, **kwargs: Any):
-    """Return a sentence-transformers CrossEncoder."""
-    from sentence_transformers import CrossEncoder
+def _embedding_model_key(provider: str, model_name: str, kwargs: Dict[str, Any]) -> str:
+    """Key of the model's vectors in the embedding store.
+
+    Settings that change the vectors (int8 quantization, truncation length)
+    are part of the key, so differently configured models never share cached
+    vectors; batch size, threads and download folder are not.
+    """
+    key = f"{provider}/{model_name}"
+    if kwargs.get("quantize"):
+        key += "/int8"
+    if kwargs.get("max_length"):
+        key += f"/max_length={kwargs['max_length']}"
+    return key
+
+
+def get_cross_encoder(model_name: str, provider: str = "hf", **kwargs: Any):
+    """Return a cross-encoder with a sentence-transformers style ``predict``."""
+    if ("cross-encoder", provider) in _providers:
+        factory = _registered("cross-encoder", provider, model_name, kwargs)
+    elif provider == "hf":
+        def factory():
+            from sentence_transformers import CrossEncoder
+
+            return CrossEncoder(model_name, **kwargs)
+    else:
+        raise ValueError(f"Unsupported cross-encoder provider: {provider}")
 
-    return CrossEncoder(model_name, **kwargs)
+    return _cached("cross-encoder", provider, model_name, kwargs, factory)
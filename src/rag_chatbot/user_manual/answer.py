@@ -1,16 +1,20 @@
-from typing import List, Tuple
+import time
+from dataclasses import dataclass
+from typing import Any, Collection, Dict, Iterator, List, Optional, Tuple, Union
 
 from rag_chatbot.common.prompt_registry import registry
+from rag_chatbot.common.tracing import Tracer, get_tracer, span, trace
 from rag_chatbot.models import get_llm
+from rag_chatbot.user_manual.answer_cache import AnswerCache, CachedAnswer, cache_scope, get_answer_cache
 from rag_chatbot.user_manual.chunking import Chunk
+from rag_chatbot.user_manual.config import Config
 from rag_chatbot.user_manual.index import Index
 from rag_chatbot.user_manual.retrieval import (
-    bm25_search,
-    dense_search,
+    ahybrid_search,
+    amaybe_rerank,
     expand_neighborhood,
+    hybrid_search,
     maybe_rerank,
-    multi_query_expand,
-    rrf_fuse,
 )
 
 
@@ -44,22 +48,185 @@ def filter_used_chunks(answer: str, chunks: List[Chunk]) -> List[Chunk]:
     return used
 
 
-def answer_query(ix: Index, query: str) -> Tuple[str, List[Chunk]]:
-    variants = multi_query_expand(query, ix.cfg)
+@dataclass
+class GenerationStats:
+    """Latency of one answer: time to first token and generation throughput."""
 
-    dense_rankings = [dense_search(ix, v, ix.cfg.topk_dense) for v in variants]
-    bm25_rankings = [bm25_search(ix, v, ix.cfg.topk_bm25) for v in variants]
+    ttft_s: float = 0.0
+    total_s: float = 0.0
+    tokens: int = 0
+    cached: bool = False  # served from the answer cache
+
+    @property
+    def tokens_per_s(self) -> float:
+        gen_s = self.total_s - self.ttft_s
+        return self.tokens / gen_s if gen_s > 0 else 0.0
+
+
+def tracer_for(cfg: Config) -> Optional[Tracer]:
+    """Tracer receiving this configuration's spans, or ``None`` with tracing off."""
+    return get_tracer(cfg.trace_path) if cfg.trace else None
+
+
+def _token_counts(message: Any) -> Dict[str, int]:
+    usage = getattr(message, "usage_metadata", None) or {}
+    return {"input_tokens": usage.get("input_tokens", 0), "output_tokens": usage.get("output_tokens", 0)}
 
-    fused = rrf_fuse(dense_rankings + bm25_rankings, k=ix.cfg.rrf_k)
-    expanded = expand_neighborhood(ix, fused)
-    reranked = maybe_rerank(ix, query, expanded)
 
-    kept = pack_context(ix, reranked)
-    ctx = render_context(kept)
-    llm = get_llm(ix.cfg.llm_model, provider=ix.cfg.llm_provider)
+def _build_prompt(ix: Index, query: str, reranked: List[str]) -> Tuple[List[Chunk], str]:
+    with span("pack_context") as sp:
+        kept = pack_context(ix, reranked)
+        ctx = render_context(kept)
+        sp.set(chunks=len(kept), context_chars=len(ctx))
     sys_prompt = registry["answer_system"]
     user_prompt = registry["answer_user"].format(query=query, ctx=ctx)
     full_prompt = f"<|system|>\n{sys_prompt}\n<|user|>\n{user_prompt}"
-    ans = llm.invoke(full_prompt).content.strip()
-    used = filter_used_chunks(ans, kept)
-    return ans, used
+    return kept, full_prompt
+
+
+def _prepare(ix: Index, query: str, doc_ids: Optional[Collection[str]]) -> Tuple[List[Chunk], str]:
+    fused = hybrid_search(ix, query, doc_ids)
+    expanded = expand_neighborhood(ix, fused)
+    reranked = maybe_rerank(ix, query, expanded)
+    return _build_prompt(ix, query, reranked)
+
+
+async def _aprepare(
+    ix: Index, query: str, doc_ids: Optional[Collection[str]]
+) -> Tuple[List[Chunk], str]:
+    fused = await ahybrid_search(ix, query, doc_ids)
+    expanded = expand_neighborhood(ix, fused)
+    reranked = await amaybe_rerank(ix, query, expanded)
+    return _build_prompt(ix, query, reranked)
+
+
+def _lookup(
+    ix: Index, cache: AnswerCache, query: str, vector: List[float], doc_ids: Optional[Collection[str]]
+) -> Tuple[str, Optional[CachedAnswer]]:
+    with span("answer_cache") as sp:
+        scope = cache_scope(ix.version, ix.cfg, doc_ids)
+        hit = cache.get(scope, query, vector)
+        sp.set(hit=hit is not None)
+    return scope, hit
+
+
+def _cited(ix: Index, hit: CachedAnswer) -> List[Chunk]:
+    return [ix.chunks[cid] for cid in hit.chunk_ids if cid in ix.chunks]
+
+
+def _remember(
+    cache: Optional[AnswerCache], scope: str, query: str, vector: List[float], ans: str, used: List[Chunk]
+) -> None:
+    if cache is not None and ans:
+        cache.put(scope, query, vector, ans, [ch.id for ch in used])
+
+
+def answer_query(
+    ix: Index, query: str, doc_ids: Optional[Collection[str]] = None
+) -> Tuple[str, List[Chunk]]:
+    """Answer ``query`` from ``ix``, optionally only from the documents ``doc_ids``.
+
+    With ``cfg.answer_cache_path`` set, answers to the same or a sufficiently
+    similar query are served from the answer cache without retrieval or
+    generation. With ``cfg.trace`` every stage is recorded as a span.
+    """
+    with trace("answer_query", tracer_for(ix.cfg)) as root:
+        cache = get_answer_cache(ix.cfg)
+        scope, vector = "", []
+        if cache is not None:
+            vector = ix.faiss.embeddings.embed_query(query)
+            scope, hit = _lookup(ix, cache, query, vector, doc_ids)
+            if hit is not None:
+                root.set(cached=True)
+                return hit.answer, _cited(ix, hit)
+        kept, full_prompt = _prepare(ix, query, doc_ids)
+        llm = get_llm(ix.cfg.llm_model, provider=ix.cfg.llm_provider)
+        with span("llm", prompt_chars=len(full_prompt)) as sp:
+            msg = llm.invoke(full_prompt)
+            sp.set(**_token_counts(msg))
+        ans = msg.content.strip()
+        used = filter_used_chunks(ans, kept)
+        _remember(cache, scope, query, vector, ans, used)
+        return ans, used
+
+
+async def aanswer_query(
+    ix: Index, query: str, doc_ids: Optional[Collection[str]] = None
+) -> Tuple[str, List[Chunk]]:
+    """Async :func:`answer_query` for serving many concurrent users from one index."""
+    with trace("answer_query", tracer_for(ix.cfg)) as root:
+        cache = get_answer_cache(ix.cfg)
+        scope, vector = "", []
+        if cache is not None:
+            vector = await ix.faiss.embeddings.aembed_query(query)
+            scope, hit = _lookup(ix, cache, query, vector, doc_ids)
+            if hit is not None:
+                root.set(cached=True)
+                return hit.answer, _cited(ix, hit)
+        kept, full_prompt = await _aprepare(ix, query, doc_ids)
+        llm = get_llm(ix.cfg.llm_model, provider=ix.cfg.llm_provider)
+        with span("llm", prompt_chars=len(full_prompt)) as sp:
+            msg = await llm.ainvoke(full_prompt)
+            sp.set(**_token_counts(msg))
+        ans = msg.content.strip()
+        used = filter_used_chunks(ans, kept)
+        _remember(cache, scope, query, vector, ans, used)
+        return ans, used
+
+
+def answer_query_stream(
+    ix: Index,
+    query: str,
+    stats: Optional[GenerationStats] = None,
+    doc_ids: Optional[Collection[str]] = None,
+) -> Iterator[Union[str, List[Chunk]]]:
+    """Yield answer text as the LLM produces it, then the list of cited chunks.
+
+    Every item but the last is a ``str`` fragment; the last is the result of
+    :func:`filter_used_chunks` on the full answer. If ``stats`` is given it is
+    filled with time to first token (measured from the call, so it includes
+    retrieval) and token throughput once the stream ends. A cached answer is
+    yielded as a single fragment.
+    """
+    start = time.perf_counter()
+    with trace("answer_query", tracer_for(ix.cfg), stream=True) as root:
+        cache = get_answer_cache(ix.cfg)
+        scope, vector = "", []
+        if cache is not None:
+            vector = ix.faiss.embeddings.embed_query(query)
+            scope, hit = _lookup(ix, cache, query, vector, doc_ids)
+            if hit is not None:
+                root.set(cached=True)
+                if stats is not None:
+                    stats.ttft_s = stats.total_s = time.perf_counter() - start
+                    stats.cached = True
+                yield hit.answer
+                yield _cited(ix, hit)
+                return
+        kept, full_prompt = _prepare(ix, query, doc_ids)
+        llm = get_llm(ix.cfg.llm_model, provider=ix.cfg.llm_provider)
+        parts: List[str] = []
+        input_tokens = usage_tokens = 0
+        with span("llm", prompt_chars=len(full_prompt)) as sp:
+            for chunk in llm.stream(full_prompt):
+                usage = getattr(chunk, "usage_metadata", None)
+                if usage:
+                    input_tokens += usage.get("input_tokens", 0)
+                    usage_tokens += usage.get("output_tokens", 0)
+                if not chunk.content:
+                    continue
+                if not parts:
+                    ttft_s = time.perf_counter() - start
+                    sp.set(ttft_ms=1000 * ttft_s)
+                    if stats is not None:
+                        stats.ttft_s = ttft_s
+                parts.append(chunk.content)
+                yield chunk.content
+            sp.set(input_tokens=input_tokens, output_tokens=usage_tokens or len(parts))
+        if stats is not None:
+            stats.total_s = time.perf_counter() - start
+            stats.tokens = usage_tokens or len(parts)
+        ans = "".join(parts).strip()
+        used = filter_used_chunks(ans, kept)
+        _remember(cache, scope, query, vector, ans, used)
+        yield used
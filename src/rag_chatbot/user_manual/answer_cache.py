@@ -0,0 +1,214 @@
+"""Cache of final answers in front of :func:`~rag_chatbot.user_manual.answer.answer_query`.
+
+A query is looked up by its normalized text first, then by the cosine
+similarity of its embedding to the embeddings of cached queries. Entries
+belong to a scope made of the index version, a hash of the configuration
+and the document filter, so rebuilding the index or changing a setting never
+serves an old answer. Entries expire after a TTL and the least recently used
+ones are evicted beyond a size bound. They are stored in SQLite; the query
+itself is kept only as a hash of its normalized text and its embedding.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Collection, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag_chatbot.common.embedding_cache import text_key
+from rag_chatbot.user_manual.config import Config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    vec BLOB NOT NULL,
+    answer TEXT NOT NULL,
+    chunk_ids TEXT NOT NULL,
+    created REAL NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (scope, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS answers_used ON answers (used);
+CREATE INDEX IF NOT EXISTS answers_created ON answers (created);
+"""
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return " ".join(query.lower().split()).rstrip(" ?!.")
+
+
+def config_hash(cfg: Config) -> str:
+    """Hash of every setting except those of the answer cache and tracing."""
+    settings = {k: v for k, v in asdict(cfg).items() if not k.startswith(("answer_cache_", "trace"))}
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:24]
+
+
+def cache_scope(index_version: str, cfg: Config, doc_ids: Optional[Collection[str]] = None) -> str:
+    docs = ",".join(sorted(doc_ids)) if doc_ids is not None else "*"
+    return f"{index_version}/{config_hash(cfg)}/{docs}"
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    chunk_ids: List[str]
+    similarity: float  # 1.0 for a match of the normalized text
+
+
+@dataclass
+class AnswerCacheStats:
+    """Lookups since the cache was opened or last reset."""
+
+    exact_hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.exact_hits + self.semantic_hits + self.misses
+        return (self.exact_hits + self.semantic_hits) / total if total else 0.0
+
+
+class AnswerCache:
+    """SQLite-backed answer cache with exact and nearest-neighbour lookup.
+
+    Query embeddings of each scope are held in memory as one normalized
+    matrix, so a semantic lookup is a single matrix-vector product.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 5000,
+        ttl_s: float = 7 * 24 * 3600,
+        threshold: float = 0.95,
+    ) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.threshold = threshold
+        self.stats = AnswerCacheStats()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._vectors: Dict[str, Tuple[List[str], np.ndarray]] = {}
+
+    def _scope_vectors(self, scope: str) -> Tuple[List[str], np.ndarray]:
+        cached = self._vectors.get(scope)
+        if cached is None:
+            rows = self._db.execute(
+                "SELECT key, vec FROM answers WHERE scope = ? AND created > ?",
+                (scope, time.time() - self.ttl_s),
+            ).fetchall()
+            keys = [k for k, _ in rows]
+            mat = (
+                np.vstack([np.frombuffer(v, dtype=np.float32) for _, v in rows])
+                if rows else np.zeros((0, 0), dtype=np.float32)
+            )
+            cached = self._vectors[scope] = (keys, mat)
+        return cached
+
+    def _row(self, scope: str, key: str) -> Optional[Tuple[str, List[str]]]:
+        row = self._db.execute(
+            "SELECT answer, chunk_ids, created FROM answers WHERE scope = ? AND key = ?",
+            (scope, key),
+        ).fetchone()
+        if row is None or row[2] <= time.time() - self.ttl_s:
+            return None
+        self._db.execute(
+            "UPDATE answers SET used = ? WHERE scope = ? AND key = ?", (time.time(), scope, key)
+        )
+        self._db.commit()
+        return row[0], json.loads(row[1])
+
+    def get(self, scope: str, query: str, vector: Sequence[float]) -> Optional[CachedAnswer]:
+        """Return the cached answer for ``query`` or the most similar cached query."""
+        key = text_key(normalize_query(query))
+        with self._lock:
+            hit = self._row(scope, key)
+            if hit is not None:
+                self.stats.exact_hits += 1
+                return CachedAnswer(hit[0], hit[1], 1.0)
+            keys, mat = self._scope_vectors(scope)
+            if keys:
+                sims = mat @ _unit(vector)
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    hit = self._row(scope, keys[best])
+                    if hit is not None:
+                        self.stats.semantic_hits += 1
+                        return CachedAnswer(hit[0], hit[1], float(sims[best]))
+            self.stats.misses += 1
+            return None
+
+    def put(
+        self, scope: str, query: str, vector: Sequence[float], answer: str, chunk_ids: List[str]
+    ) -> None:
+        """Store an answer, then drop expired rows and the least recently used over the bound."""
+        key = text_key(normalize_query(query))
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers (scope, key, vec, answer, chunk_ids, created, used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (scope, key, _unit(vector).tobytes(), answer, json.dumps(chunk_ids), now, now),
+            )
+            before = self._db.total_changes
+            self._db.execute("DELETE FROM answers WHERE created <= ?", (now - self.ttl_s,))
+            self._db.execute(
+                "DELETE FROM answers WHERE (scope, key) IN (SELECT scope, key FROM answers "
+                "ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+            if self._db.total_changes != before:
+                self._vectors.clear()
+            else:
+                self._vectors.pop(scope, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = AnswerCacheStats()
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else v
+
+
+_caches: Dict[Tuple[str, int, float, float], AnswerCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_answer_cache(cfg: Config) -> Optional[AnswerCache]:
+    """Process-wide cache for ``cfg``'s answer cache settings, or ``None`` when disabled.
+
+    Caches are kept per path and settings, so configurations with a different
+    TTL, size bound or threshold never share an instance.
+    """
+    path = cfg.answer_cache_path
+    if not path:
+        return None
+    key = (path, cfg.answer_cache_max_entries, cfg.answer_cache_ttl_s, cfg.answer_cache_threshold)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            cache = _caches[key] = AnswerCache(
+                path,
+                max_entries=cfg.answer_cache_max_entries,
+                ttl_s=cfg.answer_cache_ttl_s,
+                threshold=cfg.answer_cache_threshold,
+            )
+        return cache
@@ -0,0 +1,237 @@
+"""Vectorized Okapi BM25 over sparse term postings."""
+import math
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag_chatbot.user_manual.storage import load_array, read_json, save_array, write_json
+
+_ARRAYS = ("idf", "indptr", "doc_ids", "weights", "tf", "doc_len")
+
+
+@dataclass
+class BM25Index:
+    """Okapi BM25 scored with NumPy instead of a per-document Python loop.
+
+    Postings are stored CSR-style by term: documents containing term ``t`` are
+    ``doc_ids[indptr[t]:indptr[t + 1]]``. Each posting already carries its
+    length-normalized term-frequency weight, so scoring a query is a gather,
+    a multiply by IDF and a ``bincount``. Scores match ``rank_bm25.BM25Okapi``
+    with the same parameters, including its epsilon floor for negative IDF.
+
+    Raw term frequencies and document lengths are kept next to the weights,
+    so documents can be added or removed without re-tokenizing the corpus;
+    IDF and weights are then recomputed from the postings.
+    """
+
+    vocab: Dict[str, int]
+    idf: np.ndarray
+    indptr: np.ndarray
+    doc_ids: np.ndarray
+    weights: np.ndarray
+    tf: np.ndarray
+    doc_len: np.ndarray
+    n_docs: int
+    k1: float = 1.5
+    b: float = 0.75
+    epsilon: float = 0.25
+
+    @classmethod
+    def build(
+        cls,
+        corpus_tokens: Sequence[Sequence[str]],
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+    ) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        term_ids, docs, tfs = _count(corpus_tokens, vocab, 0)
+        doc_len = np.array([len(t) for t in corpus_tokens], dtype=np.int64)
+        return cls._from_postings(vocab, term_ids, docs, tfs, doc_len, k1, b, epsilon)
+
+    @classmethod
+    def _from_postings(
+        cls,
+        vocab: Dict[str, int],
+        term_ids: np.ndarray,
+        docs: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+        k1: float,
+        b: float,
+        epsilon: float,
+    ) -> "BM25Index":
+        df = np.bincount(term_ids, minlength=len(vocab))
+        if len(vocab) and not df.all():
+            # Drop terms whose last document was removed.
+            kept = np.flatnonzero(df)
+            remap = np.full(len(vocab), -1, dtype=np.int64)
+            remap[kept] = np.arange(kept.size)
+            terms = list(vocab)
+            vocab = {terms[i]: j for j, i in enumerate(kept.tolist())}
+            term_ids = remap[term_ids]
+            df = df[kept]
+
+        n_docs = len(doc_len)
+        avgdl = float(doc_len.sum()) / n_docs if n_docs else 1.0
+
+        # Same accumulation order as BM25Okapi._calc_idf so the epsilon floor matches.
+        idf = np.empty(len(vocab), dtype=np.float64)
+        idf_sum = 0.0
+        for i, freq in enumerate(df.tolist()):
+            idf[i] = math.log(n_docs - freq + 0.5) - math.log(freq + 0.5)
+            idf_sum += idf[i]
+        if len(vocab):
+            idf[idf < 0] = epsilon * (idf_sum / len(vocab))
+
+        order = np.argsort(term_ids, kind="stable")
+        doc_ids = docs[order].astype(np.int32)
+        tf = tfs[order].astype(np.int32)
+        tff = tf.astype(np.float64)
+        dl = doc_len[doc_ids].astype(np.float64)
+        weights = tff * (k1 + 1) / (tff + k1 * (1 - b + b * dl / avgdl))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+        return cls(vocab, idf, indptr, doc_ids, weights, tf, doc_len, n_docs, k1, b, epsilon)
+
+    def _postings(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        term_ids = np.repeat(np.arange(len(self.vocab), dtype=np.int64), np.diff(self.indptr))
+        return term_ids, np.asarray(self.doc_ids), np.asarray(self.tf)
+
+    def add(self, corpus_tokens: Sequence[Sequence[str]]) -> "BM25Index":
+        """Return a new index with ``corpus_tokens`` appended as the last documents."""
+        vocab = dict(self.vocab)
+        term_ids, docs, tfs = self._postings()
+        new_terms, new_docs, new_tfs = _count(corpus_tokens, vocab, self.n_docs)
+        doc_len = np.concatenate(
+            [self.doc_len, np.array([len(t) for t in corpus_tokens], dtype=np.int64)]
+        )
+        return self._from_postings(
+            vocab,
+            np.concatenate([term_ids, new_terms]),
+            np.concatenate([docs, new_docs]),
+            np.concatenate([tfs, new_tfs]),
+            doc_len,
+            self.k1,
+            self.b,
+            self.epsilon,
+        )
+
+    def remove(self, rows: Sequence[int]) -> "BM25Index":
+        """Return a new index without documents ``rows``; the rest keep their order."""
+        keep = np.ones(self.n_docs, dtype=bool)
+        keep[np.asarray(rows, dtype=np.int64)] = False
+        new_row = np.cumsum(keep) - 1
+        term_ids, docs, tfs = self._postings()
+        alive = keep[docs]
+        return self._from_postings(
+            dict(self.vocab),
+            term_ids[alive],
+            new_row[docs[alive]],
+            tfs[alive],
+            np.asarray(self.doc_len)[keep],
+            self.k1,
+            self.b,
+            self.epsilon,
+        )
+
+    def save(self, dirpath: str) -> None:
+        """Write postings and statistics as ``.npy`` arrays plus a vocabulary file."""
+        os.makedirs(dirpath, exist_ok=True)
+        for name in _ARRAYS:
+            save_array(os.path.join(dirpath, f"{name}.npy"), getattr(self, name))
+        write_json(
+            os.path.join(dirpath, "vocab.json"),
+            {
+                "terms": list(self.vocab),
+                "n_docs": self.n_docs,
+                "k1": self.k1,
+                "b": self.b,
+                "epsilon": self.epsilon,
+            },
+        )
+
+    @classmethod
+    def load(cls, dirpath: str, mmap: bool = True) -> "BM25Index":
+        """Open a saved index; arrays are memory-mapped unless ``mmap`` is false."""
+        meta = read_json(os.path.join(dirpath, "vocab.json"))
+        arrays = {name: load_array(os.path.join(dirpath, f"{name}.npy"), mmap) for name in _ARRAYS}
+        vocab = {t: i for i, t in enumerate(meta["terms"])}
+        params = {k: meta[k] for k in ("k1", "b", "epsilon") if k in meta}
+        return cls(vocab=vocab, n_docs=meta["n_docs"], **params, **arrays)
+
+    def get_scores(self, tokens: Sequence[str]) -> np.ndarray:
+        """Return the BM25 score of every document for ``tokens``."""
+        rows: List[np.ndarray] = []
+        vals: List[np.ndarray] = []
+        for t in tokens:
+            i = self.vocab.get(t)
+            if i is None:
+                continue
+            lo, hi = self.indptr[i], self.indptr[i + 1]
+            rows.append(self.doc_ids[lo:hi])
+            vals.append(self.idf[i] * self.weights[lo:hi])
+        if not rows:
+            return np.zeros(self.n_docs, dtype=np.float64)
+        return np.bincount(
+            np.concatenate(rows), weights=np.concatenate(vals), minlength=self.n_docs
+        )
+
+    def search(
+        self, tokens: Sequence[str], topk: int, mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(rows, scores)`` of the ``topk`` best documents, best first.
+
+        With a boolean ``mask`` only documents where it is true are ranked.
+        """
+        scores = self.get_scores(tokens)
+        if mask is None:
+            rows = top_k(scores, topk)
+        else:
+            allowed = np.flatnonzero(mask)
+            rows = allowed[top_k(scores[allowed], topk)]
+        return rows, scores[rows]
+
+
+def _count(
+    corpus_tokens: Sequence[Sequence[str]], vocab: Dict[str, int], first_doc: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Postings ``(term_ids, doc_ids, tfs)`` of a corpus, growing ``vocab`` in place."""
+    term_ids: List[int] = []
+    docs: List[int] = []
+    tfs: List[int] = []
+    for d, tokens in enumerate(corpus_tokens, start=first_doc):
+        counts: Dict[str, int] = {}
+        for t in tokens:
+            counts[t] = counts.get(t, 0) + 1
+        for t, c in counts.items():
+            term_ids.append(vocab.setdefault(t, len(vocab)))
+            docs.append(d)
+            tfs.append(c)
+    return (
+        np.array(term_ids, dtype=np.int64),
+        np.array(docs, dtype=np.int64),
+        np.array(tfs, dtype=np.int64),
+    )
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` largest scores, descending, ties by ascending index.
+
+    Equivalent to ``sorted(range(n), key=scores.__getitem__, reverse=True)[:k]``
+    but selects with ``np.partition`` instead of sorting every document.
+    """
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        kth = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[: k - above.size]
+        cand = np.concatenate([above, ties])
+    else:
+        cand = np.arange(n)
+    return cand[np.lexsort((cand, -scores[cand]))]
@@ -1,8 +1,10 @@
+import hashlib
 import math
 import re
-import uuid
+from collections import deque
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from itertools import chain, islice
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 from rag_chatbot.user_manual.config import Config
 
@@ -21,10 +23,29 @@ class Chunk:
     parent_key: str
     prev_id: Optional[str] = None
     next_id: Optional[str] = None
+    doc_id: str = ""
 
     def citation(self) -> str:
         pages = f"p{self.page_start}–{self.page_end}" if self.page_start != self.page_end else f"p{self.page_start}"
-        return f"[{self.toc_path} — {pages}]"
+        source = f"{self.doc_id}: {self.toc_path}" if self.doc_id else self.toc_path
+        return f"[{source} — {pages}]"
+
+
+def chunk_id(doc_id: str, heading_num: str, heading_title: str, text: str) -> str:
+    """Stable id from document, heading and content, identical across runs."""
+    key = "\0".join((doc_id, heading_num, heading_title, text))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:24]
+
+
+def section_key(doc_id: str, heading_num: str) -> str:
+    """Key of a section (or sibling group) that is unique across documents."""
+    return f"{doc_id}/{heading_num}" if doc_id else heading_num
+
+
+def section_prefixes(heading_num: str) -> List[str]:
+    """``"2.3.1"`` -> ``["2", "2.3", "2.3.1"]``."""
+    parts = heading_num.split(".")
+    return [".".join(parts[:i]) for i in range(1, len(parts) + 1)]
 
 
 TOC_ENTRY_RE = re.compile(r"^\s*(?P<num>\d+(?:\.\d+)*)\s+(?P<title>.*?)\.\s+(?P<page>\d+)\s*$", re.MULTILINE)
@@ -43,26 +64,61 @@ def token_len(s: str) -> int:
     return max(1, math.ceil(len(s) / 4))
 
 
-def split_paragraphs(s: str) -> List[str]:
-    parts = re.split(r"\n{2,}", s)
-    merged: List[str] = []
+PARAGRAPH_BREAK_RE = re.compile(r"\n{2,}")
+BULLET_RE = re.compile(r"^\s*([\-*•\d]+\.|[\-*•])\s+")
+
+
+def _split_parts(pieces: Iterable[str]) -> Iterator[str]:
+    """``PARAGRAPH_BREAK_RE.split("".join(pieces))`` without joining the pieces.
+
+    Trailing newlines of each piece are carried over to the next one, so a
+    break that straddles two pieces is still found.
+    """
+    partial: List[str] = []
+    newlines = ""
+    for piece in pieces:
+        s = newlines + piece
+        head = s.rstrip("\n")
+        newlines = s[len(head):]
+        if not head:
+            continue
+        parts = PARAGRAPH_BREAK_RE.split(head)
+        if len(parts) > 1:
+            yield "".join(partial) + parts[0]
+            yield from parts[1:-1]
+            partial = []
+        partial.append(parts[-1])
+    yield from PARAGRAPH_BREAK_RE.split("".join(partial) + newlines)
+
+
+def _clean_paragraph(x: str) -> str:
+    j = join_hyphenated_line_breaks(x)
+    return normalize_ws(j.replace("\n", " ")) if normalize_ws(j) else ""
+
+
+def iter_paragraphs(pieces: Iterable[str]) -> Iterator[str]:
+    """Paragraphs of the concatenated ``pieces``; consecutive list items are merged."""
     buff: List[str] = []
-    for p in parts:
-        if re.match(r"^\s*([\-*•\d]+\.|[\-*•])\s+", p):
+    for p in _split_parts(pieces):
+        if BULLET_RE.match(p):
             buff.append(p)
             continue
         if buff:
-            merged.append("\n\n".join(buff))
+            merged = _clean_paragraph("\n\n".join(buff))
+            if merged:
+                yield merged
             buff = []
-        merged.append(p)
+        cleaned = _clean_paragraph(p)
+        if cleaned:
+            yield cleaned
     if buff:
-        merged.append("\n\n".join(buff))
-    cleaned: List[str] = []
-    for x in merged:
-        j = join_hyphenated_line_breaks(x)
-        if normalize_ws(j):
-            cleaned.append(normalize_ws(j.replace("\n", " ")))
-    return cleaned
+        merged = _clean_paragraph("\n\n".join(buff))
+        if merged:
+            yield merged
+
+
+def split_paragraphs(s: str) -> List[str]:
+    return list(iter_paragraphs([s]))
 
 
 def parse_toc(pages: List[Tuple[int, str]], n_pages: int):
@@ -105,23 +161,28 @@ def parent_key(num: str) -> str:
     return ".".join(parts[:-1]) if len(parts) > 1 else ""
 
 
-def chunk_section(text: str, base_meta: Dict[str, Any], cfg: Config) -> List[Chunk]:
-    paras = split_paragraphs(text)
-    chunks: List[Chunk] = []
+def iter_section_chunks(paras: Iterable[str], base_meta: Dict[str, Any], cfg: Config) -> Iterator[Chunk]:
+    """Pack paragraphs into overlapping chunks, yielding each as soon as it is full."""
     buf: List[str] = []
     tokens = 0
     idx_in_sec = 0
 
-    def flush():
-        nonlocal buf, tokens, idx_in_sec, chunks
+    def flush() -> Optional[Chunk]:
+        nonlocal buf, tokens, idx_in_sec
         if not buf:
-            return
+            return None
         chunk_text = "\n\n".join(buf).strip()
         if not chunk_text:
             buf = []
             tokens = 0
-            return
-        cid = str(uuid.uuid4())
+            return None
+        doc_id = base_meta.get("doc_id", "")
+        cid = chunk_id(
+            doc_id,
+            base_meta["heading_num"],
+            base_meta["heading_title"],
+            chunk_text,
+        )
         chunk = Chunk(
             id=cid,
             text=chunk_text,
@@ -133,8 +194,8 @@ def chunk_section(text: str, base_meta: Dict[str, Any], cfg: Config) -> List[Chu
             heading_level=base_meta["heading_level"],
             ordinal_in_section=idx_in_sec,
             parent_key=base_meta["parent_key"],
+            doc_id=doc_id,
         )
-        chunks.append(chunk)
         idx_in_sec += 1
         if cfg.atomic_chunk_overlap_tokens > 0 and len(buf) > 0:
             keep = []
@@ -149,82 +210,163 @@ def chunk_section(text: str, base_meta: Dict[str, Any], cfg: Config) -> List[Chu
         else:
             buf = []
             tokens = 0
+        return chunk
 
     for p in paras:
         p_tokens = token_len(p)
         if tokens + p_tokens > cfg.atomic_chunk_tokens and tokens > 0:
-            flush()
+            chunk = flush()
+            if chunk:
+                yield chunk
         buf.append(p)
         tokens += p_tokens
-    flush()
-    return chunks
+    chunk = flush()
+    if chunk:
+        yield chunk
 
 
-def build_chunks(pages: List[Tuple[int, str]], cfg: Config) -> List[Chunk]:
-    """Build content chunks, optionally seeding headings from TOC pages."""
-    if cfg.footer_regex:
-        footer_re = re.compile(cfg.footer_regex, re.MULTILINE)
-        pages = [(p, footer_re.sub("", t)) for p, t in pages]
-
-    toc_headings: List[Dict[str, Any]] = []
-    body_pages = pages
-    if cfg.toc_pages > 0:
-        toc_headings = parse_toc(pages, cfg.toc_pages)
-        body_pages = pages[cfg.toc_pages:]
-
-    page_map = {p: t for p, t in body_pages}
-
-    headings: List[Dict[str, Any]] = []
-    if toc_headings:
-        for h in toc_headings:
-            txt = page_map.get(h["page"], "")
-            pat = re.compile(rf"^\s*{re.escape(h['num'])}\s+{re.escape(h['title'])}", re.MULTILINE)
-            m = pat.search(txt)
-            span = m.span() if m else (0, 0)
-            h["span"] = span
-            headings.append(h)
-
-    if not headings:
-        full_text = "\n\n".join([t for _, t in body_pages])
-        base = {
-            "toc_path": "Document",
-            "page_start": body_pages[0][0] if body_pages else 1,
-            "page_end": body_pages[-1][0] if body_pages else 1,
-            "heading_num": "0",
-            "heading_title": "Document",
-            "heading_level": 0,
-            "parent_key": "",
-        }
-        return chunk_section(full_text, base, cfg)
-
-    headings.sort(key=lambda h: (h["page"], h["span"][0]))
-    path_by_num = build_toc_paths(headings)
-
-    sections: List[Tuple[Dict[str, Any], str, int, int]] = []
-
-    for idx, h in enumerate(headings):
-        start_page = h["page"]
-        start_off = h["span"][1]
-        end_page = body_pages[-1][0]
-        end_off = len(page_map[end_page])
-        if idx + 1 < len(headings):
-            nh = headings[idx + 1]
-            end_page = nh["page"]
-            end_off = nh["span"][0]
-        if start_page == end_page:
-            body = page_map.get(start_page, "")[start_off:end_off]
+def chunk_section(text: str, base_meta: Dict[str, Any], cfg: Config) -> List[Chunk]:
+    return list(iter_section_chunks(iter_paragraphs([text]), base_meta, cfg))
+
+
+def _dedupe_ids(chunks: Iterable[Chunk]) -> Iterator[Chunk]:
+    """Suffix repeated ids (identical text under the same heading) with a counter."""
+    seen: Dict[str, int] = {}
+    for ch in chunks:
+        n = seen.get(ch.id, 0)
+        seen[ch.id] = n + 1
+        if n:
+            ch.id = f"{ch.id}-{n}"
+        yield ch
+
+
+def _link(chunks: Iterable[Chunk]) -> Iterator[Chunk]:
+    """Set ``prev_id``/``next_id``, holding back one chunk until its successor is known."""
+    prev: Optional[Chunk] = None
+    for ch in chunks:
+        if prev is not None:
+            prev.next_id = ch.id
+            ch.prev_id = prev.id
+            yield prev
+        prev = ch
+    if prev is not None:
+        yield prev
+
+
+HEADING_NUM_RE = re.compile(r"^\s*(\d+(?:\.\d+)*)(?=\s)", re.MULTILINE)
+WS_RE = re.compile(r"\s+")
+
+
+def _place_headings(
+    body: Iterable[Tuple[int, str]], headings: List[Dict[str, Any]], window: int
+) -> Iterator[Tuple[int, str, List[Dict[str, Any]]]]:
+    """Yield ``(page, text, headings placed on it)`` for each page in order.
+
+    Every page is scanned once for lines starting with a section number; a
+    TOC entry with that number matches where its title follows. An entry is
+    placed at its first match on the page nearest to its listed page, within
+    ``window`` pages either way (later pages win ties), and sets ``span``;
+    without a match it starts its listed page with span ``(0, 0)``. Pages
+    are held back until no undecided entry can still land on them, so at
+    most ``2 * window + 1`` are kept. Missing pages up to the last heading
+    are yielded as empty. Headings on a page are ordered by position, then
+    by TOC order.
+    """
+    by_num: Dict[str, List[int]] = {}
+    for i, h in enumerate(headings):
+        by_num.setdefault(h["num"], []).append(i)
+    order = sorted(range(len(headings)), key=lambda i: headings[i]["page"])
+    found: Dict[int, Dict[int, Tuple[int, int]]] = {}  # entry -> page -> span
+    on_page: Dict[int, List[int]] = {}
+    held: Deque[Tuple[int, str]] = deque()
+    n_decided = 0
+
+    def scan(p: int, text: str) -> None:
+        held.append((p, text))
+        for m in HEADING_NUM_RE.finditer(text):
+            title_at = WS_RE.match(text, m.end()).end()
+            for i in by_num.get(m.group(1), ()):
+                h = headings[i]
+                if abs(p - h["page"]) > window or not text.startswith(h["title"], title_at):
+                    continue
+                spans = found.setdefault(i, {})
+                if p not in spans:
+                    spans[p] = (m.start(), title_at + len(h["title"]))
+
+    def decide(upto: float) -> None:
+        nonlocal n_decided
+        while n_decided < len(order) and headings[order[n_decided]]["page"] + window <= upto:
+            i = order[n_decided]
+            n_decided += 1
+            listed = headings[i]["page"]
+            spans = found.pop(i, {})
+            page = min(spans, key=lambda q: (abs(q - listed), q < listed)) if spans else listed
+            headings[i]["span"] = spans.get(page, (0, 0))
+            on_page.setdefault(page, []).append(i)
+
+    def release(upto: float) -> Iterator[Tuple[int, str, List[Dict[str, Any]]]]:
+        while held and held[0][0] < upto:
+            p, text = held.popleft()
+            idx = sorted(on_page.pop(p, []), key=lambda i: (headings[i]["span"][0], i))
+            yield p, text, [headings[i] for i in idx]
+
+    nxt = headings[order[0]]["page"]
+    for p, text in body:
+        while nxt < p:
+            scan(nxt, "")
+            nxt += 1
+        scan(p, text)
+        nxt = max(nxt, p + 1)
+        decide(p)
+        if n_decided < len(order):
+            yield from release(headings[order[n_decided]]["page"] - window)
         else:
-            parts = [page_map.get(start_page, "")[start_off:]]
-            for p in range(start_page + 1, end_page):
-                parts.append(page_map.get(p, ""))
-            parts.append(page_map.get(end_page, "")[:end_off])
-            body = "\n".join(parts)
-        body = body.strip()
-        sections.append((h, body, start_page, end_page))
-
-    all_chunks: List[Chunk] = []
-    for h, body, pstart, pend in sections:
-        meta = {
+            yield from release(math.inf)
+    decide(math.inf)
+    while on_page and nxt <= max(on_page):
+        scan(nxt, "")
+        nxt += 1
+    yield from release(math.inf)
+
+
+def _iter_toc_sections(
+    body: Iterator[Tuple[int, str]], headings: List[Dict[str, Any]], doc_id: str, window: int
+) -> Iterator[Tuple[Dict[str, Any], str]]:
+    """Yield ``(chunk metadata, section text)`` per TOC heading while reading pages.
+
+    A section runs from the end of its heading to the start of the next one
+    in (page, position) order, its pages joined with newlines; the last one
+    runs to the end of the last page. Pages missing from ``body`` count as
+    empty. Headings are placed by :func:`_place_headings`; only the open
+    section and the pages within its look-ahead window are kept in memory.
+    """
+    first = next(body, None)
+    if first is None:
+        return
+    last: Tuple[int, str] = first
+
+    def real_pages() -> Iterator[Tuple[int, str]]:
+        nonlocal last
+        for page in chain([first], body):
+            last = page
+            yield page
+
+    # A number listed with several titles takes the one of its last entry in
+    # document order, which is only known once all its entries are placed.
+    titles: Dict[str, str] = {}
+    open_nums: Dict[str, int] = {}
+    for h in headings:
+        if h["num"] in titles and titles[h["num"]] != h["title"]:
+            open_nums[h["num"]] = 0
+        titles[h["num"]] = h["title"]
+    for h in headings:
+        if h["num"] in open_nums:
+            open_nums[h["num"]] += 1
+    path_by_num: Optional[Dict[str, str]] = None
+
+    def meta(h: Dict[str, Any], pstart: int, pend: int) -> Dict[str, Any]:
+        assert path_by_num is not None
+        return {
             "toc_path": path_by_num.get(h["num"], h["title"]),
             "page_start": pstart,
             "page_end": pend,
@@ -232,13 +374,117 @@ def build_chunks(pages: List[Tuple[int, str]], cfg: Config) -> List[Chunk]:
             "heading_title": h["title"],
             "heading_level": len(h["num"].split(".")),
             "parent_key": parent_key(h["num"]),
+            "doc_id": doc_id,
         }
-        chs = chunk_section(body, meta, cfg)
-        all_chunks.extend(chs)
-
-    for i, ch in enumerate(all_chunks):
-        if i > 0:
-            ch.prev_id = all_chunks[i - 1].id
-        if i < len(all_chunks) - 1:
-            ch.next_id = all_chunks[i + 1].id
-    return all_chunks
+
+    closed: List[Tuple[Dict[str, Any], str, int, int]] = []
+    cur: Optional[Dict[str, Any]] = None
+    cur_start = 0
+    parts: List[str] = []
+    for p, text, heads in _place_headings(real_pages(), headings, window):
+        for h in heads:
+            if h["num"] in open_nums:
+                titles[h["num"]] = h["title"]
+                open_nums[h["num"]] -= 1
+                if not open_nums[h["num"]]:
+                    del open_nums[h["num"]]
+        if path_by_num is None and not open_nums:
+            path_by_num = build_toc_paths([{"num": n, "title": t} for n, t in titles.items()])
+
+        pos = 0
+        if cur is not None:
+            parts.append("\n")
+        for h in heads:
+            if cur is not None:
+                parts.append(text[pos:h["span"][0]])
+                closed.append((cur, "".join(parts).strip(), cur_start, p))
+            cur, cur_start, parts = h, p, []
+            pos = h["span"][1]
+        if cur is not None:
+            parts.append(text[pos:])
+        if path_by_num is not None:
+            for h, section, pstart, pend in closed:
+                yield meta(h, pstart, pend), section
+            closed = []
+
+    if cur is not None:
+        end_page, end_text = last
+        if cur_start > end_page:
+            parts.append("\n" + end_text)
+        yield meta(cur, cur_start, end_page), "".join(parts).strip()
+
+
+def iter_chunks(
+    pages: Iterable[Tuple[int, str]],
+    cfg: Config,
+    doc_id: str = "",
+    last_page: Optional[int] = None,
+) -> Iterator[Chunk]:
+    """Yield content chunks while reading ``pages``, optionally seeding headings from TOC pages.
+
+    ``pages`` are ``(page number, text)`` in ascending page order and may be
+    a lazy iterator; only the TOC pages, the open section and the chunks
+    awaiting their successor's id are held in memory. Without TOC headings
+    the whole document is one section whose chunks end on the last page, so
+    they are buffered until the input is exhausted unless ``last_page`` is
+    given (it is taken from ``pages`` when that is a sequence).
+
+    Chunk ids are derived from ``doc_id``, the heading and the chunk text, so
+    re-running on an unchanged document yields the same ids.
+    """
+    if last_page is None and isinstance(pages, Sequence) and pages:
+        last_page = pages[-1][0]
+    body = iter(pages)
+    if cfg.footer_regex:
+        footer_re = re.compile(cfg.footer_regex, re.MULTILINE)
+        body = ((p, footer_re.sub("", t)) for p, t in body)
+
+    toc_headings: List[Dict[str, Any]] = []
+    if cfg.toc_pages > 0:
+        toc_headings = parse_toc(list(islice(body, cfg.toc_pages)), cfg.toc_pages)
+
+    if toc_headings:
+        sections = _iter_toc_sections(body, toc_headings, doc_id, cfg.heading_page_window)
+        chunks = chain.from_iterable(chunk_section(text, meta, cfg) for meta, text in sections)
+        yield from _link(_dedupe_ids(chunks))
+        return
+
+    first = next(body, None)
+    if first is None:
+        return
+    seen_last = first[0]
+
+    def texts() -> Iterator[str]:
+        nonlocal seen_last
+        yield first[1]
+        for p, t in body:
+            seen_last = p
+            yield "\n\n"
+            yield t
+
+    base = {
+        "toc_path": "Document",
+        "page_start": first[0],
+        "page_end": last_page if last_page is not None else first[0],
+        "heading_num": "0",
+        "heading_title": "Document",
+        "heading_level": 0,
+        "parent_key": "",
+        "doc_id": doc_id,
+    }
+    chunks = _link(_dedupe_ids(iter_section_chunks(iter_paragraphs(texts()), base, cfg)))
+    if last_page is not None:
+        yield from chunks
+        return
+    buffered = list(chunks)
+    for ch in buffered:
+        ch.page_end = seen_last
+    yield from buffered
+
+
+def build_chunks(pages: List[Tuple[int, str]], cfg: Config, doc_id: str = "") -> List[Chunk]:
+    """Build content chunks, optionally seeding headings from TOC pages.
+
+    See :func:`iter_chunks`, which this collects.
+    """
+    return list(iter_chunks(pages, cfg, doc_id))
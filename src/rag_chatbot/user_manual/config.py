@@ -9,11 +9,36 @@ class Config:
     llm_model: str = "llama3.2:3b"
     llm_provider: str = "ollama"
     embed_model: str = "bge-m3"
-    embed_provider: str = "ollama"
+    embed_provider: str = "ollama"  # "ollama", "bedrock", or in-process "sentence-transformers" / "onnx"
+    embed_cache_path: str = "data/cache/embeddings.sqlite"  # "" keeps vectors in memory only
+    embed_cache_max_entries: int = 200_000
+    query_cache_size: int = 1024  # in-memory query embeddings
+    embed_batch_size: int = 64  # texts per embedding request during index builds
+    embed_concurrency: int = 4  # embedding requests in flight
+    embed_retries: int = 3
+    embed_backoff_s: float = 1.0  # first retry delay, doubled per retry
+    embed_threads: int = 0  # intra-op threads of in-process embedding models; 0 = library default
+    embed_quantize: bool = False  # int8 dynamic quantization of in-process embedding models
 
     # PDF pre-processing
     toc_pages: int = 0  # number of initial table-of-contents pages
     footer_regex: str = ""
+    heading_page_window: int = 3  # pages a heading may be found away from its TOC page
+    pdf_workers: int = 1  # processes extracting page text; 1 = in-process
+    pdf_cache_path: str = "data/cache/pages.sqlite"  # "" disables the page text cache
+
+    # Vector index
+    faiss_index_type: str = "flat"  # "flat", "hnsw", "ivf-flat" or "ivf-pq"
+    vector_dtype: str = "float32"  # "float32", "float16" or "int8" vectors in memory (not ivf-pq)
+    rescore_factor: int = 4  # lossy indexes: candidates per result rescored against float32 vectors
+    faiss_train_sample: int = 50_000  # max vectors used to train IVF indexes
+    hnsw_m: int = 32
+    hnsw_ef_construction: int = 200
+    hnsw_ef_search: int = 64  # query time
+    ivf_nlist: int = 0  # 0 = 4 * sqrt(number of vectors)
+    ivf_nprobe: int = 16  # query time
+    pq_m: int = 16  # sub-quantizers; must divide the embedding dimension
+    pq_nbits: int = 8
 
     # Chunking
     atomic_chunk_tokens: int = 1000
@@ -26,16 +51,47 @@ class Config:
     rrf_k: int = 60
     expand_neighbors: int = 1
     expand_siblings: bool = True
+    max_siblings_per_candidate: int = 4  # nearest siblings added per candidate
+    max_expanded_candidates: int = 40  # cap on the expanded set fed to the reranker
 
     # Reranker
     use_reranker: bool = True
-    reranker_type: str = "cross-encoder"  # "llm" or "cross-encoder"
+    reranker_type: str = "cross-encoder"  # "cross-encoder", "llm" or "llm-listwise"
     reranker_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
     reranker_provider: str = "hf"
+    reranker_batch_size: int = 32
+    reranker_max_length: int = 512  # max tokens per (query, chunk) pair
+    reranker_cache_size: int = 4096  # cached (query, chunk) scores
+    rerank_top_m: int = 0  # score only the first M fused candidates; 0 = all
+    reranker_concurrency: int = 4  # concurrent LLM reranking calls
+    listwise_window: int = 10  # candidates per listwise LLM call
+    listwise_stride: int = 5
+    listwise_doc_chars: int = 1500  # excerpt length shown per candidate
+
+    # Async serving
+    cpu_workers: int = 4  # threads for FAISS, BM25 and cross-encoder work
 
     # Context packing
     max_context_chars: int = 9000
     max_context_chunks: int = 12
 
+    # Summaries
+    summary_workers: int = 4  # concurrent summary LLM calls
+    summary_retries: int = 3
+    summary_backoff_s: float = 1.0  # first retry delay, doubled per retry
+    summary_mode: str = "flat"  # "flat" or "hierarchical" (sections from child summaries)
+    summary_token_budget: int = 3000  # max input tokens per hierarchical section call
+
+    # Answer cache
+    answer_cache_path: str = ""  # SQLite file of the answer cache; "" disables it
+    answer_cache_max_entries: int = 5000
+    answer_cache_ttl_s: float = 7 * 24 * 3600.0
+    answer_cache_threshold: float = 0.95  # min query embedding cosine similarity; > 1 = exact matches only
+
+    # Tracing
+    trace: bool = False  # record per-stage spans and latency histograms
+    trace_path: str = ""  # JSON lines file for spans; "" keeps histograms in memory only
+
     # Prompting
     n_query_expansions: int = 0
+    query_expansion_timeout: float = 10.0  # seconds; falls back to the original query
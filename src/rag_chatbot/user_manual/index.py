@@ -1,157 +1,592 @@
+import hashlib
+import json
 import os
 import pickle
 import re
-from dataclasses import asdict, dataclass, field
-from typing import Any, Dict, List, Optional
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
-from langchain_community.vectorstores import FAISS
-from rank_bm25 import BM25Okapi
+import numpy as np
 
-from rag_chatbot.models import get_embeddings
+from rag_chatbot.common.embedding_cache import text_key
+from rag_chatbot.models import IN_PROCESS_EMBED_PROVIDERS, get_embeddings, get_llm
+from rag_chatbot.user_manual.bm25 import BM25Index
 from rag_chatbot.user_manual.config import Config
-from rag_chatbot.user_manual.chunking import Chunk
+from rag_chatbot.user_manual.chunking import Chunk, section_key, section_prefixes
+from rag_chatbot.user_manual.storage import (
+    FORMAT_VERSION,
+    MANIFEST,
+    load_chunks,
+    read_json,
+    save_chunks,
+    write_json,
+)
+from rag_chatbot.user_manual.vector_index import VectorStore, index_type_of, vector_dtype_of
 
 TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
 
 
+@dataclass
+class Adjacency:
+    """Neighbor and sibling tables over chunk rows, built once per index.
+
+    Rows follow document order. ``prev_row``/``next_row`` come from
+    ``Chunk.prev_id``/``next_id`` (``-1`` at either end); documents whose
+    chunks carry no links at all (indexes built before documents without a
+    TOC were linked) fall back to consecutive rows. Siblings are grouped
+    CSR-style by document and ``parent_key``: the group of row ``r`` is
+    ``sib_rows[sib_indptr[g]:sib_indptr[g + 1]]`` with ``g = sib_group[r]``,
+    and ``sib_pos[r]`` is the position of ``r`` inside it.
+    """
+
+    row_ids: List[str]
+    row_of: Dict[str, int]
+    prev_row: np.ndarray
+    next_row: np.ndarray
+    sib_indptr: np.ndarray
+    sib_rows: np.ndarray
+    sib_group: np.ndarray
+    sib_pos: np.ndarray
+
+
+def build_adjacency(chunks: List[Chunk]) -> Adjacency:
+    row_ids = [c.id for c in chunks]
+    row_of = {cid: i for i, cid in enumerate(row_ids)}
+    n = len(chunks)
+    prev_row = np.array([row_of.get(c.prev_id, -1) for c in chunks], dtype=np.int32)
+    next_row = np.array([row_of.get(c.next_id, -1) for c in chunks], dtype=np.int32)
+    linked = {c.doc_id for c in chunks if c.prev_id or c.next_id}
+    unlinked: Dict[str, List[int]] = {}
+    for i, c in enumerate(chunks):
+        if c.doc_id not in linked:
+            unlinked.setdefault(c.doc_id, []).append(i)
+    for rows in unlinked.values():
+        for a, b in zip(rows, rows[1:]):
+            next_row[a], prev_row[b] = b, a
+
+    groups: Dict[str, List[int]] = {}
+    for i, c in enumerate(chunks):
+        groups.setdefault(section_key(c.doc_id, c.parent_key), []).append(i)
+    sib_indptr = np.zeros(len(groups) + 1, dtype=np.int64)
+    sib_rows = np.empty(n, dtype=np.int32)
+    sib_group = np.empty(n, dtype=np.int32)
+    sib_pos = np.empty(n, dtype=np.int32)
+    start = 0
+    for g, rows in enumerate(groups.values()):
+        sib_rows[start:start + len(rows)] = rows
+        sib_group[rows] = g
+        sib_pos[rows] = np.arange(len(rows))
+        start += len(rows)
+        sib_indptr[g + 1] = start
+    return Adjacency(row_ids, row_of, prev_row, next_row, sib_indptr, sib_rows, sib_group, sib_pos)
+
+
+@dataclass
+class DocRows:
+    """FAISS and BM25 rows of every document, used to pre-filter searches."""
+
+    faiss: Dict[str, np.ndarray]
+    bm25: Dict[str, np.ndarray]
+
+
+def _rows_by_doc(row_ids: List[str], chunks: Dict[str, Chunk]) -> Dict[str, np.ndarray]:
+    rows: Dict[str, List[int]] = {}
+    for r, cid in enumerate(row_ids):
+        rows.setdefault(chunks[cid].doc_id, []).append(r)
+    return {doc: np.array(rs, dtype=np.int64) for doc, rs in rows.items()}
+
+
+def build_doc_rows(id_lookup: List[str], bm25_id_lookup: List[str], chunks: Dict[str, Chunk]) -> DocRows:
+    return DocRows(_rows_by_doc(id_lookup, chunks), _rows_by_doc(bm25_id_lookup, chunks))
+
+
 @dataclass
 class Index:
+    """Chunks of one or more documents with a shared FAISS store and BM25 index.
+
+    Chunks carry their ``doc_id``; ``doc_rows`` maps every document to its
+    rows in both indexes so a query can be restricted to a set of documents.
+    """
+
     cfg: Config
-    faiss: FAISS
+    faiss: VectorStore
     id_lookup: List[str]
-    bm25: BM25Okapi
-    bm25_corpus_tokens: List[List[str]]
+    bm25: BM25Index
     bm25_id_lookup: List[str]
     chunks: Dict[str, Chunk] = field(default_factory=dict)
     siblings_by_parent: Dict[str, List[str]] = field(default_factory=dict)
     chunk_summaries: Dict[str, Dict[str, Any]] = field(default_factory=dict)
     section_summaries: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    adjacency: Optional[Adjacency] = None
+    doc_rows: Optional[DocRows] = None
 
+    @property
+    def doc_ids(self) -> List[str]:
+        return list(self.doc_rows.faiss) if self.doc_rows else []
 
-def build_index(
-    chunks: List[Chunk],
-    cfg: Config,
-    chunk_summaries: Optional[Dict[str, Dict[str, Any]]] = None,
-    section_summaries: Optional[Dict[str, Dict[str, Any]]] = None,
-) -> Index:
-    chunk_summaries = chunk_summaries or {}
-    section_summaries = section_summaries or {}
+    @cached_property
+    def version(self) -> str:
+        """Content hash of the chunks (whose ids are content hashes) and summaries."""
+        h = hashlib.sha256()
+        for cid in sorted(self.chunks):
+            h.update(cid.encode("utf-8") + b"\0")
+        summaries = {"chunks": self.chunk_summaries, "sections": self.section_summaries}
+        h.update(json.dumps(summaries, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return h.hexdigest()[:24]
 
-    texts = []
-    metadatas = []
-    for c in chunks:
-        text_parts: List[str] = []
-        ch_sum = chunk_summaries.get(c.id)
-        if ch_sum:
-            text_parts.append(ch_sum.get("retrieval_text", ""))
-        sec_sum = section_summaries.get(c.heading_num)
-        if sec_sum:
-            text_parts.append(sec_sum.get("retrieval_text", ""))
-        if not text_parts:
-            text_parts.append(c.text)
-        texts.append("\n".join(t for t in text_parts if t))
-        meta = {
-            "id": c.id,
-            "toc_path": c.toc_path,
-            "page_start": c.page_start,
-            "page_end": c.page_end,
-            "heading_num": c.heading_num,
-            "heading_title": c.heading_title,
-            "heading_level": c.heading_level,
-            "ordinal_in_section": c.ordinal_in_section,
-            "parent_key": c.parent_key,
-        }
-        if ch_sum:
-            meta["chunk_summary"] = ch_sum
-        if sec_sum:
-            meta["section_summary"] = sec_sum
-        metadatas.append(meta)
-
-    embeddings = get_embeddings(cfg.embed_model, provider=cfg.embed_provider)
-    vectorstore = FAISS.from_texts(texts=texts, embedding=embeddings, metadatas=metadatas)
-
-    corpus_tokens = [TOKEN_PATTERN.findall(t.lower()) for t in texts]
-    bm25 = BM25Okapi(corpus_tokens)
-
-    id_lookup = [m.id for m in vectorstore.docstore._dict.values()]  # type: ignore
-    bm25_id_lookup = id_lookup[:]
 
+def embeddings_for(cfg: Config):
+    """Embeddings model configured by ``cfg``, including its vector caches."""
+    kwargs: Dict[str, Any] = {}
+    if cfg.embed_provider in IN_PROCESS_EMBED_PROVIDERS:
+        kwargs = dict(
+            batch_size=cfg.embed_batch_size,
+            threads=cfg.embed_threads,
+            quantize=cfg.embed_quantize,
+            cache_folder=getattr(cfg, "cache_folder", "data/cache"),
+        )
+    return get_embeddings(
+        cfg.embed_model,
+        provider=cfg.embed_provider,
+        cache_path=cfg.embed_cache_path,
+        cache_max_entries=cfg.embed_cache_max_entries,
+        query_cache_size=cfg.query_cache_size,
+        **kwargs,
+    )
+
+
+def _siblings_by_parent(chunks: List[Chunk]) -> Dict[str, List[str]]:
     sibs: Dict[str, List[str]] = {}
-    by_parent: Dict[str, List[Chunk]] = {}
     for c in chunks:
-        by_parent.setdefault(c.parent_key, []).append(c)
-    for pk, lst in by_parent.items():
-        sibs[pk] = [c.id for c in lst]
+        sibs.setdefault(section_key(c.doc_id, c.parent_key), []).append(c.id)
+    return sibs
+
+
+def _index_text(
+    c: Chunk,
+    chunk_summaries: Dict[str, Dict[str, Any]],
+    section_summaries: Dict[str, Dict[str, Any]],
+) -> str:
+    """Text that is embedded and BM25-indexed for ``c``."""
+    text_parts: List[str] = []
+    ch_sum = chunk_summaries.get(c.id)
+    if ch_sum:
+        text_parts.append(ch_sum.get("retrieval_text", ""))
+    sec_sum = section_summaries.get(section_key(c.doc_id, c.heading_num))
+    if sec_sum:
+        text_parts.append(sec_sum.get("retrieval_text", ""))
+    if not text_parts:
+        text_parts.append(c.text)
+    return "\n".join(t for t in text_parts if t)
 
-    chunk_map = {c.id: c for c in chunks}
 
+def _tokenize(texts: List[str]) -> List[List[str]]:
+    return [TOKEN_PATTERN.findall(t.lower()) for t in texts]
+
+
+def _assemble(
+    cfg: Config,
+    store: VectorStore,
+    chunks: List[Chunk],
+    bm25: BM25Index,
+    bm25_id_lookup: List[str],
+    chunk_summaries: Dict[str, Dict[str, Any]],
+    section_summaries: Dict[str, Dict[str, Any]],
+) -> Index:
+    chunk_map = {c.id: c for c in chunks}
+    id_lookup = list(store.ids)
     return Index(
         cfg=cfg,
-        faiss=vectorstore,
+        faiss=store,
         id_lookup=id_lookup,
         bm25=bm25,
-        bm25_corpus_tokens=corpus_tokens,
         bm25_id_lookup=bm25_id_lookup,
         chunks=chunk_map,
-        siblings_by_parent=sibs,
+        siblings_by_parent=_siblings_by_parent(chunks),
         chunk_summaries=chunk_summaries,
         section_summaries=section_summaries,
+        adjacency=build_adjacency(chunks),
+        doc_rows=build_doc_rows(id_lookup, bm25_id_lookup, chunk_map),
+    )
+
+
+@dataclass
+class EmbedStats:
+    """Throughput of one :func:`embed_texts` run."""
+
+    texts: int = 0
+    batches: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+
+    @property
+    def texts_per_s(self) -> float:
+        return self.texts / self.seconds if self.seconds else 0.0
+
+
+def embed_texts(
+    embeddings: Any,
+    texts: List[str],
+    cfg: Config,
+    progress: Optional[Callable[[int, int], None]] = None,
+    stats: Optional[EmbedStats] = None,
+) -> np.ndarray:
+    """Embed ``texts`` into an ``(n, dim)`` float32 array.
+
+    Texts are sent in batches of ``cfg.embed_batch_size`` with at most
+    ``cfg.embed_concurrency`` requests in flight; a new batch is only
+    submitted when one finishes. Each batch is retried up to
+    ``cfg.embed_retries`` times with exponential backoff before the error is
+    raised. Finished batches are already in the embedding cache, so a rerun
+    after a failure resumes where this one stopped.
+    """
+    start = time.perf_counter()
+    stats = stats if stats is not None else EmbedStats()
+    size = max(1, cfg.embed_batch_size)
+    spans = [(lo, min(lo + size, len(texts))) for lo in range(0, len(texts), size)]
+    out: Optional[np.ndarray] = None
+
+    def run(lo: int, hi: int) -> Tuple[int, int, List[List[float]]]:
+        attempt = 0
+        while True:
+            try:
+                return lo, hi, embeddings.embed_documents(texts[lo:hi])
+            except Exception:
+                if attempt >= cfg.embed_retries:
+                    raise
+                time.sleep(cfg.embed_backoff_s * 2 ** attempt)
+                attempt += 1
+                stats.retries += 1
+
+    done = 0
+    if progress:
+        progress(done, len(texts))
+    todo = iter(spans)
+    with ThreadPoolExecutor(max_workers=max(1, cfg.embed_concurrency)) as pool:
+        pending: Set[Future] = set()
+
+        def refill() -> None:
+            while len(pending) < max(1, cfg.embed_concurrency):
+                span = next(todo, None)
+                if span is None:
+                    return
+                pending.add(pool.submit(run, *span))
+
+        refill()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                pending.discard(fut)
+                lo, hi, vecs = fut.result()
+                if out is None:
+                    out = np.empty((len(texts), len(vecs[0])), dtype=np.float32)
+                out[lo:hi] = vecs
+                done += hi - lo
+                stats.batches += 1
+                if progress:
+                    progress(done, len(texts))
+            refill()
+
+    stats.texts += len(texts)
+    stats.seconds += time.perf_counter() - start
+    return out if out is not None else np.empty((0, 0), dtype=np.float32)
+
+
+def build_index(
+    chunks: List[Chunk],
+    cfg: Config,
+    chunk_summaries: Optional[Dict[str, Dict[str, Any]]] = None,
+    section_summaries: Optional[Dict[str, Dict[str, Any]]] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    stats: Optional[EmbedStats] = None,
+) -> Index:
+    chunk_summaries = chunk_summaries or {}
+    section_summaries = section_summaries or {}
+
+    texts = [_index_text(c, chunk_summaries, section_summaries) for c in chunks]
+    ids = [c.id for c in chunks]
+
+    embeddings = embeddings_for(cfg)
+    vectors = embed_texts(embeddings, texts, cfg, progress=progress, stats=stats)
+    vectorstore = VectorStore.build(vectors, embeddings, ids, [text_key(t) for t in texts], cfg)
+    bm25 = BM25Index.build(_tokenize(texts))
+    return _assemble(cfg, vectorstore, chunks, bm25, ids, chunk_summaries, section_summaries)
+
+
+@dataclass
+class UpdateStats:
+    """What :func:`update_index` or :func:`remove_documents` changed."""
+
+    added: int
+    removed: int
+    reembedded: int
+    kept: int
+
+
+def update_index(
+    ix: Index,
+    chunks: List[Chunk],
+    chunk_summaries: Optional[Dict[str, Dict[str, Any]]] = None,
+    section_summaries: Optional[Dict[str, Dict[str, Any]]] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    stats: Optional[EmbedStats] = None,
+) -> Tuple[Index, UpdateStats]:
+    """Add the documents ``chunks`` belong to, or replace them if present.
+
+    Chunks of other documents are untouched. Within a replaced document,
+    chunks are matched by id: vectors and postings of removed chunks are
+    deleted, and only new chunks plus kept chunks whose index text changed
+    (for example because their section summary was regenerated) are embedded
+    and appended. Kept chunks take their metadata from ``chunks``. The vector
+    store of ``ix`` is modified; save the result with :func:`save_index`.
+    """
+    scope = {c.doc_id for c in chunks}
+    return _replace_documents(
+        ix, scope, chunks, chunk_summaries or {}, section_summaries or {}, progress, stats
+    )
+
+
+def remove_documents(ix: Index, doc_ids: List[str]) -> Tuple[Index, UpdateStats]:
+    """Drop every chunk of ``doc_ids`` from ``ix`` without touching other documents."""
+    return _replace_documents(ix, set(doc_ids), [], {}, {}, None, None)
+
+
+def _replace_documents(
+    ix: Index,
+    scope: Set[str],
+    chunks: List[Chunk],
+    chunk_summaries: Dict[str, Dict[str, Any]],
+    section_summaries: Dict[str, Dict[str, Any]],
+    progress: Optional[Callable[[int, int], None]],
+    stats: Optional[EmbedStats],
+) -> Tuple[Index, UpdateStats]:
+    store = ix.faiss
+    old_scope = [c for c in ix.chunks.values() if c.doc_id in scope]
+
+    row_of = {cid: r for r, cid in enumerate(store.ids)}
+
+    texts = [_index_text(c, chunk_summaries, section_summaries) for c in chunks]
+    keys = [text_key(t) for t in texts]
+    new_ids = {c.id for c in chunks}
+    drop = {c.id for c in old_scope if c.id not in new_ids}
+    removed = len(drop)
+    todo: List[int] = []
+    for i, c in enumerate(chunks):
+        r = row_of.get(c.id)
+        if r is None:
+            todo.append(i)
+        elif store.text_keys[r] != keys[i]:
+            drop.add(c.id)
+            todo.append(i)
+
+    bm25, bm25_ids = ix.bm25, ix.bm25_id_lookup
+    if drop:
+        store.remove([r for r, cid in enumerate(store.ids) if cid in drop], ix.cfg)
+        bm25 = bm25.remove([r for r, cid in enumerate(bm25_ids) if cid in drop])
+        bm25_ids = [cid for cid in bm25_ids if cid not in drop]
+    if todo:
+        new_texts = [texts[i] for i in todo]
+        vectors = embed_texts(store.embeddings, new_texts, ix.cfg, progress=progress, stats=stats)
+        store.add(vectors, [chunks[i].id for i in todo], [keys[i] for i in todo])
+        bm25 = bm25.add(_tokenize(new_texts))
+        bm25_ids = bm25_ids + [chunks[i].id for i in todo]
+
+    added = sum(1 for c in chunks if c.id not in row_of)
+    changes = UpdateStats(
+        added=added,
+        removed=removed,
+        reembedded=len(todo) - added,
+        kept=len(chunks) - len(todo),
+    )
+
+    stale_sections = {
+        section_key(c.doc_id, num) for c in old_scope for num in section_prefixes(c.heading_num)
+    }
+    all_chunks = [c for c in ix.chunks.values() if c.doc_id not in scope] + chunks
+    kept_summaries = {
+        cid: s for cid, s in ix.chunk_summaries.items()
+        if cid in ix.chunks and ix.chunks[cid].doc_id not in scope
+    }
+    kept_summaries.update(chunk_summaries)
+    kept_sections = {k: s for k, s in ix.section_summaries.items() if k not in stale_sections}
+    kept_sections.update(section_summaries)
+    new_ix = _assemble(ix.cfg, store, all_chunks, bm25, bm25_ids, kept_summaries, kept_sections)
+    return new_ix, changes
+
+
+def _write_common(
+    path: str,
+    bm25: BM25Index,
+    bm25_ids: List[str],
+    chunks: List[Chunk],
+    summaries: Dict[str, Any],
+    embed_model: str,
+    embed_provider: str,
+    faiss_index_type: str,
+    vector_dtype: str,
+) -> None:
+    bm25.save(os.path.join(path, "bm25"))
+    write_json(os.path.join(path, "bm25", "ids.json"), bm25_ids)
+    save_chunks(chunks, os.path.join(path, "chunks"))
+    write_json(os.path.join(path, "summaries.json"), summaries)
+    write_json(
+        os.path.join(path, MANIFEST),
+        {
+            "format_version": FORMAT_VERSION,
+            "embed_model": embed_model,
+            "embed_provider": embed_provider,
+            "faiss_index_type": faiss_index_type,
+            "vector_dtype": vector_dtype,
+        },
     )
 
 
 def save_index(ix: Index, path: str) -> None:
-    """Persist an index to disk."""
+    """Persist an index to disk in the versioned format.
+
+    Layout: ``faiss/`` (see :class:`VectorStore`), ``bm25/`` (postings as ``.npy``),
+    ``chunks/`` (text blob, offsets and metadata columns), ``summaries.json``
+    and ``manifest.json``. The manifest is written last, so a directory with a
+    manifest is always complete.
+    """
     os.makedirs(path, exist_ok=True)
-    ix.faiss.save_local(os.path.join(path, "faiss"))
-    meta = {
-        "embed_model": ix.cfg.embed_model,
-        "embed_provider": ix.cfg.embed_provider,
-        "id_lookup": ix.id_lookup,
-        "bm25_corpus_tokens": ix.bm25_corpus_tokens,
-        "bm25_id_lookup": ix.bm25_id_lookup,
-        "chunks": [asdict(ch) for ch in ix.chunks.values()],
-        "siblings_by_parent": ix.siblings_by_parent,
-        "chunk_summaries": ix.chunk_summaries,
-        "section_summaries": ix.section_summaries,
-    }
-    with open(os.path.join(path, "meta.pkl"), "wb") as f:
-        pickle.dump(meta, f)
+    ix.faiss.save(os.path.join(path, "faiss"))
+    _write_common(
+        path,
+        bm25=ix.bm25,
+        bm25_ids=ix.bm25_id_lookup,
+        chunks=list(ix.chunks.values()),
+        summaries={"chunks": ix.chunk_summaries, "sections": ix.section_summaries},
+        embed_model=ix.cfg.embed_model,
+        embed_provider=ix.cfg.embed_provider,
+        faiss_index_type=index_type_of(ix.faiss.index),
+        vector_dtype=vector_dtype_of(ix.faiss.index),
+    )
+
+
+def convert_legacy_index(path: str) -> None:
+    """Rewrite a ``meta.pkl`` index in place using the versioned format.
+
+    The FAISS index is reused as-is and its LangChain docstore replaced by
+    row ids; BM25 statistics are computed once from the pickled token lists
+    and saved. ``meta.pkl`` is left untouched. Its ``bm25_id_lookup`` holds
+    docstore UUIDs rather than chunk ids, but BM25 rows were built in FAISS
+    row order, so they take the chunk ids of the FAISS rows.
+    """
+    with open(os.path.join(path, "meta.pkl"), "rb") as f:
+        meta = pickle.load(f)
+
+    row_ids = _convert_langchain_store(os.path.join(path, "faiss"))
+    _write_common(
+        path,
+        bm25=BM25Index.build(meta["bm25_corpus_tokens"]),
+        bm25_ids=row_ids,
+        chunks=[Chunk(**c) for c in meta["chunks"]],
+        summaries={
+            "chunks": meta.get("chunk_summaries", {}),
+            "sections": meta.get("section_summaries", {}),
+        },
+        embed_model=meta.get("embed_model", Config.embed_model),
+        embed_provider=meta.get("embed_provider", Config.embed_provider),
+        faiss_index_type="flat",
+        vector_dtype="float32",
+    )
+
+
+def _convert_langchain_store(store_dir: str) -> List[str]:
+    """Replace the docstore of a LangChain FAISS store with :class:`VectorStore` rows.
+
+    Row ids are the chunk ids in the document metadata and text keys hash the
+    stored page content; ``index.faiss`` is kept and ``index.pkl`` removed.
+    Returns the row ids.
+    """
+    pkl = os.path.join(store_dir, "index.pkl")
+    with open(pkl, "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    docs = [docstore.search(index_to_docstore_id[i]) for i in range(len(index_to_docstore_id))]
+    ids = [d.metadata["id"] for d in docs]
+    write_json(
+        os.path.join(store_dir, "rows.json"),
+        {"ids": ids, "text_keys": [text_key(d.page_content) for d in docs]},
+    )
+    os.remove(pkl)
+    return ids
+
+
+def warm_up_models(cfg: Config) -> None:
+    """Load the answering LLM, embeddings and reranker into the model registry."""
+    from rag_chatbot.user_manual.reranking import get_reranker
 
+    get_llm(cfg.llm_model, provider=cfg.llm_provider)
+    embeddings_for(cfg)
+    if cfg.use_reranker:
+        get_reranker(cfg)
 
-def load_index(path: str, cfg: Optional[Config] = None) -> Index:
+
+def load_index(path: str, cfg: Optional[Config] = None, warm_up: bool = False) -> Index:
     """Load a previously saved index from disk.
 
     If ``cfg`` is provided, its values will be used for runtime configuration.
     Only the embedding settings stored with the index are preserved, allowing
-    chatbot parameters to change after preprocessing.
+    chatbot parameters to change after preprocessing, except that an
+    in-process embedding provider in ``cfg`` replaces the stored provider.
+    With ``warm_up`` the models used at query time are loaded up front so the
+    first answer does not pay for them. BM25 postings and the float32 vectors
+    of lossy vector indexes are memory-mapped, and nothing is re-tokenized.
     """
 
-    with open(os.path.join(path, "meta.pkl"), "rb") as f:
-        meta = pickle.load(f)
+    manifest_path = os.path.join(path, MANIFEST)
+    if not os.path.exists(manifest_path):
+        if os.path.exists(os.path.join(path, "meta.pkl")):
+            raise ValueError(
+                f"{path} uses the legacy meta.pkl format; "
+                "convert it with scripts/convert_index.py first"
+            )
+        raise FileNotFoundError(manifest_path)
+    meta = read_json(manifest_path)
+    if meta.get("format_version") != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported index format {meta.get('format_version')} in {path}; "
+            f"expected {FORMAT_VERSION}"
+        )
 
     cfg_out = cfg or Config()
-    # Ensure embedding settings match the preprocessed index
+    # Ensure embedding settings match the preprocessed index. An in-process
+    # provider may stand in for the one the index was built with, since it
+    # runs the same model.
     cfg_out.embed_model = meta.get("embed_model", cfg_out.embed_model)
-    cfg_out.embed_provider = meta.get("embed_provider", cfg_out.embed_provider)
+    stored_provider = meta.get("embed_provider", cfg_out.embed_provider)
+    if cfg_out.embed_provider not in IN_PROCESS_EMBED_PROVIDERS:
+        cfg_out.embed_provider = stored_provider
+    cfg_out.faiss_index_type = meta.get("faiss_index_type", "flat")
+    cfg_out.vector_dtype = meta.get("vector_dtype", "float32")
 
-    embeddings = get_embeddings(cfg_out.embed_model, provider=cfg_out.embed_provider)
-    faiss_store = FAISS.load_local(
-        os.path.join(path, "faiss"), embeddings, allow_dangerous_deserialization=True
-    )
+    embeddings = embeddings_for(cfg_out)
+    faiss_store = VectorStore.load(os.path.join(path, "faiss"), embeddings)
+    if cfg_out.embed_provider != stored_provider:
+        dim = len(embeddings.embed_query("dimension check"))
+        if dim != faiss_store.index.d:
+            raise ValueError(
+                f"{cfg_out.embed_provider} model {cfg_out.embed_model} returns {dim}-dim vectors "
+                f"but {path} was built by {stored_provider} with {faiss_store.index.d} dims"
+            )
 
-    corpus_tokens = meta["bm25_corpus_tokens"]
-    bm25 = BM25Okapi(corpus_tokens)
-    chunk_objs = {c["id"]: Chunk(**c) for c in meta["chunks"]}
+    bm25 = BM25Index.load(os.path.join(path, "bm25"))
+    chunks = load_chunks(os.path.join(path, "chunks"))
+    summaries = read_json(os.path.join(path, "summaries.json"))
 
-    return Index(
-        cfg=cfg_out,
-        faiss=faiss_store,
-        id_lookup=meta["id_lookup"],
-        bm25=bm25,
-        bm25_corpus_tokens=corpus_tokens,
-        bm25_id_lookup=meta["bm25_id_lookup"],
-        chunks=chunk_objs,
-        siblings_by_parent=meta["siblings_by_parent"],
-        chunk_summaries=meta.get("chunk_summaries", {}),
-        section_summaries=meta.get("section_summaries", {}),
+    if warm_up:
+        warm_up_models(cfg_out)
+
+    return _assemble(
+        cfg_out,
+        faiss_store,
+        chunks,
+        bm25,
+        read_json(os.path.join(path, "bm25", "ids.json")),
+        summaries.get("chunks", {}),
+        summaries.get("sections", {}),
     )
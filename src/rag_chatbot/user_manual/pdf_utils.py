@@ -1,17 +1,159 @@
-from typing import List, Tuple
+"""PDF text extraction, optionally parallel and cached per page.
+
+Pages are extracted by a pool of processes, each opening its own
+``PdfReader`` on a contiguous page range, and are yielded in page order as
+soon as the range that contains them is done. Extracted text is cached in
+SQLite keyed by the SHA-256 of the file and the page number, so re-running
+on an unchanged PDF reads nothing but the cache.
+"""
+import hashlib
+import math
+import os
+import sqlite3
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Dict, Iterator, List, Tuple, Union
 
 from pypdf import PdfReader
 
+CACHE_FLUSH_PAGES = 64
 
-def load_pdf_text(pdf_path: str) -> List[Tuple[int, str]]:
-    """Return list of (page_number starting at 1, page_text)."""
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class PageCache:
+    """SQLite table of extracted page text keyed by ``(file hash, page number)``."""
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "file TEXT NOT NULL, page INTEGER NOT NULL, text TEXT NOT NULL, "
+            "PRIMARY KEY (file, page)) WITHOUT ROWID"
+        )
+
+    def get_all(self, file: str) -> Dict[int, str]:
+        rows = self._db.execute("SELECT page, text FROM pages WHERE file = ?", (file,))
+        return dict(rows.fetchall())
+
+    def put_many(self, file: str, pages: List[Tuple[int, str]]) -> None:
+        self._db.executemany(
+            "INSERT OR REPLACE INTO pages (file, page, text) VALUES (?, ?, ?)",
+            [(file, p, t) for p, t in pages],
+        )
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def pdf_page_count(pdf_path: str) -> int:
+    return len(PdfReader(pdf_path).pages)
+
+
+def _extract(page) -> str:
+    try:
+        return page.extract_text() or ""
+    except Exception:
+        return ""
+
+
+def _extract_range(pdf_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract pages ``start..end-1`` (0-based) with a reader of this process's own."""
     reader = PdfReader(pdf_path)
-    pages: List[Tuple[int, str]] = []
-    for i, page in enumerate(reader.pages):
-        page_no = i + 1
-        try:
-            txt = page.extract_text() or ""
-        except Exception:
-            txt = ""
-        pages.append((page_no, txt))
-    return pages
+    return [(i + 1, _extract(reader.pages[i])) for i in range(start, end)]
+
+
+def iter_pdf_text(
+    pdf_path: str,
+    workers: int = 1,
+    cache_path: str = "",
+    pages_per_task: int = 0,
+) -> Iterator[Tuple[int, str]]:
+    """Yield ``(page_number starting at 1, page_text)`` in page order, lazily.
+
+    With ``workers > 1`` uncached pages are split into ranges of
+    ``pages_per_task`` pages (default: about four ranges per worker) and
+    extracted in a process pool, with at most ``2 * workers`` ranges
+    submitted ahead of the page being yielded. With ``cache_path`` text is
+    read from and written to a :class:`PageCache`.
+    """
+    reader = PdfReader(pdf_path)
+    n_pages = len(reader.pages)
+    cache = PageCache(cache_path) if cache_path else None
+    key = file_hash(pdf_path) if cache else ""
+    cached = cache.get_all(key) if cache else {}
+    try:
+        if workers <= 1:
+            # Pages are written in batches, one SQLite commit per CACHE_FLUSH_PAGES.
+            fresh: List[Tuple[int, str]] = []
+            try:
+                for i in range(n_pages):
+                    if i + 1 in cached:
+                        yield i + 1, cached[i + 1]
+                        continue
+                    text = _extract(reader.pages[i])
+                    if cache:
+                        fresh.append((i + 1, text))
+                        if len(fresh) >= CACHE_FLUSH_PAGES:
+                            cache.put_many(key, fresh)
+                            fresh = []
+                    yield i + 1, text
+            finally:
+                if cache and fresh:
+                    cache.put_many(key, fresh)
+            return
+
+        step = pages_per_task or max(1, math.ceil(n_pages / (workers * 4)))
+        # Runs of cached pages are served directly; the gaps become extraction tasks.
+        segments: List[Union[Tuple[int, str], Tuple[int, int]]] = []
+        start = 0
+        while start < n_pages:
+            if start + 1 in cached:
+                segments.append((start + 1, cached[start + 1]))
+                start += 1
+                continue
+            end = start
+            while end < n_pages and end - start < step and end + 1 not in cached:
+                end += 1
+            segments.append((start, end))
+            start = end
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tasks = iter([s for s in segments if isinstance(s[1], int)])
+            pending: Deque[Future] = deque()
+
+            def refill() -> None:
+                while len(pending) < 2 * workers:
+                    task = next(tasks, None)
+                    if task is None:
+                        return
+                    pending.append(pool.submit(_extract_range, pdf_path, *task))
+
+            refill()
+            for seg in segments:
+                if isinstance(seg[1], str):
+                    yield seg  # type: ignore[misc]
+                    continue
+                pages = pending.popleft().result()
+                refill()
+                if cache:
+                    cache.put_many(key, pages)
+                yield from pages
+    finally:
+        if cache:
+            cache.close()
+
+
+def load_pdf_text(
+    pdf_path: str, workers: int = 1, cache_path: str = ""
+) -> List[Tuple[int, str]]:
+    """Return list of (page_number starting at 1, page_text)."""
+    return list(iter_pdf_text(pdf_path, workers=workers, cache_path=cache_path))
@@ -1,55 +1,332 @@
 import re
-from typing import List
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
 
+from pydantic import BaseModel, Field
+
+from rag_chatbot.common.executor import run_cpu
+from rag_chatbot.common.prompt_registry import registry
 from rag_chatbot.models import get_llm, get_cross_encoder
+from rag_chatbot.user_manual.config import Config
 from rag_chatbot.user_manual.index import Index
 
 
+@dataclass
+class RerankStats:
+    """Timing and cache usage of one ``rerank`` call."""
+
+    seconds: float
+    scored: int
+    cached: int = 0
+
+
+Ranked = Tuple[List[str], RerankStats]
+
+
 class BaseReranker:
-    """Base reranker interface."""
+    """Base reranker interface.
 
-    def rerank(self, ix: Index, query: str, candidate_ids: List[str]) -> List[str]:
+    ``rerank`` returns the reordered ids with the stats of that call. Rerankers
+    are shared between concurrent requests, so they keep no per-call state.
+    """
+
+    def rerank(self, ix: Index, query: str, candidate_ids: List[str]) -> Ranked:
         raise NotImplementedError
 
+    async def arerank(self, ix: Index, query: str, candidate_ids: List[str]) -> Ranked:
+        """Run :meth:`rerank` on the shared CPU pool; I/O-bound rerankers override this."""
+        return await run_cpu(
+            self.rerank, ix, query, candidate_ids, max_workers=ix.cfg.cpu_workers
+        )
+
+
+def _parse_score(out: str) -> float:
+    match = re.search(r"[0-1]?\.\d+", out)
+    return float(match.group()) if match else 0.0
+
 
 class LLMReranker(BaseReranker):
-    """Rerank using an LLM that scores relevance."""
+    """Rerank using an LLM that scores each candidate's relevance.
+
+    One prompt per candidate; prompts run concurrently through ``batch`` (or
+    ``abatch`` in :meth:`arerank`) with at most ``concurrency`` in flight.
+    """
 
-    def __init__(self, model_name: str, provider: str = "ollama") -> None:
+    def __init__(self, model_name: str, provider: str = "ollama", concurrency: int = 4) -> None:
         self.llm = get_llm(model_name, provider=provider)
+        self.concurrency = concurrency
 
-    def rerank(self, ix: Index, query: str, candidate_ids: List[str]) -> List[str]:
-        pairs = [(cid, ix.chunks[cid].text) for cid in candidate_ids if cid in ix.chunks]
-        if not pairs:
-            return candidate_ids
+    def _prompts(self, ix: Index, query: str, candidate_ids: List[str]) -> Tuple[List[str], List[str]]:
+        cids = [cid for cid in candidate_ids if cid in ix.chunks]
+        prompts = [
+            "Given the query and document below, return a number between 0 and 1\n"
+            f"Query: {query}\nDocument: {ix.chunks[cid].text}\nScore:"
+            for cid in cids
+        ]
+        return cids, prompts
+
+    def _rank(self, cids: List[str], outputs: List[Any], start: float) -> Ranked:
         scored = []
-        for cid, text in pairs:
-            prompt = (
-                "Given the query and document below, return a number between 0 and 1\n"
-                f"Query: {query}\nDocument: {text}\nScore:"
-            )
-            try:
-                out = self.llm.invoke(prompt).content
-                match = re.search(r"[0-1]?\.\d+", out)
-                score = float(match.group()) if match else 0.0
-            except Exception:
-                score = 0.0
+        for cid, out in zip(cids, outputs):
+            score = 0.0 if isinstance(out, Exception) else _parse_score(out.content)
             scored.append((score, cid))
-        ranked = [cid for _, cid in sorted(scored, key=lambda x: x[0], reverse=True)]
-        return ranked
+        stats = RerankStats(seconds=time.perf_counter() - start, scored=len(cids))
+        return [cid for _, cid in sorted(scored, key=lambda x: x[0], reverse=True)], stats
+
+    def rerank(self, ix: Index, query: str, candidate_ids: List[str]) -> Ranked:
+        start = time.perf_counter()
+        cids, prompts = self._prompts(ix, query, candidate_ids)
+        if not cids:
+            return candidate_ids, RerankStats(seconds=0.0, scored=0)
+        outputs = self.llm.batch(
+            prompts, config={"max_concurrency": self.concurrency}, return_exceptions=True
+        )
+        return self._rank(cids, outputs, start)
+
+    async def arerank(self, ix: Index, query: str, candidate_ids: List[str]) -> Ranked:
+        start = time.perf_counter()
+        cids, prompts = self._prompts(ix, query, candidate_ids)
+        if not cids:
+            return candidate_ids, RerankStats(seconds=0.0, scored=0)
+        outputs = await self.llm.abatch(
+            prompts, config={"max_concurrency": self.concurrency}, return_exceptions=True
+        )
+        return self._rank(cids, outputs, start)
+
+
+class ExcerptScore(BaseModel):
+    index: int
+    score: float
+
+
+class ListwiseScores(BaseModel):
+    """Schema for listwise relevance scores returned by the LLM."""
+
+    scores: List[ExcerptScore] = Field(default_factory=list)
+
+
+class ListwiseLLMReranker(BaseReranker):
+    """Rerank by scoring a window of candidates in one structured LLM call.
+
+    Candidates are split into windows of ``window`` with step ``stride``;
+    windows run concurrently and a candidate seen in several windows gets its
+    mean score. Candidates the model leaves out score 0.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        provider: str = "ollama",
+        window: int = 10,
+        stride: int = 5,
+        concurrency: int = 4,
+        doc_chars: int = 1500,
+    ) -> None:
+        self.structured = get_llm(model_name, provider=provider).with_structured_output(ListwiseScores)
+        self.window = max(1, window)
+        self.stride = max(1, min(stride, self.window))
+        self.concurrency = concurrency
+        self.doc_chars = doc_chars
+
+    def _windows(self, n: int) -> List[Tuple[int, int]]:
+        spans = []
+        start = 0
+        while True:
+            end = min(start + self.window, n)
+            spans.append((start, end))
+            if end >= n:
+                return spans
+            start += self.stride
+
+    def _prompts(self, ix: Index, query: str, cids: List[str], spans: List[Tuple[int, int]]) -> List[str]:
+        prompts = []
+        for lo, hi in spans:
+            docs = "\n\n".join(
+                f"[{i + 1}] {ix.chunks[cid].text[: self.doc_chars]}"
+                for i, cid in enumerate(cids[lo:hi])
+            )
+            prompts.append(registry["rerank_listwise"].format(query=query, documents=docs))
+        return prompts
+
+    def _rank(self, cids: List[str], spans: List[Tuple[int, int]], outputs: List[Any], start: float) -> Ranked:
+        totals: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        for (lo, hi), out in zip(spans, outputs):
+            if isinstance(out, Exception) or out is None:
+                continue
+            window_ids = cids[lo:hi]
+            for item in out.scores:
+                if 1 <= item.index <= len(window_ids):
+                    cid = window_ids[item.index - 1]
+                    totals[cid] = totals.get(cid, 0.0) + item.score
+                    counts[cid] = counts.get(cid, 0) + 1
+        mean = {cid: totals[cid] / counts[cid] for cid in totals}
+        stats = RerankStats(seconds=time.perf_counter() - start, scored=len(mean))
+        return sorted(cids, key=lambda cid: mean.get(cid, 0.0), reverse=True), stats
+
+    def rerank(self, ix: Index, query: str, candidate_ids: List[str]) -> Ranked:
+        start = time.perf_counter()
+        cids = [cid for cid in candidate_ids if cid in ix.chunks]
+        if not cids:
+            return candidate_ids, RerankStats(seconds=0.0, scored=0)
+        spans = self._windows(len(cids))
+        outputs = self.structured.batch(
+            self._prompts(ix, query, cids, spans),
+            config={"max_concurrency": self.concurrency},
+            return_exceptions=True,
+        )
+        return self._rank(cids, spans, outputs, start)
+
+    async def arerank(self, ix: Index, query: str, candidate_ids: List[str]) -> Ranked:
+        start = time.perf_counter()
+        cids = [cid for cid in candidate_ids if cid in ix.chunks]
+        if not cids:
+            return candidate_ids, RerankStats(seconds=0.0, scored=0)
+        spans = self._windows(len(cids))
+        outputs = await self.structured.abatch(
+            self._prompts(ix, query, cids, spans),
+            config={"max_concurrency": self.concurrency},
+            return_exceptions=True,
+        )
+        return self._rank(cids, spans, outputs, start)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
 
 
 class CrossEncoderReranker(BaseReranker):
-    """Rerank using a sentence-transformers CrossEncoder model."""
+    """Rerank using a sentence-transformers CrossEncoder model.
+
+    Pairs are sorted by text length before prediction so each batch of
+    ``batch_size`` holds similar lengths and pads little. Scores are kept in an
+    LRU cache keyed by ``(normalized query, chunk id)``, and with ``top_m`` only
+    the first ``top_m`` candidates are scored; the rest keep their order after
+    them.
+    """
 
-    def __init__(self, model_name: str, **kwargs) -> None:
-        self.model = get_cross_encoder(model_name, **kwargs)
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int = 32,
+        max_length: Optional[int] = None,
+        cache_size: int = 4096,
+        top_m: int = 0,
+        provider: str = "hf",
+        **kwargs,
+    ) -> None:
+        if max_length:
+            kwargs["max_length"] = max_length
+        self.model = get_cross_encoder(model_name, provider=provider, **kwargs)
+        self.batch_size = batch_size
+        self.top_m = top_m
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
 
-    def rerank(self, ix: Index, query: str, candidate_ids: List[str]) -> List[str]:
+    def rerank(self, ix: Index, query: str, candidate_ids: List[str]) -> Ranked:
+        start = time.perf_counter()
         filtered_ids = [cid for cid in candidate_ids if cid in ix.chunks]
         if not filtered_ids:
-            return candidate_ids
-        pairs = [(query, ix.chunks[cid].text) for cid in filtered_ids]
-        scores = self.model.predict(pairs)
-        ranked = [cid for _, cid in sorted(zip(scores, filtered_ids), key=lambda x: x[0], reverse=True)]
-        return ranked
+            return candidate_ids, RerankStats(seconds=0.0, scored=0)
+        head = filtered_ids[: self.top_m] if self.top_m > 0 else filtered_ids
+        tail = filtered_ids[len(head):]
+
+        qkey = normalize_query(query)
+        scores: Dict[str, float] = {}
+        missing: List[str] = []
+        with self._lock:
+            for cid in head:
+                score = self._cache.get((qkey, cid))
+                if score is None:
+                    missing.append(cid)
+                else:
+                    self._cache.move_to_end((qkey, cid))
+                    scores[cid] = score
+
+        if missing:
+            missing.sort(key=lambda cid: len(ix.chunks[cid].text))
+            pairs = [(query, ix.chunks[cid].text) for cid in missing]
+            preds = self.model.predict(pairs, batch_size=self.batch_size)
+            with self._lock:
+                for cid, score in zip(missing, preds):
+                    scores[cid] = float(score)
+                    self._cache[(qkey, cid)] = float(score)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        ranked = sorted(head, key=scores.__getitem__, reverse=True)
+        stats = RerankStats(
+            seconds=time.perf_counter() - start,
+            scored=len(missing),
+            cached=len(head) - len(missing),
+        )
+        return ranked + tail, stats
+
+
+_rerankers: Dict[Tuple, BaseReranker] = {}
+_rerankers_lock = threading.Lock()
+
+
+def get_reranker(cfg: Config) -> BaseReranker:
+    """Return the reranker selected by ``cfg``.
+
+    Rerankers are kept per configuration so their score caches survive across
+    queries; the underlying models come from the shared registry in
+    :mod:`rag_chatbot.models`. LLM rerankers left with the cross-encoder
+    defaults for ``reranker_provider`` and ``reranker_model`` use the
+    answering LLM's provider and model.
+    """
+    rtype = getattr(cfg, "reranker_type", "cross-encoder")
+    provider = getattr(cfg, "reranker_provider", "hf")
+    model = cfg.reranker_model
+    if rtype in ("llm", "llm-listwise"):
+        if provider == Config.reranker_provider:
+            provider = cfg.llm_provider
+        if model == Config.reranker_model:
+            model = cfg.llm_model
+    cache_folder = getattr(cfg, "cache_folder", "data/cache")
+    key = (
+        rtype,
+        model,
+        provider,
+        cfg.reranker_batch_size,
+        cfg.reranker_max_length,
+        cfg.reranker_cache_size,
+        cfg.rerank_top_m,
+        cfg.reranker_concurrency,
+        cfg.listwise_window,
+        cfg.listwise_stride,
+        cfg.listwise_doc_chars,
+    )
+    with _rerankers_lock:
+        reranker = _rerankers.get(key)
+        if reranker is None:
+            if rtype == "llm":
+                reranker = LLMReranker(
+                    model, provider=provider, concurrency=cfg.reranker_concurrency
+                )
+            elif rtype == "llm-listwise":
+                reranker = ListwiseLLMReranker(
+                    model,
+                    provider=provider,
+                    window=cfg.listwise_window,
+                    stride=cfg.listwise_stride,
+                    concurrency=cfg.reranker_concurrency,
+                    doc_chars=cfg.listwise_doc_chars,
+                )
+            else:
+                reranker = CrossEncoderReranker(
+                    model,
+                    batch_size=cfg.reranker_batch_size,
+                    max_length=cfg.reranker_max_length,
+                    cache_size=cfg.reranker_cache_size,
+                    top_m=cfg.rerank_top_m,
+                    provider=provider,
+                    cache_folder=cache_folder,
+                )
+            _rerankers[key] = reranker
+        return reranker
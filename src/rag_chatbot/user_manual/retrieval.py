@@ -1,23 +1,64 @@
+import asyncio
+import contextvars
+import logging
 import re
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Collection, Dict, List, Optional, Sequence, Tuple
 
+import faiss
+import numpy as np
 from rapidfuzz import fuzz
 
+from rag_chatbot.common.executor import run_cpu
 from rag_chatbot.common.prompt_registry import registry
+from rag_chatbot.common.tracing import span
 from rag_chatbot.models import get_llm
 from rag_chatbot.user_manual.config import Config
 from rag_chatbot.user_manual.index import Index
-from rag_chatbot.user_manual.reranking import CrossEncoderReranker, LLMReranker
+from rag_chatbot.user_manual.reranking import RerankStats, get_reranker
+from rag_chatbot.user_manual.vector_index import search_params
 
 TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+logger = logging.getLogger(__name__)
+# Per-request rather than on the shared reranker, so concurrent queries keep their own.
+_last_rerank: contextvars.ContextVar[Optional[RerankStats]] = contextvars.ContextVar(
+    "last_rerank", default=None
+)
 
+# Expansion is an LLM round trip; it runs here while first-pass search proceeds.
+_EXPANSION_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="query-expand")
 
-def multi_query_expand(query: str, cfg: Config) -> List[str]:
-    llm = get_llm(cfg.llm_model, provider=cfg.llm_provider)
-    prompt = registry["multi_query_expand"].format(
+
+def _expansion_prompt(query: str, cfg: Config) -> str:
+    return registry["multi_query_expand"].format(
         n_query_expansions=cfg.n_query_expansions, query=query
     )
-    out = llm.invoke(prompt).content
+
+
+def multi_query_expand(query: str, cfg: Config) -> List[str]:
+    if cfg.n_query_expansions <= 0:
+        return [query]
+    with span("multi_query_expand") as sp:
+        llm = get_llm(cfg.llm_model, provider=cfg.llm_provider)
+        out = llm.invoke(_expansion_prompt(query, cfg)).content
+        variants = _parse_expansions(query, out, cfg)
+        sp.set(variants=len(variants))
+    return variants
+
+
+async def amulti_query_expand(query: str, cfg: Config) -> List[str]:
+    if cfg.n_query_expansions <= 0:
+        return [query]
+    with span("multi_query_expand") as sp:
+        llm = get_llm(cfg.llm_model, provider=cfg.llm_provider)
+        out = (await llm.ainvoke(_expansion_prompt(query, cfg))).content
+        variants = _parse_expansions(query, out, cfg)
+        sp.set(variants=len(variants))
+    return variants
+
+
+def _parse_expansions(query: str, out: str, cfg: Config) -> List[str]:
     lines = [re.sub(r"[ \t]+", " ", x).strip() for x in out.splitlines() if re.sub(r"[ \t]+", " ", x).strip()]
     uniq: List[str] = []
     for s in lines:
@@ -29,60 +70,279 @@ def multi_query_expand(query: str, cfg: Config) -> List[str]:
 
 
 def rrf_fuse(rankings: List[List[str]], k: int) -> List[str]:
-    scores: Dict[str, float] = {}
-    for ranking in rankings:
-        for r, cid in enumerate(ranking):
-            scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + r + 1)
-    return [cid for cid, _ in sorted(scores.items(), key=lambda x: x[1], reverse=True)]
+    with span("rrf_fuse", rankings=len(rankings)) as sp:
+        scores: Dict[str, float] = {}
+        for ranking in rankings:
+            for r, cid in enumerate(ranking):
+                scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + r + 1)
+        fused = [cid for cid, _ in sorted(scores.items(), key=lambda x: x[1], reverse=True)]
+        sp.set(candidates=len(fused))
+    return fused
+
+
+def _selected_rows(rows_by_doc: Dict[str, np.ndarray], doc_ids: Collection[str]) -> np.ndarray:
+    parts = [rows_by_doc[d] for d in doc_ids if d in rows_by_doc]
+    return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+
+def faiss_filter(ix: Index, doc_ids: Collection[str]) -> Tuple[faiss.IDSelector, Optional[np.ndarray]]:
+    """FAISS pre-filter that admits only rows of ``doc_ids``.
+
+    Rows forming one contiguous run (a document added in one piece) give an
+    ``IDSelectorRange``; anything else an ``IDSelectorBitmap``. The returned
+    array backs the bitmap and must stay referenced while searching.
+    """
+    rows = _selected_rows(ix.doc_rows.faiss, doc_ids)
+    if rows.size and rows[-1] - rows[0] + 1 == rows.size:
+        return faiss.IDSelectorRange(int(rows[0]), int(rows[-1]) + 1), None
+    mask = np.zeros(ix.faiss.index.ntotal, dtype=bool)
+    mask[rows] = True
+    bits = np.packbits(mask, bitorder="little")
+    return faiss.IDSelectorBitmap(mask.size, faiss.swig_ptr(bits)), bits
+
+
+def bm25_filter(ix: Index, doc_ids: Collection[str]) -> np.ndarray:
+    """Boolean mask over BM25 rows that admits only chunks of ``doc_ids``."""
+    mask = np.zeros(ix.bm25.n_docs, dtype=bool)
+    mask[_selected_rows(ix.doc_rows.bm25, doc_ids)] = True
+    return mask
+
+
+def dense_search_batch(
+    ix: Index, queries: Sequence[str], topk: int, doc_ids: Optional[Collection[str]] = None
+) -> List[List[Tuple[str, float]]]:
+    """Search several queries with one embedding call and one FAISS search.
+
+    Query vectors come from the in-memory query cache when possible. With
+    ``doc_ids`` the search is restricted to those documents before ranking,
+    so ``topk`` results come from them even if other documents score higher.
+    Indexes holding lossy codes rank a larger shortlist again by exact
+    distance (see :meth:`~rag_chatbot.user_manual.vector_index.VectorStore.search`).
+
+    Returns one ``[(chunk_id, score), ...]`` ranking per query. Scores are
+    similarities (higher is better): inner products for IP indexes and
+    negated L2 distances otherwise.
+    """
+    if not queries:
+        return []
+    with span("dense_search", queries=len(queries)) as sp:
+        results = _search_vectors(ix, ix.faiss.embeddings.embed_queries(list(queries)), topk, doc_ids)
+        sp.set(candidates=sum(len(r) for r in results))
+    return results
+
+
+async def adense_search_batch(
+    ix: Index, queries: Sequence[str], topk: int, doc_ids: Optional[Collection[str]] = None
+) -> List[List[Tuple[str, float]]]:
+    """Async :func:`dense_search_batch`: awaits the embedding, searches on the CPU pool."""
+    if not queries:
+        return []
+    with span("dense_search", queries=len(queries)) as sp:
+        vecs = await ix.faiss.embeddings.aembed_queries(list(queries))
+        results = await run_cpu(_search_vectors, ix, vecs, topk, doc_ids, max_workers=ix.cfg.cpu_workers)
+        sp.set(candidates=sum(len(r) for r in results))
+    return results
+
+
+def _search_vectors(
+    ix: Index,
+    vectors: List[List[float]],
+    topk: int,
+    doc_ids: Optional[Collection[str]] = None,
+) -> List[List[Tuple[str, float]]]:
+    store = ix.faiss
+    vecs = np.asarray(vectors, dtype=np.float32)
+    if doc_ids is None:
+        params = search_params(store.index, ix.cfg)
+    else:
+        sel, _bits = faiss_filter(ix, doc_ids)
+        params = search_params(store.index, ix.cfg, sel=sel)
+    dists, rows = store.search(vecs, topk, params, ix.cfg.rescore_factor)
+    sign = 1.0 if store.index.metric_type == faiss.METRIC_INNER_PRODUCT else -1.0
+    return [
+        [(ix.id_lookup[r], sign * float(d)) for r, d in zip(row, dist) if r >= 0]
+        for row, dist in zip(rows, dists)
+    ]
+
+
+def dense_search(
+    ix: Index, query: str, topk: int, doc_ids: Optional[Collection[str]] = None
+) -> List[str]:
+    return [cid for cid, _ in dense_search_batch(ix, [query], topk, doc_ids)[0]]
 
 
-def dense_search(ix: Index, query: str, topk: int) -> List[str]:
-    docs = ix.faiss.similarity_search(query, k=topk)
-    return [d.metadata.get("id") for d in docs]
+def bm25_search(
+    ix: Index, query: str, topk: int, doc_ids: Optional[Collection[str]] = None
+) -> List[str]:
+    with span("bm25_search") as sp:
+        tokens = TOKEN_PATTERN.findall(query.lower())
+        mask = None if doc_ids is None else bm25_filter(ix, doc_ids)
+        rows, _ = ix.bm25.search(tokens, topk, mask=mask)
+        sp.set(candidates=len(rows))
+    return [ix.bm25_id_lookup[i] for i in rows]
 
 
-def bm25_search(ix: Index, query: str, topk: int) -> List[str]:
-    tokens = TOKEN_PATTERN.findall(query.lower())
-    scores = ix.bm25.get_scores(tokens)
-    ranked = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:topk]
-    return [ix.bm25_id_lookup[i] for i in ranked]
+def hybrid_search(ix: Index, query: str, doc_ids: Optional[Collection[str]] = None) -> List[str]:
+    """Run dense and BM25 search for the query and its expansions and fuse them.
+
+    The original query is searched while the expansion call is still in
+    flight; expanded variants are searched once they arrive. If expansion
+    exceeds ``cfg.query_expansion_timeout`` or fails, only the original query
+    is used.
+    ``doc_ids`` restricts both searches to those documents.
+    """
+    cfg = ix.cfg
+    pending = None
+    if cfg.n_query_expansions > 0:
+        pending = _EXPANSION_POOL.submit(contextvars.copy_context().run, multi_query_expand, query, cfg)
+
+    dense_rankings = [dense_search(ix, query, cfg.topk_dense, doc_ids)]
+    bm25_rankings = [bm25_search(ix, query, cfg.topk_bm25, doc_ids)]
+
+    if pending is not None:
+        try:
+            variants = pending.result(timeout=cfg.query_expansion_timeout)
+        except FutureTimeout:
+            pending.cancel()
+            variants = [query]
+        except Exception:
+            logger.warning("Query expansion failed; searching the original query only", exc_info=True)
+            variants = [query]
+        extra = variants[1:]
+        for ranking in dense_search_batch(ix, extra, cfg.topk_dense, doc_ids):
+            dense_rankings.append([cid for cid, _ in ranking])
+        bm25_rankings.extend(bm25_search(ix, v, cfg.topk_bm25, doc_ids) for v in extra)
+
+    return rrf_fuse(dense_rankings + bm25_rankings, k=cfg.rrf_k)
+
+
+async def ahybrid_search(
+    ix: Index, query: str, doc_ids: Optional[Collection[str]] = None
+) -> List[str]:
+    """Async :func:`hybrid_search`.
+
+    Dense and BM25 search for the original query run concurrently with each
+    other and with the expansion call; FAISS and BM25 scoring run on the
+    shared CPU pool so the event loop stays free. ``ix`` is only read, so one
+    index can serve many concurrent tasks.
+    """
+    cfg = ix.cfg
+    pending = None
+    if cfg.n_query_expansions > 0:
+        pending = asyncio.ensure_future(amulti_query_expand(query, cfg))
+
+    dense_first, bm25_first = await asyncio.gather(
+        adense_search_batch(ix, [query], cfg.topk_dense, doc_ids),
+        run_cpu(bm25_search, ix, query, cfg.topk_bm25, doc_ids, max_workers=cfg.cpu_workers),
+    )
+    dense_rankings = [[cid for cid, _ in dense_first[0]]]
+    bm25_rankings = [bm25_first]
+
+    if pending is not None:
+        try:
+            variants = await asyncio.wait_for(pending, timeout=cfg.query_expansion_timeout)
+        except asyncio.TimeoutError:
+            variants = [query]
+        except Exception:
+            logger.warning("Query expansion failed; searching the original query only", exc_info=True)
+            variants = [query]
+        extra = variants[1:]
+        dense_extra, *bm25_extra = await asyncio.gather(
+            adense_search_batch(ix, extra, cfg.topk_dense, doc_ids),
+            *(
+                run_cpu(bm25_search, ix, v, cfg.topk_bm25, doc_ids, max_workers=cfg.cpu_workers)
+                for v in extra
+            ),
+        )
+        dense_rankings.extend([cid for cid, _ in ranking] for ranking in dense_extra)
+        bm25_rankings.extend(bm25_extra)
+
+    return rrf_fuse(dense_rankings + bm25_rankings, k=cfg.rrf_k)
 
 
 def expand_neighborhood(ix: Index, base_ids: List[str]) -> List[str]:
+    """Add document-order neighbors and nearby siblings to the candidates.
+
+    Neighbors follow ``Chunk.prev_id``/``next_id``. Each candidate contributes
+    at most ``cfg.max_siblings_per_candidate`` siblings, nearest first, and the
+    result never grows past ``cfg.max_expanded_candidates`` (the input ids are
+    always kept). Order is input order followed by additions in rank order.
+    """
+    with span("expand_neighborhood", candidates_in=len(base_ids)) as sp:
+        expanded = _expand_neighborhood(ix, base_ids)
+        sp.set(candidates=len(expanded))
+    return expanded
+
+
+def _expand_neighborhood(ix: Index, base_ids: List[str]) -> List[str]:
     cfg = ix.cfg
-    selected = set(base_ids)
+    adj = ix.adjacency
+    selected: Dict[str, None] = dict.fromkeys(base_ids)
+    cap = max(cfg.max_expanded_candidates, len(selected))
+
+    def add(row: int) -> bool:
+        if len(selected) >= cap:
+            return False
+        selected.setdefault(adj.row_ids[row])
+        return True
+
     if cfg.expand_neighbors > 0:
-        pos = {cid: i for i, cid in enumerate(ix.id_lookup)}
-        for cid in list(selected):
-            if cid not in pos:
+        for cid in base_ids:
+            r = adj.row_of.get(cid)
+            if r is None:
                 continue
-            i = pos[cid]
-            for d in range(1, cfg.expand_neighbors + 1):
-                if i - d >= 0:
-                    selected.add(ix.id_lookup[i - d])
-                if i + d < len(ix.id_lookup):
-                    selected.add(ix.id_lookup[i + d])
-    if cfg.expand_siblings:
+            p = n = r
+            for _ in range(cfg.expand_neighbors):
+                p = adj.prev_row[p] if p >= 0 else -1
+                n = adj.next_row[n] if n >= 0 else -1
+                if (p >= 0 and not add(p)) or (n >= 0 and not add(n)):
+                    return list(selected)
+
+    if cfg.expand_siblings and cfg.max_siblings_per_candidate > 0:
         for cid in list(selected):
-            ch = ix.chunks.get(cid)
-            if not ch:
+            r = adj.row_of.get(cid)
+            if r is None:
                 continue
-            sibs = ix.siblings_by_parent.get(ch.parent_key, [])
-            for s in sibs:
-                selected.add(s)
+            g = adj.sib_group[r]
+            group = adj.sib_rows[adj.sib_indptr[g]:adj.sib_indptr[g + 1]]
+            pos = adj.sib_pos[r]
+            taken = 0
+            for d in range(1, len(group)):
+                for q in (pos - d, pos + d):
+                    if 0 <= q < len(group) and taken < cfg.max_siblings_per_candidate:
+                        taken += 1
+                        if not add(group[q]):
+                            return list(selected)
+                if taken >= cfg.max_siblings_per_candidate:
+                    break
     return list(selected)
 
 
+def last_rerank_stats() -> Optional[RerankStats]:
+    """Stats of the last rerank in the current context (thread or asyncio task)."""
+    return _last_rerank.get()
+
+
+def _record_rerank(sp, stats: RerankStats) -> None:
+    _last_rerank.set(stats)
+    sp.set(scored=stats.scored, cached=stats.cached)
+
+
 def maybe_rerank(ix: Index, query: str, candidate_ids: List[str]) -> List[str]:
     if not (ix.cfg.use_reranker and candidate_ids):
         return candidate_ids
 
-    rtype = getattr(ix.cfg, "reranker_type", "cross-encoder")
-    provider = getattr(ix.cfg, "reranker_provider", "hf")
-    cache_folder = getattr(ix.cfg, "cache_folder", "data/cache")
-    if rtype == "llm":
-        reranker = LLMReranker(ix.cfg.reranker_model, provider=provider)
-    else:
-        reranker = CrossEncoderReranker(ix.cfg.reranker_model, cache_folder=cache_folder)
+    with span("maybe_rerank", candidates=len(candidate_ids)) as sp:
+        ranked, stats = get_reranker(ix.cfg).rerank(ix, query, candidate_ids)
+        _record_rerank(sp, stats)
+    return ranked
+
+
+async def amaybe_rerank(ix: Index, query: str, candidate_ids: List[str]) -> List[str]:
+    if not (ix.cfg.use_reranker and candidate_ids):
+        return candidate_ids
 
-    return reranker.rerank(ix, query, candidate_ids)
+    with span("maybe_rerank", candidates=len(candidate_ids)) as sp:
+        ranked, stats = await get_reranker(ix.cfg).arerank(ix, query, candidate_ids)
+        _record_rerank(sp, stats)
+    return ranked
@@ -0,0 +1,78 @@
+"""On-disk building blocks for the versioned index format.
+
+Arrays are plain ``.npy`` files so they can be memory-mapped, chunk text is a
+single UTF-8 blob addressed by byte offsets, and chunk metadata is stored
+column by column. Every file is written to a temporary name and renamed into
+place, so an index can be re-saved while a previous version of it is mapped.
+"""
+import json
+import os
+from dataclasses import fields
+from typing import Any, Dict, List
+
+import numpy as np
+
+from rag_chatbot.user_manual.chunking import Chunk
+
+FORMAT_VERSION = 2
+MANIFEST = "manifest.json"
+
+_META_FIELDS = [f.name for f in fields(Chunk) if f.name != "text"]
+
+
+def write_bytes(path: str, data: bytes) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def write_json(path: str, obj: Any) -> None:
+    write_bytes(path, json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+
+def read_json(path: str) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_array(path: str, arr: np.ndarray) -> None:
+    tmp = f"{path}.tmp.npy"
+    np.save(tmp, arr)
+    os.replace(tmp, path)
+
+
+def load_array(path: str, mmap: bool = True) -> np.ndarray:
+    return np.load(path, mmap_mode="r" if mmap else None)
+
+
+def save_chunks(chunks: List[Chunk], dirpath: str) -> None:
+    """Write chunk text as one blob plus offsets, and metadata as columns."""
+    os.makedirs(dirpath, exist_ok=True)
+    encoded = [c.text.encode("utf-8") for c in chunks]
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    write_bytes(os.path.join(dirpath, "text.bin"), b"".join(encoded))
+    save_array(os.path.join(dirpath, "offsets.npy"), offsets)
+    columns: Dict[str, List[Any]] = {
+        name: [getattr(c, name) for c in chunks] for name in _META_FIELDS
+    }
+    write_json(os.path.join(dirpath, "columns.json"), columns)
+
+
+def load_chunks(dirpath: str) -> List[Chunk]:
+    """Inverse of :func:`save_chunks`."""
+    offsets = load_array(os.path.join(dirpath, "offsets.npy"), mmap=False)
+    columns = read_json(os.path.join(dirpath, "columns.json"))
+    text_path = os.path.join(dirpath, "text.bin")
+    blob = (
+        np.memmap(text_path, dtype=np.uint8, mode="r")
+        if os.path.getsize(text_path)
+        else np.empty(0, dtype=np.uint8)
+    )
+    chunks: List[Chunk] = []
+    for i in range(len(offsets) - 1):
+        text = blob[offsets[i]:offsets[i + 1]].tobytes().decode("utf-8")
+        meta = {name: columns[name][i] for name in _META_FIELDS if name in columns}
+        chunks.append(Chunk(text=text, **meta))
+    return chunks
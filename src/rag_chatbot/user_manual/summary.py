@@ -1,14 +1,22 @@
 """Utilities for generating optional summaries of chunks and sections."""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
 from collections import defaultdict
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from pydantic import BaseModel, Field
 
 from rag_chatbot.common.prompt_registry import registry
 from rag_chatbot.models import get_llm
-from rag_chatbot.user_manual.chunking import Chunk
+from rag_chatbot.user_manual.chunking import Chunk, section_key, section_prefixes, token_len
 from rag_chatbot.user_manual.config import Config
 
+logger = logging.getLogger(__name__)
+
 
 def _heading_path(num: str, title_by_num: Dict[str, str]) -> str:
     parts = num.split(".")
@@ -38,46 +46,343 @@ class Summary(BaseModel):
     retrieval_text: str = ""
 
 
-def build_summaries(chunks: List[Chunk], cfg: Config) -> Dict[str, Dict[str, Dict[str, Any]]]:
-    """Generate structured summaries for individual chunks and whole sections."""
+class SummaryCheckpoint:
+    """Append-only JSON-lines store of finished summaries keyed by content hash.
+
+    Each line is ``{"key": ..., "summary": {...}}``, or ``{"key": ...,
+    "error": "..."}`` for an item that failed every retry. Failed items are
+    listed in ``failed`` but not ``done``, so a resumed run retries them. A
+    truncated last line (from a crash mid-write) is ignored on load.
+    """
+
+    def __init__(self, path: Optional[str]) -> None:
+        self.path = path
+        self.done: Dict[str, Dict[str, Any]] = {}
+        self.failed: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._needs_newline = False
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = f.read()
+            for line in data.splitlines():
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "summary" in rec:
+                    self.done[rec["key"]] = rec["summary"]
+                    self.failed.pop(rec["key"], None)
+                else:
+                    self.failed[rec["key"]] = rec.get("error", "")
+            self._needs_newline = bool(data) and not data.endswith("\n")
+
+    def append(self, key: str, summary: Dict[str, Any]) -> None:
+        with self._lock:
+            self.done[key] = summary
+            self.failed.pop(key, None)
+            self._write({"key": key, "summary": summary})
+
+    def append_failure(self, key: str, error: str) -> None:
+        with self._lock:
+            self.failed[key] = error
+            self._write({"key": key, "error": error})
+
+    def _write(self, rec: Dict[str, Any]) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            if self._needs_newline:
+                f.write("\n")
+                self._needs_newline = False
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+
+def _content_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+def _summarize_all(
+    structured: Any,
+    prompts: List[str],
+    cfg: Config,
+    checkpoint: SummaryCheckpoint,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> List[Optional[Dict[str, Any]]]:
+    """Summarize ``prompts`` with bounded concurrency, skipping checkpointed ones.
+
+    Work runs in waves of ``summary_workers * 4`` prompts through
+    ``structured.batch``; every finished summary is appended to the checkpoint
+    right away. Failed prompts are retried up to ``summary_retries`` times with
+    exponential backoff; those that never succeed are logged, recorded as
+    failures in the checkpoint and come back as ``None``.
+    """
+    keys = [_content_key(cfg.llm_model, p) for p in prompts]
+    todo = [(k, p) for k, p in zip(keys, prompts) if k not in checkpoint.done]
+    total = len(prompts)
+    done = total - len(todo)
+    if progress:
+        progress(done, total)
+
+    workers = max(1, cfg.summary_workers)
+    wave = workers * 4
+    for start in range(0, len(todo), wave):
+        pending = todo[start:start + wave]
+        for attempt in range(cfg.summary_retries + 1):
+            if attempt:
+                time.sleep(cfg.summary_backoff_s * 2 ** (attempt - 1))
+            outputs = structured.batch(
+                [p for _, p in pending],
+                config={"max_concurrency": workers},
+                return_exceptions=True,
+            )
+            failed: List[Tuple[str, str]] = []
+            errors: List[Any] = []
+            for item, out in zip(pending, outputs):
+                if isinstance(out, Exception) or out is None:
+                    failed.append(item)
+                    errors.append(out)
+                    continue
+                checkpoint.append(item[0], out.dict())
+                done += 1
+            pending = failed
+            if progress:
+                progress(done, total)
+            if not pending:
+                break
+        for (key, _), err in zip(pending, errors):
+            reason = repr(err) if err is not None else "no structured output"
+            logger.warning("Summary %s failed after %d attempts: %s", key[:12], cfg.summary_retries + 1, reason)
+            checkpoint.append_failure(key, reason)
+
+    return [checkpoint.done.get(k) for k in keys]
+
+
+def reusable_summaries(
+    old_chunks: List[Chunk],
+    old_summaries: Dict[str, Dict[str, Dict[str, Any]]],
+    chunks: List[Chunk],
+) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Select summaries of a previous build that still apply to ``chunks``.
+
+    Chunk ids are content hashes, so a chunk summary carries over whenever its
+    id is still present. A section summary carries over unless a chunk was
+    added to or removed from that section or any section below it.
+    """
+    old_ids = {c.id for c in old_chunks}
+    new_ids = {c.id for c in chunks}
+    changed = set()
+    for c in old_chunks:
+        if c.id not in new_ids:
+            changed.update(section_key(c.doc_id, p) for p in section_prefixes(c.heading_num))
+    for c in chunks:
+        if c.id not in old_ids:
+            changed.update(section_key(c.doc_id, p) for p in section_prefixes(c.heading_num))
+    return {
+        "chunks": {
+            cid: s for cid, s in old_summaries.get("chunks", {}).items() if cid in new_ids
+        },
+        "sections": {
+            key: s for key, s in old_summaries.get("sections", {}).items() if key not in changed
+        },
+    }
+
+
+def _doc_sections(sections: Dict[str, Dict[str, Any]], doc_id: str) -> Dict[str, Dict[str, Any]]:
+    """Section summaries of one document, keyed by heading number."""
+    if not doc_id:
+        return {k: v for k, v in sections.items() if "/" not in k}
+    prefix = f"{doc_id}/"
+    return {k[len(prefix):]: v for k, v in sections.items() if k.startswith(prefix)}
+
+
+def build_summaries(
+    chunks: List[Chunk],
+    cfg: Config,
+    checkpoint_path: Optional[str] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    reuse: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None,
+) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Generate structured summaries for individual chunks and whole sections.
+
+    With ``checkpoint_path`` finished summaries are appended to that file as
+    they complete, and a rerun resumes from it. Items that still fail after
+    ``cfg.summary_retries`` retries are logged, recorded as failures in the
+    checkpoint (and retried by a rerun) and left out; the index then falls
+    back to the chunk text for them. Summaries in ``reuse`` (see
+    :func:`reusable_summaries`) are taken as-is and not sent to the LLM.
+    Section summaries are keyed by :func:`~rag_chatbot.user_manual.chunking.section_key`,
+    so chunks of several documents can be summarized together.
+    """
+    reuse = reuse or {}
+    reused_chunks = reuse.get("chunks", {})
+    reused_sections = reuse.get("sections", {})
 
     llm = get_llm(cfg.llm_model, provider=cfg.llm_provider)
     structured = llm.with_structured_output(Summary)
+    checkpoint = SummaryCheckpoint(checkpoint_path)
 
-    title_by_num: Dict[str, str] = {}
+    by_doc: Dict[str, List[Chunk]] = defaultdict(list)
+    titles: Dict[str, Dict[str, str]] = defaultdict(dict)
     for ch in chunks:
-        title_by_num.setdefault(ch.heading_num, ch.heading_title)
+        by_doc[ch.doc_id].append(ch)
+        titles[ch.doc_id].setdefault(ch.heading_num, ch.heading_title)
+
+    todo = [ch for ch in chunks if ch.id not in reused_chunks]
+    prompt = registry.get("summarize_chunk", "")
+    chunk_prompts = [
+        prompt.format(
+            heading_path=_heading_path(ch.heading_num, titles[ch.doc_id]),
+            page_span=_page_span(ch.page_start, ch.page_end),
+            text=ch.text,
+        )
+        for ch in todo
+    ]
+    results = _summarize_all(structured, chunk_prompts, cfg, checkpoint, progress)
+    chunk_summaries = {ch.id: reused_chunks[ch.id] for ch in chunks if ch.id in reused_chunks}
+    chunk_summaries.update((ch.id, r) for ch, r in zip(todo, results) if r is not None)
+
+    section_summaries: Dict[str, Dict[str, Any]] = {}
+    for doc_id, doc_chunks in by_doc.items():
+        reused = _doc_sections(reused_sections, doc_id)
+        if cfg.summary_mode == "hierarchical":
+            sections = _hierarchical_section_summaries(
+                doc_chunks, chunk_summaries, titles[doc_id], structured, cfg, checkpoint, progress, reused
+            )
+        else:
+            sections = _flat_section_summaries(
+                doc_chunks, titles[doc_id], structured, cfg, checkpoint, progress, reused
+            )
+        section_summaries.update((section_key(doc_id, num), r) for num, r in sections.items())
+
+    return {"chunks": chunk_summaries, "sections": section_summaries}
 
-    chunk_summaries: Dict[str, Dict[str, Any]] = {}
-    for ch in chunks:
-        prompt = registry.get("summarize_chunk", "")
-        hp = _heading_path(ch.heading_num, title_by_num)
-        pages = _page_span(ch.page_start, ch.page_end)
-        text = prompt.format(heading_path=hp, page_span=pages, text=ch.text)
-        try:
-            chunk_summaries[ch.id] = structured.invoke(text).dict()
-        except Exception:
-            resp = llm.invoke(text).content.strip()
-            chunk_summaries[ch.id] = {"heading_path": hp, "overview": resp}
 
+def _flat_section_summaries(
+    chunks: List[Chunk],
+    title_by_num: Dict[str, str],
+    structured: Any,
+    cfg: Config,
+    checkpoint: SummaryCheckpoint,
+    progress: Optional[Callable[[int, int], None]],
+    reused: Dict[str, Dict[str, Any]],
+) -> Dict[str, Dict[str, Any]]:
+    """Summarize every section prefix from the full text of all its chunks."""
     by_section: Dict[str, List[Chunk]] = defaultdict(list)
     for ch in chunks:
-        parts = ch.heading_num.split(".")
-        for i in range(1, len(parts) + 1):
-            prefix = ".".join(parts[:i])
+        for prefix in section_prefixes(ch.heading_num):
             by_section[prefix].append(ch)
 
-    section_summaries: Dict[str, Dict[str, Any]] = {}
-    for num, chs in by_section.items():
-        text = "\n\n".join(c.text for c in chs)
-        hp = _heading_path(num, title_by_num)
-        pages = _page_span(min(c.page_start for c in chs), max(c.page_end for c in chs))
-        prompt = registry.get("summarize_section", "")
-        formatted = prompt.format(heading_path=hp, page_span=pages, text=text)
-        try:
-            section_summaries[num] = structured.invoke(formatted).dict()
-        except Exception:
-            resp = llm.invoke(formatted).content.strip()
-            section_summaries[num] = {"heading_path": hp, "overview": resp}
+    prompt = registry.get("summarize_section", "")
+    nums = [num for num in by_section if num not in reused]
+    section_prompts = []
+    for num in nums:
+        chs = by_section[num]
+        section_prompts.append(
+            prompt.format(
+                heading_path=_heading_path(num, title_by_num),
+                page_span=_page_span(min(c.page_start for c in chs), max(c.page_end for c in chs)),
+                text="\n\n".join(c.text for c in chs),
+            )
+        )
+    results = _summarize_all(structured, section_prompts, cfg, checkpoint, progress)
+    section_summaries = {num: reused[num] for num in by_section if num in reused}
+    section_summaries.update((num, r) for num, r in zip(nums, results) if r is not None)
+    return section_summaries
 
-    return {"chunks": chunk_summaries, "sections": section_summaries}
+
+def _render_summary(label: str, summary: Dict[str, Any]) -> str:
+    lines = [f"[{label}] {summary.get('overview', '')}".strip()]
+    for field_name, caption in (("key_actions", "Actions"), ("ui_terms", "UI"), ("limitations", "Limits")):
+        values = summary.get(field_name) or []
+        if values:
+            lines.append(f"{caption}: " + "; ".join(values))
+    return "\n".join(lines)
+
+
+def _fit(parts: List[str], budget: int) -> Tuple[List[str], int]:
+    """Take parts in order while they fit in ``budget`` tokens."""
+    kept: List[str] = []
+    used = 0
+    for p in parts:
+        n = token_len(p)
+        if used + n > budget:
+            break
+        kept.append(p)
+        used += n
+    return kept, used
+
+
+def _hierarchical_section_summaries(
+    chunks: List[Chunk],
+    chunk_summaries: Dict[str, Dict[str, Any]],
+    title_by_num: Dict[str, str],
+    structured: Any,
+    cfg: Config,
+    checkpoint: SummaryCheckpoint,
+    progress: Optional[Callable[[int, int], None]],
+    reused: Dict[str, Dict[str, Any]],
+) -> Dict[str, Dict[str, Any]]:
+    """Summarize sections bottom-up from their children's summaries.
+
+    A section's input is the summaries of its direct subsections plus the text
+    of the chunks filed directly under its heading, limited to
+    ``cfg.summary_token_budget`` tokens. Own text that does not fit is replaced
+    by the chunk summaries, so no call ever sees a whole chapter. Sections of
+    one depth are summarized concurrently, deepest first.
+    """
+    own: Dict[str, List[Chunk]] = defaultdict(list)
+    pages: Dict[str, Tuple[int, int]] = {}
+    children: Dict[str, List[str]] = defaultdict(list)
+    for ch in chunks:
+        own[ch.heading_num].append(ch)
+        for prefix in section_prefixes(ch.heading_num):
+            lo, hi = pages.get(prefix, (ch.page_start, ch.page_end))
+            pages[prefix] = (min(lo, ch.page_start), max(hi, ch.page_end))
+    for num in pages:
+        if "." in num:
+            children[num.rsplit(".", 1)[0]].append(num)
+
+    budget = cfg.summary_token_budget
+    prompt = registry.get("summarize_section_hierarchical", "")
+    section_summaries = {num: reused[num] for num in pages if num in reused}
+    by_depth: Dict[int, List[str]] = defaultdict(list)
+    for num in pages:
+        if num in reused:
+            continue
+        by_depth[num.count(".")].append(num)
+
+    for depth in sorted(by_depth, reverse=True):
+        nums: List[str] = []
+        section_prompts = []
+        for num in by_depth[depth]:
+            child_parts = [
+                _render_summary(_heading_path(c, title_by_num), section_summaries[c])
+                for c in children[num]
+                if c in section_summaries
+            ]
+            kept, used = _fit(child_parts, budget)
+            own_text = [c.text for c in own[num]]
+            fitted, _ = _fit(own_text, budget - used)
+            if len(fitted) < len(own_text):
+                own_sums = [
+                    _render_summary(f"{num} part {c.ordinal_in_section + 1}", chunk_summaries[c.id])
+                    for c in own[num]
+                    if c.id in chunk_summaries
+                ]
+                if own_sums:
+                    fitted, _ = _fit(own_sums, budget - used)
+            if not kept and not fitted:
+                continue
+            nums.append(num)
+            section_prompts.append(
+                prompt.format(
+                    heading_path=_heading_path(num, title_by_num),
+                    page_span=_page_span(*pages[num]),
+                    text="\n\n".join(kept + fitted),
+                )
+            )
+        results = _summarize_all(structured, section_prompts, cfg, checkpoint, progress)
+        section_summaries.update((num, r) for num, r in zip(nums, results) if r is not None)
+
+    return section_summaries
@@ -0,0 +1,272 @@
+"""Construction, storage and query-time tuning of the FAISS index behind the vector store.
+
+``Config.faiss_index_type`` selects the structure:
+
+* ``"flat"`` – exact search over all vectors.
+* ``"hnsw"`` – graph search (``IndexHNSWFlat``); no training, fast queries,
+  more memory than flat.
+* ``"ivf-flat"`` – inverted lists over k-means cells with raw vectors.
+* ``"ivf-pq"`` – inverted lists with product-quantized codes
+  (``pq_m`` bytes per vector at 8 bits), the smallest in memory.
+
+``Config.vector_dtype`` selects how the first three hold vectors: raw
+``"float32"``, or scalar-quantized ``"float16"`` (half the memory) or
+``"int8"`` (a quarter, per-dimension ranges learned from the data). Searches
+over lossy codes (``float16``, ``int8`` and ``ivf-pq``) fetch
+``rescore_factor`` times as many candidates and rank them again by exact
+distance to the float32 vectors, which :class:`VectorStore` keeps in a
+memory-mapped ``.npy`` file rather than in RAM.
+
+IVF indexes are trained on a random sample of at most ``faiss_train_sample``
+vectors. How much of the index a query visits (``ivf_nprobe``,
+``hnsw_ef_search``) is not baked into the index but passed with every search,
+so it can be changed after the index was built.
+"""
+import math
+import os
+from dataclasses import dataclass, field, replace
+from typing import Any, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from rag_chatbot.user_manual.config import Config
+from rag_chatbot.user_manual.storage import load_array, read_json, save_array, write_json
+
+INDEX_TYPES = ("flat", "hnsw", "ivf-flat", "ivf-pq")
+VECTOR_DTYPES = ("float32", "float16", "int8")
+_SQ_TYPES = {"float16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+
+def _nlist(cfg: Config, n: int) -> int:
+    nlist = cfg.ivf_nlist or int(4 * math.sqrt(n))
+    # FAISS wants ~39 training points per centroid for stable k-means
+    return max(1, min(nlist, n // 39))
+
+
+def make_faiss_index(vectors: np.ndarray, cfg: Config) -> faiss.Index:
+    """Build, train and fill an L2 index of type ``cfg.faiss_index_type``.
+
+    Flat, HNSW and IVF-flat indexes store ``cfg.vector_dtype`` codes; IVF-PQ
+    always stores its own product-quantized codes.
+    """
+    kind = cfg.faiss_index_type
+    if cfg.vector_dtype not in VECTOR_DTYPES:
+        raise ValueError(f"Unknown vector_dtype {cfg.vector_dtype!r}; expected one of {VECTOR_DTYPES}")
+    qtype = _SQ_TYPES.get(cfg.vector_dtype)
+    n, dim = vectors.shape
+    if kind == "flat":
+        index = faiss.IndexFlatL2(dim) if qtype is None else faiss.IndexScalarQuantizer(dim, qtype)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, cfg.hnsw_m) if qtype is None else faiss.IndexHNSWSQ(dim, qtype, cfg.hnsw_m)
+        index.hnsw.efConstruction = cfg.hnsw_ef_construction
+    elif kind in ("ivf-flat", "ivf-pq"):
+        nlist = _nlist(cfg, n)
+        quantizer = faiss.IndexFlatL2(dim)
+        if kind == "ivf-pq":
+            if dim % cfg.pq_m:
+                raise ValueError(f"pq_m={cfg.pq_m} must divide the embedding dimension {dim}")
+            nbits = max(1, min(cfg.pq_nbits, int(math.log2(max(n // 39, 2)))))
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, cfg.pq_m, nbits)
+        elif qtype is None:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype)
+    else:
+        raise ValueError(f"Unknown faiss_index_type {kind!r}; expected one of {INDEX_TYPES}")
+    if n and not index.is_trained:
+        sample = vectors
+        if n > cfg.faiss_train_sample:
+            rows = np.random.default_rng(0).choice(n, cfg.faiss_train_sample, replace=False)
+            sample = vectors[np.sort(rows)]
+        index.train(sample)
+    if n:
+        index.add(vectors)
+    return index
+
+
+def index_type_of(index: faiss.Index) -> str:
+    """Name of the structure of a loaded ``index`` as used in ``Config``."""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf-pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf-flat"
+    return "flat"
+
+
+def vector_dtype_of(index: faiss.Index) -> str:
+    """Storage of the vectors in ``index`` as used in ``Config.vector_dtype``."""
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    sq = getattr(index, "sq", None)
+    if sq is None:
+        return "float32"
+    return "float16" if sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "int8"
+
+
+def is_lossy(index: faiss.Index) -> bool:
+    """Whether ``index`` holds approximations of the vectors added to it."""
+    return isinstance(index, faiss.IndexIVFPQ) or vector_dtype_of(index) != "float32"
+
+
+def search_params(index: faiss.Index, cfg: Config, **kwargs: Any) -> Optional[faiss.SearchParameters]:
+    """Per-query search parameters for ``index`` from ``cfg``.
+
+    Extra keyword arguments (for example ``sel`` with an ``IDSelector``) are
+    set on the returned object. Returns ``None`` for a flat index without
+    extras.
+    """
+    if isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = max(cfg.hnsw_ef_search, 1)
+    elif isinstance(index, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF()
+        params.nprobe = max(1, min(cfg.ivf_nprobe, index.nlist))
+    elif kwargs:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    for name, value in kwargs.items():
+        setattr(params, name, value)
+    return params
+
+
+def remove_rows(
+    index: faiss.Index, rows: Sequence[int], cfg: Config, vectors: Optional[np.ndarray] = None
+) -> faiss.Index:
+    """Drop ``rows`` and renumber the rest to ``0..n-1`` in their previous order.
+
+    The vector store maps FAISS labels to chunks by position, so labels
+    must stay contiguous. Flat indexes shift on removal by themselves; IVF
+    lists keep their labels and are rewritten; HNSW graphs cannot drop nodes
+    and are rebuilt from ``vectors`` (all rows at full precision) or, without
+    them, from their stored vectors. Returns the index to use from now on,
+    which is ``index`` itself unless it was rebuilt.
+    """
+    n = index.ntotal
+    keep = np.ones(n, dtype=bool)
+    keep[np.asarray(rows, dtype=np.int64)] = False
+    if isinstance(index, faiss.IndexHNSW):
+        kept = np.asarray(vectors[keep] if vectors is not None else index.reconstruct_n(0, n)[keep])
+        return make_faiss_index(
+            kept, replace(cfg, faiss_index_type="hnsw", vector_dtype=vector_dtype_of(index))
+        )
+
+    index.remove_ids(np.asarray(rows, dtype=np.int64))
+    if isinstance(index, faiss.IndexIVF):
+        new_label = np.full(n, -1, dtype=np.int64)
+        new_label[keep] = np.arange(int(keep.sum()))
+        invlists = index.invlists
+        for lst in range(index.nlist):
+            size = invlists.list_size(lst)
+            if not size:
+                continue
+            ids = new_label[faiss.rev_swig_ptr(invlists.get_ids(lst), size)]
+            codes = faiss.rev_swig_ptr(invlists.get_codes(lst), size * invlists.code_size).copy()
+            invlists.update_entries(lst, 0, size, faiss.swig_ptr(ids), faiss.swig_ptr(codes))
+    return index
+
+
+def rescore(
+    vectors: np.ndarray, queries: np.ndarray, rows: np.ndarray, k: int, metric: int = faiss.METRIC_L2
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Rank each query's candidate ``rows`` (``-1`` = none) by exact distance.
+
+    ``vectors`` may be memory-mapped; candidates are read in row order.
+    Returns ``(distances, rows)`` shaped ``(len(queries), k)`` like a FAISS
+    search: squared L2 distances, or inner products for ``METRIC_INNER_PRODUCT``.
+    """
+    ip = metric == faiss.METRIC_INNER_PRODUCT
+    dists = np.full((len(queries), k), -np.inf if ip else np.inf, dtype=np.float32)
+    out = np.full((len(queries), k), -1, dtype=np.int64)
+    for i, (q, cand) in enumerate(zip(queries, rows)):
+        cand = np.unique(cand[cand >= 0])
+        if not cand.size:
+            continue
+        vecs = np.asarray(vectors[cand], dtype=np.float32)
+        d = vecs @ q if ip else ((vecs - q) ** 2).sum(axis=1)
+        best = np.argsort(-d if ip else d, kind="stable")[:k]
+        dists[i, :best.size] = d[best]
+        out[i, :best.size] = cand[best]
+    return dists, out
+
+
+@dataclass
+class VectorStore:
+    """FAISS index over chunk vectors with the chunk id of every row.
+
+    ``ids[r]`` is the chunk at row ``r`` and ``text_keys[r]`` a hash of the
+    text embedded for it, which tells updates whether a chunk must be
+    re-embedded. For lossy indexes ``vectors`` holds every row at float32
+    for rescoring (memory-mapped once loaded); otherwise it is ``None``.
+
+    Layout on disk: ``index.faiss``, ``rows.json`` and, for lossy indexes,
+    ``vectors.npy``.
+    """
+
+    index: faiss.Index
+    embeddings: Any
+    ids: List[str] = field(default_factory=list)
+    text_keys: List[str] = field(default_factory=list)
+    vectors: Optional[np.ndarray] = None
+
+    @classmethod
+    def build(
+        cls, vectors: np.ndarray, embeddings: Any, ids: List[str], text_keys: List[str], cfg: Config
+    ) -> "VectorStore":
+        index = make_faiss_index(vectors, cfg)
+        return cls(index, embeddings, list(ids), list(text_keys), vectors if is_lossy(index) else None)
+
+    def search(
+        self, queries: np.ndarray, k: int, params: Optional[faiss.SearchParameters], rescore_factor: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """FAISS search, with exact rescoring of ``rescore_factor * k`` candidates when lossy."""
+        if self.vectors is None:
+            return self.index.search(queries, k, params=params)
+        _, rows = self.index.search(queries, k * max(1, rescore_factor), params=params)
+        return rescore(self.vectors, queries, rows, k, self.index.metric_type)
+
+    def add(self, vectors: np.ndarray, ids: List[str], text_keys: List[str]) -> None:
+        if not self.index.is_trained:
+            self.index.train(vectors)
+        self.index.add(vectors)
+        if self.vectors is not None:
+            self.vectors = np.concatenate([np.asarray(self.vectors), vectors])
+        self.ids.extend(ids)
+        self.text_keys.extend(text_keys)
+
+    def remove(self, rows: Sequence[int], cfg: Config) -> None:
+        drop = set(rows)
+        self.index = remove_rows(self.index, rows, cfg, vectors=self.vectors)
+        if self.vectors is not None:
+            self.vectors = np.delete(np.asarray(self.vectors), list(drop), axis=0)
+        self.ids = [cid for r, cid in enumerate(self.ids) if r not in drop]
+        self.text_keys = [k for r, k in enumerate(self.text_keys) if r not in drop]
+
+    def memory_bytes(self) -> int:
+        """Size of the in-memory index plus the row mapping (not the mapped vectors)."""
+        index_bytes = faiss.serialize_index(self.index).nbytes
+        return index_bytes + sum(len(i) + len(k) for i, k in zip(self.ids, self.text_keys))
+
+    def save(self, dirpath: str) -> None:
+        os.makedirs(dirpath, exist_ok=True)
+        tmp = os.path.join(dirpath, "index.faiss.tmp")
+        faiss.write_index(self.index, tmp)
+        os.replace(tmp, os.path.join(dirpath, "index.faiss"))
+        vectors_path = os.path.join(dirpath, "vectors.npy")
+        if self.vectors is not None:
+            save_array(vectors_path, np.asarray(self.vectors, dtype=np.float32))
+        elif os.path.exists(vectors_path):
+            os.remove(vectors_path)
+        write_json(os.path.join(dirpath, "rows.json"), {"ids": self.ids, "text_keys": self.text_keys})
+
+    @classmethod
+    def load(cls, dirpath: str, embeddings: Any, mmap: bool = True) -> "VectorStore":
+        """Open a saved store; float32 vectors are memory-mapped unless ``mmap`` is false."""
+        index = faiss.read_index(os.path.join(dirpath, "index.faiss"))
+        rows = read_json(os.path.join(dirpath, "rows.json"))
+        vectors_path = os.path.join(dirpath, "vectors.npy")
+        vectors = load_array(vectors_path, mmap) if os.path.exists(vectors_path) else None
+        return cls(index, embeddings, rows["ids"], rows["text_keys"], vectors)
@@ -0,0 +1,22 @@
+from rag_chatbot.user_manual.answer_cache import get_answer_cache
+from rag_chatbot.user_manual.config import Config
+
+
+def test_answer_cache_is_off_by_default():
+    assert get_answer_cache(Config()) is None
+
+
+def test_caches_are_kept_per_setting(tmp_path):
+    path = str(tmp_path / "answers.sqlite")
+    strict = get_answer_cache(Config(answer_cache_path=path, answer_cache_threshold=1.01))
+    loose = get_answer_cache(Config(answer_cache_path=path, answer_cache_threshold=0.5))
+    assert strict is not loose
+    assert get_answer_cache(Config(answer_cache_path=path, answer_cache_threshold=1.01)) is strict
+
+    strict.put("scope", "How do I reset?", [1.0, 0.0], "Hold reset.", ["c1"])
+    similar = [0.9, 0.1]
+    assert strict.get("scope", "how do i reset", similar).answer == "Hold reset."
+    assert strict.get("scope", "Reset the device", similar) is None
+    assert loose.get("scope", "Reset the device", similar).answer == "Hold reset."
+    ttl = get_answer_cache(Config(answer_cache_path=path, answer_cache_ttl_s=0.0))
+    assert ttl.get("scope", "how do i reset", similar) is None
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from rag_chatbot.user_manual.bm25 import BM25Index, top_k
+
+rank_bm25 = pytest.importorskip("rank_bm25")
+
+
+def corpus(n_docs: int, vocab: int, seed: int):
+    rng = np.random.default_rng(seed)
+    words = [f"w{i}" for i in range(vocab)]
+    return [list(rng.choice(words, int(rng.integers(1, 30)))) for _ in range(n_docs)]
+
+
+def reference_top_k(scores, k):
+    return sorted(range(len(scores)), key=scores.__getitem__, reverse=True)[:k]
+
+
+@pytest.mark.parametrize("n_docs,vocab,seed", [(1, 5, 0), (7, 4, 1), (50, 30, 2), (300, 200, 3)])
+def test_scores_match_bm25okapi(n_docs, vocab, seed):
+    docs = corpus(n_docs, vocab, seed)
+    ours = BM25Index.build(docs)
+    ref = rank_bm25.BM25Okapi(docs)
+    for query in corpus(20, vocab + 5, seed + 100):
+        np.testing.assert_allclose(ours.get_scores(query), ref.get_scores(query), rtol=1e-12, atol=1e-12)
+
+
+def test_negative_idf_uses_epsilon_floor():
+    # "common" is in every document, so its raw IDF is negative.
+    docs = [["common", "a"], ["common", "b"], ["common", "a", "c"], ["common"]]
+    ours = BM25Index.build(docs, epsilon=0.25)
+    ref = rank_bm25.BM25Okapi(docs, epsilon=0.25)
+    i = ours.vocab["common"]
+    assert ours.idf[i] == pytest.approx(ref.idf["common"])
+    assert ours.idf[i] != pytest.approx(np.log(0.5 / 4.5))
+    np.testing.assert_allclose(ours.get_scores(["common"]), ref.get_scores(["common"]))
+    np.testing.assert_allclose(ours.get_scores(["common", "a"]), ref.get_scores(["common", "a"]))
+
+
+def test_add_and_remove_match_a_rebuild():
+    docs = corpus(60, 25, 4)
+    ix = BM25Index.build(docs[:40]).add(docs[40:]).remove([3, 17, 55])
+    kept = [d for i, d in enumerate(docs) if i not in (3, 17, 55)]
+    ref = rank_bm25.BM25Okapi(kept)
+    for query in corpus(10, 25, 5):
+        np.testing.assert_allclose(ix.get_scores(query), ref.get_scores(query), rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize("k", [0, 1, 3, 10, 49, 50, 80])
+def test_top_k_matches_sorted_with_ties(k):
+    rng = np.random.default_rng(k)
+    scores = rng.integers(0, 5, 50).astype(np.float64)  # many ties
+    assert top_k(scores, k).tolist() == reference_top_k(scores, k)
+    zeros = np.zeros(50)
+    assert top_k(zeros, k).tolist() == reference_top_k(zeros, k)
+
+
+def test_search_ranks_like_reference():
+    docs = corpus(200, 40, 6)
+    ours = BM25Index.build(docs)
+    ref = rank_bm25.BM25Okapi(docs)
+    mask = np.arange(len(docs)) % 3 != 0
+    for query in corpus(10, 40, 7):
+        ref_scores = ref.get_scores(query)
+        rows, scores = ours.search(query, 10)
+        assert rows.tolist() == reference_top_k(ref_scores, 10)
+        np.testing.assert_allclose(scores, ref_scores[rows])
+        rows, _ = ours.search(query, 10, mask)
+        allowed = np.flatnonzero(mask)
+        assert rows.tolist() == allowed[reference_top_k(ref_scores[allowed], 10)].tolist()
@@ -0,0 +1,165 @@
+from dataclasses import asdict, replace
+
+import numpy as np
+import pytest
+
+from rag_chatbot.user_manual.chunking import build_chunks, iter_chunks
+from rag_chatbot.user_manual.config import Config
+
+import reference_chunking
+
+WORDS = (
+    "device settings menu button press hold select option display screen error reset power "
+    "battery update firmware cable network export import file"
+).split()
+
+
+def sentence(rng: np.random.Generator) -> str:
+    words = list(rng.choice(WORDS, int(rng.integers(3, 25))))
+    if rng.random() < 0.2:
+        i = int(rng.integers(0, len(words)))
+        words[i] = words[i][:3] + "-\n" + words[i][3:]  # hyphenated line break
+    return " ".join(words) + "."
+
+
+def section_text(rng: np.random.Generator) -> str:
+    paras = []
+    for _ in range(int(rng.integers(0, 5))):
+        if rng.random() < 0.2:
+            paras.append("\n\n".join(f"- {sentence(rng)}" for _ in range(int(rng.integers(1, 4)))))
+        else:
+            paras.append("\n".join(sentence(rng) for _ in range(int(rng.integers(1, 4)))))
+    return "\n\n".join(paras)
+
+
+def random_manual(seed: int):
+    """Pages and config of a random manual, with or without a TOC.
+
+    Covers headings spread over pages, several headings per page, headings
+    missing from their page, TOC entries past the last page, duplicate TOC
+    numbers, skipped page numbers, empty pages and footers.
+    """
+    rng = np.random.default_rng(seed)
+    toc_pages = int(rng.choice([0, 1, 2]))
+    cfg = Config(
+        toc_pages=toc_pages,
+        heading_page_window=0,
+        atomic_chunk_tokens=int(rng.integers(10, 120)),
+        atomic_chunk_overlap_tokens=int(rng.choice([0, 0, 5, 30])),
+        footer_regex=r"^Page \d+ of the manual$" if rng.random() < 0.5 else "",
+    )
+    nums, chapter = [], 0
+    for _ in range(int(rng.integers(1, 12))):
+        if not nums or rng.random() < 0.4:
+            chapter += 1
+            nums.append(str(chapter))
+        else:
+            nums.append(f"{chapter}.{int(rng.integers(1, 4))}")
+
+    page = toc_pages + 1
+    body, toc = {}, []
+    for num in nums:
+        if rng.random() < 0.5:
+            page += int(rng.integers(1, 3))  # may skip a page number
+        title = " ".join(rng.choice(WORDS, 2)).capitalize()
+        shown = title if rng.random() > 0.1 else "Other title"  # heading not found on its page
+        toc_page = page if rng.random() > 0.05 else page + 50  # entry past the last page
+        toc.append(f"{num} {title}. {toc_page}")
+        body.setdefault(page, []).append(f"{section_text(rng)}\n{num} {shown}\n{section_text(rng)}")
+    if rng.random() < 0.2:
+        toc.append(toc[0])  # duplicate TOC entry
+
+    pages = []
+    per_page = max(1, -(-len(toc) // max(toc_pages, 1)))
+    for i in range(toc_pages):
+        pages.append((i + 1, "\n".join(toc[i * per_page:(i + 1) * per_page])))
+    for p in range(toc_pages + 1, page + 1):
+        if p not in body and rng.random() < 0.3:
+            continue  # missing page
+        text = "\n".join(body.get(p, [])) if p in body else section_text(rng)
+        if cfg.footer_regex:
+            text += f"\nPage {p} of the manual"
+        pages.append((p, text))
+    return pages, cfg
+
+
+def as_dicts(chunks, links: bool = True):
+    out = [asdict(c) for c in chunks]
+    if not links:
+        for d in out:
+            d.pop("prev_id")
+            d.pop("next_id")
+    return out
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_streaming_chunker_matches_previous_chunker(seed):
+    pages, cfg = random_manual(seed)
+    expected = reference_chunking.build_chunks(pages, replace(cfg), "doc")
+    # The previous chunker left chunks of documents without TOC headings unlinked.
+    links = any(c.prev_id or c.next_id for c in expected) or len(expected) < 2
+    want = as_dicts(expected, links)
+
+    assert as_dicts(build_chunks(pages, replace(cfg), "doc"), links) == want
+    assert as_dicts(iter_chunks(iter(pages), replace(cfg), "doc"), links) == want
+    if pages:
+        lazy = iter_chunks(iter(pages), replace(cfg), "doc", last_page=pages[-1][0])
+        assert as_dicts(lazy, links) == want
+
+
+def offset_manual():
+    """Section 2 is listed on page 3 of the TOC but printed on page 5."""
+    toc = "1 Getting started. 2\n2 Network setup. 3\n3 Troubleshooting. 6"
+    return [
+        (1, toc),
+        (2, "1 Getting started\nUnpack the device and charge the battery."),
+        (3, "Press the power button to switch the device on."),
+        (4, "Select a language on the display."),
+        (5, "Finish the welcome screen.\n2 Network setup\nOpen the network menu and select wifi."),
+        (6, "3 Troubleshooting\nHold reset for ten seconds."),
+    ]
+
+
+def sections(chunks):
+    return {c.heading_num: (c.page_start, c.page_end, c.text) for c in chunks}
+
+
+def test_heading_is_found_pages_away_from_its_toc_page():
+    cfg = Config(toc_pages=1, heading_page_window=3)
+    got = sections(build_chunks(offset_manual(), cfg))
+    assert got["1"][:2] == (2, 5)
+    assert got["1"][2].endswith("Finish the welcome screen.")
+    assert got["2"] == (5, 6, "Open the network menu and select wifi.")
+    assert got["3"][:2] == (6, 6)
+
+
+def test_heading_outside_the_window_starts_its_toc_page():
+    cfg = Config(toc_pages=1, heading_page_window=1)
+    got = sections(build_chunks(offset_manual(), cfg))
+    assert got["1"] == (2, 3, "Unpack the device and charge the battery.")
+    assert got["2"][:2] == (3, 6)
+    assert got["2"][2].startswith("Press the power button")
+
+
+def test_nearest_page_wins_and_later_page_breaks_ties():
+    toc = "1 Intro. 2\n2 Setup. 4"
+    pages = [
+        (1, toc),
+        (2, "1 Intro\nWelcome."),
+        (3, "2 Setup\nEarly mention."),
+        (4, "Nothing here."),
+        (5, "2 Setup\nThe real setup section."),
+        (6, "2 Setup\nToo far away."),
+    ]
+    got = sections(build_chunks(pages, Config(toc_pages=1, heading_page_window=2)))
+    assert got["2"][:2] == (5, 6)
+    assert got["2"][2].startswith("The real setup section.")
+
+
+def test_zero_window_keeps_previous_placement():
+    cfg = Config(toc_pages=1, heading_page_window=0)
+    pages = offset_manual()
+    got = build_chunks(pages, replace(cfg))
+    assert as_dicts(got) == as_dicts(reference_chunking.build_chunks(pages, replace(cfg)))
+    assert sections(got)["2"][:2] == (3, 6)
+    assert sections(got)["2"] != sections(build_chunks(pages, Config(toc_pages=1)))["2"]
@@ -0,0 +1,42 @@
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+
+from rag_chatbot.common.embedding_cache import CachedEmbeddings
+
+
+class AsymmetricEmbeddings(Embeddings):
+    """Queries and documents of the same text get different vectors."""
+
+    def embed_documents(self, texts):
+        return [[0.0, float(len(t))] for t in texts]
+
+    def embed_query(self, text):
+        return [1.0, float(len(text))]
+
+
+class BatchedQueryEmbeddings(AsymmetricEmbeddings):
+    def __init__(self):
+        self.batches = []
+
+    def embed_queries(self, texts):
+        self.batches.append(list(texts))
+        return [self.embed_query(t) for t in texts]
+
+
+def test_queries_use_the_query_side_of_the_model():
+    emb = CachedEmbeddings(AsymmetricEmbeddings(), "m")
+    queries = ["a", "bb", "a"]
+    expected = [[1.0, 1.0], [1.0, 2.0], [1.0, 1.0]]
+    assert emb.embed_queries(queries) == expected
+    assert asyncio.run(CachedEmbeddings(AsymmetricEmbeddings(), "m").aembed_queries(queries)) == expected
+    assert emb.embed_query("ccc") == [1.0, 3.0]
+    assert emb.embed_documents(["ccc"]) == [[0.0, 3.0]]
+
+
+def test_batched_query_method_is_used_for_misses():
+    inner = BatchedQueryEmbeddings()
+    emb = CachedEmbeddings(inner, "m")
+    emb.embed_query("a")
+    assert emb.embed_queries(["a", "bb", "ccc", "bb"]) == [[1.0, 1.0], [1.0, 2.0], [1.0, 3.0], [1.0, 2.0]]
+    assert inner.batches == [["a"], ["bb", "ccc"]]
@@ -0,0 +1,68 @@
+import pytest
+
+from rag_chatbot.common.stub_models import register_stub_models
+from rag_chatbot.user_manual.chunking import build_chunks
+from rag_chatbot.user_manual.config import Config
+from rag_chatbot.user_manual.index import build_adjacency, build_index
+from rag_chatbot.user_manual.retrieval import expand_neighborhood
+
+WORDS = "device settings menu button press hold select option display screen error reset".split()
+
+
+def paragraph(i: int) -> str:
+    return " ".join(WORDS[(i + j) % len(WORDS)] for j in range(40)) + f" item{i}."
+
+
+def toc_manual(n: int):
+    """One TOC page and ``n`` top-level sections, one per page."""
+    toc = "\n".join(f"{i} Section {i}. {i + 1}" for i in range(1, n + 1))
+    body = [(i + 1, f"{i} Section {i}\n{paragraph(i)}") for i in range(1, n + 1)]
+    return [(1, toc)] + body
+
+
+def plain_manual(n: int):
+    return [(i, paragraph(i)) for i in range(1, n + 1)]
+
+
+def config(toc_pages: int) -> Config:
+    return Config(
+        toc_pages=toc_pages,
+        atomic_chunk_tokens=60,
+        atomic_chunk_overlap_tokens=0,
+        embed_model="stub",
+        embed_provider="stub",
+        embed_cache_path="",
+        query_cache_size=0,
+        expand_neighbors=1,
+        expand_siblings=False,
+    )
+
+
+@pytest.fixture(scope="module", autouse=True)
+def stub_models():
+    register_stub_models()
+
+
+@pytest.mark.parametrize("toc_pages,pages", [(1, toc_manual(22)), (0, plain_manual(22))])
+def test_neighbors_expand_with_and_without_toc(toc_pages, pages):
+    cfg = config(toc_pages)
+    chunks = build_chunks(pages, cfg, "manual")
+    assert len(chunks) > 3
+    for a, b in zip(chunks, chunks[1:]):
+        assert a.next_id == b.id and b.prev_id == a.id
+
+    ix = build_index(chunks, cfg)
+    mid = chunks[len(chunks) // 2]
+    assert expand_neighborhood(ix, [mid.id]) == [mid.id, mid.prev_id, mid.next_id]
+    assert expand_neighborhood(ix, [chunks[0].id]) == [chunks[0].id, chunks[1].id]
+
+
+def test_unlinked_chunks_fall_back_to_row_order():
+    chunks = build_chunks(plain_manual(10), config(0), "a") + build_chunks(plain_manual(5), config(0), "b")
+    for ch in chunks:
+        ch.prev_id = ch.next_id = None
+    adj = build_adjacency(chunks)
+    n_a = sum(1 for c in chunks if c.doc_id == "a")
+    assert adj.prev_row[0] == -1 and adj.next_row[0] == 1
+    assert adj.next_row[n_a - 1] == -1 and adj.prev_row[n_a] == -1
+    assert adj.prev_row[n_a + 1] == n_a
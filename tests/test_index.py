@@ -0,0 +1,162 @@
+import os
+import pickle
+from dataclasses import asdict
+
+import pytest
+
+from rag_chatbot.common.stub_models import StubEmbeddings, register_stub_models
+from rag_chatbot.user_manual.chunking import build_chunks
+from rag_chatbot.user_manual.config import Config
+from rag_chatbot.models import register_provider
+from rag_chatbot.user_manual.index import (
+    build_index,
+    convert_legacy_index,
+    load_index,
+    remove_documents,
+    update_index,
+)
+from rag_chatbot.user_manual.retrieval import bm25_search, dense_search, hybrid_search
+
+WORDS = "device settings menu button press hold select option display screen error reset".split()
+
+
+def paragraph(i: int) -> str:
+    return " ".join(WORDS[(i + j) % len(WORDS)] for j in range(40)) + f" item{i}."
+
+
+def config(**overrides) -> Config:
+    cfg = Config(
+        embed_model="stub",
+        embed_provider="stub",
+        embed_cache_path="",
+        query_cache_size=0,
+        atomic_chunk_tokens=60,
+        atomic_chunk_overlap_tokens=0,
+    )
+    for key, value in overrides.items():
+        setattr(cfg, key, value)
+    return cfg
+
+
+@pytest.fixture(scope="module", autouse=True)
+def stub_models():
+    register_stub_models()
+
+
+def save_legacy_index(chunks, path: str) -> None:
+    """Write ``chunks`` the way ``save_index`` did before the versioned format."""
+    from langchain_community.vectorstores import FAISS
+
+    texts = [c.text for c in chunks]
+    metadatas = [{"id": c.id, "toc_path": c.toc_path} for c in chunks]
+    store = FAISS.from_texts(texts=texts, embedding=StubEmbeddings("stub"), metadatas=metadatas)
+    store.save_local(os.path.join(path, "faiss"))
+    # Docstore UUIDs, not chunk ids, as the old build_index produced them.
+    id_lookup = [d.id for d in store.docstore._dict.values()]
+    meta = {
+        "embed_model": "stub",
+        "embed_provider": "stub",
+        "id_lookup": id_lookup,
+        "bm25_corpus_tokens": [t.lower().replace(".", "").split() for t in texts],
+        "bm25_id_lookup": id_lookup[:],
+        "chunks": [{k: v for k, v in asdict(c).items() if k != "doc_id"} for c in chunks],
+        "siblings_by_parent": {},
+        "chunk_summaries": {},
+        "section_summaries": {},
+    }
+    with open(os.path.join(path, "meta.pkl"), "wb") as f:
+        pickle.dump(meta, f)
+
+
+def test_convert_legacy_index(tmp_path):
+    pytest.importorskip("langchain_community.vectorstores")
+    cfg = config()
+    chunks = build_chunks([(p, paragraph(p)) for p in range(1, 13)], cfg)
+    save_legacy_index(chunks, str(tmp_path))
+
+    convert_legacy_index(str(tmp_path))
+    ix = load_index(str(tmp_path), config())
+
+    ids = [c.id for c in chunks]
+    assert ix.bm25_id_lookup == ids
+    assert list(ix.faiss.ids) == ids
+    target = chunks[5]
+    assert bm25_search(ix, target.text, 1) == [target.id]
+    assert dense_search(ix, target.text, 1) == [target.id]
+
+
+class CountingEmbeddings(StubEmbeddings):
+    """Stub embeddings that count the document texts they embed."""
+
+    embedded = 0
+
+    def embed_documents(self, texts):
+        CountingEmbeddings.embedded += len(texts)
+        return super().embed_documents(texts)
+
+
+def manual(doc: str, n: int, cfg: Config):
+    return build_chunks([(p, f"{doc} " + paragraph(p)) for p in range(1, n + 1)], cfg, doc)
+
+
+INDEX_CONFIGS = [
+    {"faiss_index_type": "flat"},
+    {"faiss_index_type": "flat", "vector_dtype": "int8"},
+    {"faiss_index_type": "hnsw"},
+    {"faiss_index_type": "hnsw", "vector_dtype": "float16"},
+    {"faiss_index_type": "ivf-flat", "ivf_nlist": 4},
+    {"faiss_index_type": "ivf-pq", "ivf_nlist": 4, "pq_m": 8, "pq_nbits": 4},
+]
+
+
+@pytest.fixture(params=INDEX_CONFIGS, ids=lambda o: "-".join(map(str, o.values())))
+def multi_doc(request):
+    register_provider("embeddings", "counting", lambda model, **kw: CountingEmbeddings(model))
+    cfg = config(embed_provider="counting", **request.param)
+    docs = {d: manual(d, n, cfg) for d, n in (("a", 30), ("b", 20), ("c", 25))}
+    ix = build_index([c for chunks in docs.values() for c in chunks], cfg)
+    return ix, docs, cfg
+
+
+def test_noop_update_embeds_nothing(multi_doc):
+    ix, docs, cfg = multi_doc
+    CountingEmbeddings.embedded = 0
+    ix, stats = update_index(ix, manual("b", 20, cfg))
+    assert CountingEmbeddings.embedded == 0
+    assert (stats.added, stats.removed, stats.reembedded) == (0, 0, 0)
+    assert stats.kept == len(docs["b"])
+    assert ix.faiss.index.ntotal == len(ix.chunks) == sum(map(len, docs.values()))
+
+
+def test_update_and_remove_keep_rows_in_sync(multi_doc):
+    ix, docs, cfg = multi_doc
+    CountingEmbeddings.embedded = 0
+    changed = manual("b", 26, cfg)[4:]
+    ix, stats = update_index(ix, changed)
+    expected = len(docs["a"]) + len(changed) + len(docs["c"])
+    assert CountingEmbeddings.embedded == stats.added + stats.reembedded > 0
+    assert ix.faiss.index.ntotal == len(ix.chunks) == ix.bm25.n_docs == expected
+    assert set(ix.chunks) == {c.id for c in docs["a"] + changed + docs["c"]}
+
+    ix, stats = remove_documents(ix, ["a"])
+    assert stats.removed == len(docs["a"])
+    assert ix.faiss.index.ntotal == len(ix.chunks) == ix.bm25.n_docs == len(changed) + len(docs["c"])
+    assert {c.doc_id for c in ix.chunks.values()} == {"b", "c"}
+    assert list(ix.faiss.ids) == ix.bm25_id_lookup
+    target = changed[-1]
+    assert dense_search(ix, target.text, 1) == [target.id]
+    assert bm25_search(ix, target.text, 1) == [target.id]
+
+
+def test_filtered_search_returns_only_requested_documents(multi_doc):
+    ix, docs, _ = multi_doc
+    query = docs["a"][3].text
+    for doc_ids in (["b"], ["a", "c"]):
+        for ids in (
+            dense_search(ix, query, 10, doc_ids),
+            bm25_search(ix, query, 10, doc_ids),
+            hybrid_search(ix, query, doc_ids),
+        ):
+            assert ids
+            assert {ix.chunks[cid].doc_id for cid in ids} <= set(doc_ids)
+    assert dense_search(ix, query, 1, ["a", "c"]) == [docs["a"][3].id]
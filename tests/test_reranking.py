@@ -0,0 +1,17 @@
+from rag_chatbot.common.stub_models import StubChatModel, register_stub_models
+from rag_chatbot.user_manual.config import Config
+from rag_chatbot.user_manual.reranking import LLMReranker, get_reranker
+
+
+def test_llm_reranker_defaults_to_answering_llm():
+    register_stub_models()
+    reranker = get_reranker(Config(reranker_type="llm", llm_model="stub", llm_provider="stub"))
+    assert isinstance(reranker, LLMReranker)
+    assert isinstance(reranker.llm, StubChatModel)
+
+
+def test_llm_reranker_keeps_explicit_provider():
+    register_stub_models("stub-rerank")
+    cfg = Config(reranker_type="llm", llm_provider="ollama", reranker_provider="stub-rerank", reranker_model="m")
+    reranker = get_reranker(cfg)
+    assert isinstance(reranker.llm, StubChatModel) and reranker.llm.model_name == "m"
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from rag_chatbot.common.stub_models import register_stub_models
+from rag_chatbot.models import register_provider
+from rag_chatbot.user_manual.chunking import build_chunks
+from rag_chatbot.user_manual.config import Config
+from rag_chatbot.user_manual.index import build_index
+from rag_chatbot.user_manual.retrieval import (
+    ahybrid_search,
+    bm25_search,
+    dense_search,
+    amaybe_rerank,
+    hybrid_search,
+    last_rerank_stats,
+    maybe_rerank,
+    rrf_fuse,
+)
+
+WORDS = "device settings menu button press hold select option display screen error reset".split()
+
+
+class BrokenLLM:
+    def invoke(self, prompt):
+        raise ConnectionError("connection refused")
+
+    async def ainvoke(self, prompt):
+        raise ConnectionError("connection refused")
+
+
+@pytest.fixture(scope="module")
+def ix():
+    register_stub_models()
+    register_provider("llm", "broken", lambda model, **kw: BrokenLLM())
+    cfg = Config(
+        embed_model="stub",
+        embed_provider="stub",
+        embed_cache_path="",
+        query_cache_size=0,
+        llm_model="broken",
+        llm_provider="broken",
+        n_query_expansions=3,
+        reranker_model="stub",
+        reranker_provider="stub",
+        reranker_cache_size=0,
+        atomic_chunk_tokens=60,
+        atomic_chunk_overlap_tokens=0,
+    )
+    pages = [(p, " ".join(WORDS[(p + j) % len(WORDS)] for j in range(40)) + f" item{p}.") for p in range(1, 11)]
+    return build_index(build_chunks(pages, cfg, "manual"), cfg)
+
+
+def test_failed_expansion_falls_back_to_original_query(ix):
+    query = "reset the device item3"
+    original = rrf_fuse(
+        [
+            dense_search(ix, query, ix.cfg.topk_dense),
+            bm25_search(ix, query, ix.cfg.topk_bm25),
+        ],
+        k=ix.cfg.rrf_k,
+    )
+    assert hybrid_search(ix, query) == original
+    assert asyncio.run(ahybrid_search(ix, query)) == original
+
+
+def test_rerank_stats_are_per_request(ix):
+    ids = list(ix.chunks)
+    ranked = maybe_rerank(ix, "reset", ids[:4])
+    assert sorted(ranked) == sorted(ids[:4])
+    assert last_rerank_stats().scored == 4
+
+    async def one(n):
+        await amaybe_rerank(ix, "press hold", ids[:n])
+        await asyncio.sleep(0)
+        return last_rerank_stats().scored
+
+    async def both():
+        return await asyncio.gather(one(2), one(5))
+
+    assert asyncio.run(both()) == [2, 5]
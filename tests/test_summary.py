@@ -0,0 +1,41 @@
+import json
+
+from rag_chatbot.user_manual.config import Config
+from rag_chatbot.user_manual.summary import Summary, SummaryCheckpoint, _summarize_all
+
+
+class FlakyStructured:
+    """Returns a summary for every prompt except those in ``failing``."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    def batch(self, prompts, config=None, return_exceptions=False):
+        self.calls.append(list(prompts))
+        return [
+            ValueError("bad output") if p in self.failing else Summary(heading_path=p, overview=p)
+            for p in prompts
+        ]
+
+
+def test_failures_are_recorded_and_retried_on_resume(tmp_path):
+    cfg = Config(summary_retries=1, summary_backoff_s=0.0)
+    path = str(tmp_path / "summaries.jsonl")
+    prompts = ["a", "b", "c"]
+
+    flaky = FlakyStructured(failing={"b"})
+    results = _summarize_all(flaky, prompts, cfg, SummaryCheckpoint(path))
+    assert [r and r["overview"] for r in results] == ["a", None, "c"]
+    assert flaky.calls == [["a", "b", "c"], ["b"]]
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert [("summary" in r, "error" in r) for r in records] == [(True, False), (True, False), (False, True)]
+
+    resumed = SummaryCheckpoint(path)
+    assert len(resumed.done) == 2 and len(resumed.failed) == 1
+    working = FlakyStructured()
+    results = _summarize_all(working, prompts, cfg, resumed)
+    assert working.calls == [["b"]]
+    assert [r["overview"] for r in results] == ["a", "b", "c"]
+    assert not SummaryCheckpoint(path).failed